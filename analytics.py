@@ -1,18 +1,105 @@
-import mysql.connector
 import datetime
-from habit_class import Habit
+import sqlite3
+from functools import partial
+from typing import NamedTuple
+from habit_class import Habit, DEFAULT_USER_ID
+from streak_index import CheckOffIndex
+
+# Errors raised by the supported database drivers. The MySQL driver is slow to import, so it is not imported
+# here; database.load_mysql_driver adds its errors with register_mysql_errors when it is first needed.
+DATABASE_ERRORS = (sqlite3.Error,)
+
+# Errors raised when a statement violates a constraint, e.g. the unique habit name of a user
+INTEGRITY_ERRORS = (sqlite3.IntegrityError,)
+
+# Optional in-process cache of the habits table, enabled with use_habit_catalog
+habit_catalog = None
+
+# Optional in-memory index of the check-off history, enabled with use_check_off_index
+check_off_index = None
+
+# Optional write-behind queue of check-offs not written yet, enabled with use_check_off_buffer
+check_off_buffer = None
+
+# Changes to the habit catalog and the check-off index waiting for the transaction of a session to end, keyed by
+# the session's cursor: a list of (apply, undo) callables, see begin_cache_changes
+_pending_cache_changes = {}
+
+# Columns iter_habits_with_streaks can sort by, mapped to the SQL expression they sort on
+HABIT_LISTING_ORDER = {
+    "name": "h.habit_name",
+    "periodicity": "h.periodicity",
+    "date_created": "h.date_created",
+    "current_streak": "current_streak",
+    "longest_streak": "longest_streak",
+}
+
+
+class HabitWithStreaks(NamedTuple):
+    """
+    One row of iter_habits_with_streaks: a habit together with its streak counters.
+    """
+    habit_id: int
+    name: str
+    periodicity: int
+    date_created: datetime.date
+    current_streak: int
+    longest_streak: int
+
+
+def dialect(cursor):
+    """
+    Get the SQL dialect spoken by a cursor. Cursors of the SQLite backend report "sqlite"; every other
+    cursor is assumed to be a MySQL cursor.
+
+    Args:
+        cursor: Database cursor object.
+
+    Returns:
+        str: "mysql" or "sqlite".
+    """
+    return getattr(cursor, "dialect", "mysql")
+
+def _sql_days_between(cursor, later: str, earlier: str):
+    # SQL expression for the number of days from the date expression earlier to the date expression later
+    if dialect(cursor) == "sqlite":
+        return f"CAST(julianday({later}) - julianday({earlier}) AS INTEGER)"
+    return f"DATEDIFF({later}, {earlier})"
+
+def _sql_add_days(cursor, date_expression: str, days_expression: str):
+    # SQL expression for the date days_expression days after date_expression
+    if dialect(cursor) == "sqlite":
+        return f"date({date_expression}, '+' || ({days_expression}) || ' days')"
+    return f"DATE_ADD({date_expression}, INTERVAL {days_expression} DAY)"
+
+def _sql_greatest(cursor):
+    # Name of the SQL function returning the largest of its arguments
+    return "MAX" if dialect(cursor) == "sqlite" else "GREATEST"
+
+def _sql_insert_ignore(cursor):
+    # INSERT that skips rows violating a unique key instead of failing
+    return "INSERT OR IGNORE" if dialect(cursor) == "sqlite" else "INSERT IGNORE"
 
 def create_database(cursor, db_name):
     """
     This function creates a MySQL database named after db_name input and three tables inside that database:
 
-    - `habits`: Stores information about each habit (name, periodicity, creation date).
-    - `check_off_dates`: Records the dates when habits are checked off.
-    - `streaks`: Tracks current and longest streaks for each habit.
+    - `habits`: Stores information about each habit (owner, name, periodicity, creation date).
+    - `check_off_dates`: Records the dates when habits are checked off. A unique index on
+      (habit_id, check_off_date) serves the per-habit date lookups.
+    - `streaks`: Tracks current and longest streaks for each habit, and the date on which the current
+      streak breaks unless the habit is checked off again (NULL while there is no current streak).
+    - `completion_rollups`: Counts the expected and completed check-offs of each habit per week and month.
+
+    Every table carries the user_id of the tenant owning the row, and its secondary indexes lead with
+    user_id, so the queries of one user only read that user's index range.
 
     The function uses a cursor as an input to execute SQL commands. It ensures that
     foreign key constraints are applied with cascading updates and deletions.
 
+    On the SQLite backend the database is the file the connection was opened on, so only the tables are
+    created. Habit names compare case-insensitively there as well, like with the MySQL default collation.
+
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used to execute SQL statements.
         db_name (str): The name of the database that will be created.
@@ -21,22 +108,33 @@ def create_database(cursor, db_name):
         None
     """
 
+    if dialect(cursor) == "sqlite":
+        _create_sqlite_tables(cursor)
+        print(f"Database {db_name} and tables created successfully.")
+        return
+
     cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_name}")
     cursor.execute(f"USE {db_name}")
 
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS habits (
             id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL DEFAULT 1,
             habit_name VARCHAR(100) NOT NULL,
             periodicity INT NOT NULL,
-            date_created DATE NOT NULL
+            date_created DATE NOT NULL,
+            UNIQUE KEY uq_habits_user_name (user_id, habit_name),
+            INDEX idx_habits_user_periodicity (user_id, periodicity)
         )
     """)
 
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS check_off_dates (
+            user_id INT NOT NULL DEFAULT 1,
             habit_id INT NOT NULL,
             check_off_date DATE NOT NULL,
+            UNIQUE KEY uq_check_off_habit_date (habit_id, check_off_date),
+            INDEX idx_check_off_user_habit_date (user_id, habit_id, check_off_date),
             FOREIGN KEY (habit_id) REFERENCES habits(id)
                 ON DELETE CASCADE
                 ON UPDATE CASCADE
@@ -45,20 +143,262 @@ def create_database(cursor, db_name):
 
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS streaks (
+            user_id INT NOT NULL DEFAULT 1,
             habit_id INT PRIMARY KEY,
             current_streak INT NOT NULL,
             longest_streak INT NOT NULL,
+            streak_expires_on DATE NULL,
+            INDEX idx_streaks_user_habit (user_id, habit_id),
+            INDEX idx_streaks_user_expires (user_id, streak_expires_on),
             FOREIGN KEY (habit_id) REFERENCES habits(id)
                 ON DELETE CASCADE
                 ON UPDATE CASCADE
         )
     """)
 
+    _create_rollups_table(cursor)
+
     print(f"Database {db_name} and tables created successfully.")
 
+# Secondary indexes leading with the tenant, as (index name, table name, indexed columns). Habit names are
+# looked up through the unique uq_habits_user_name key, which also leads with the tenant.
+TENANT_INDEXES = [
+    ("idx_habits_user_periodicity", "habits", "user_id, periodicity"),
+    ("idx_check_off_user_habit_date", "check_off_dates", "user_id, habit_id, check_off_date"),
+    ("idx_streaks_user_habit", "streaks", "user_id, habit_id"),
+    ("idx_streaks_user_expires", "streaks", "user_id, streak_expires_on"),
+    ("idx_rollups_user_habit_period", "completion_rollups", "user_id, habit_id, period, period_start"),
+]
+
+# Periods of the completion_rollups table: weeks start on Monday, months on their first day
+ROLLUP_PERIODS = ("week", "month")
+
+def _create_rollups_table(cursor):
+    """
+    Creates the completion_rollups table. Each row holds, for one habit and one week or month, the number of
+    check-offs the habit's periodicity asks for in the whole period (counted from the habit's creation
+    date) and the number of check-offs made.
+    """
+    if dialect(cursor) == "sqlite":
+        tenant_index = ""
+    else:
+        tenant_index = "INDEX idx_rollups_user_habit_period (user_id, habit_id, period, period_start),"
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS completion_rollups (
+            user_id INT NOT NULL DEFAULT 1,
+            habit_id INT NOT NULL,
+            period CHAR(5) NOT NULL,
+            period_start DATE NOT NULL,
+            expected_count INT NOT NULL,
+            completed_count INT NOT NULL,
+            PRIMARY KEY (habit_id, period, period_start),
+            {tenant_index}
+            FOREIGN KEY (habit_id) REFERENCES habits(id)
+                ON DELETE CASCADE
+                ON UPDATE CASCADE
+        )
+    """)
+
+def _create_sqlite_tables(cursor):
+    """
+    Creates the tables of create_database in the SQLite dialect.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS habits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT NOT NULL DEFAULT 1,
+            habit_name VARCHAR(100) NOT NULL COLLATE NOCASE,
+            periodicity INT NOT NULL,
+            date_created DATE NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS check_off_dates (
+            user_id INT NOT NULL DEFAULT 1,
+            habit_id INT NOT NULL,
+            check_off_date DATE NOT NULL,
+            FOREIGN KEY (habit_id) REFERENCES habits(id)
+                ON DELETE CASCADE
+                ON UPDATE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_check_off_habit_date ON check_off_dates (habit_id, check_off_date)
+    """)
+    # habit_name is declared COLLATE NOCASE, so the key is case-insensitive like the MySQL default collation
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_habits_user_name ON habits (user_id, habit_name)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS streaks (
+            user_id INT NOT NULL DEFAULT 1,
+            habit_id INT PRIMARY KEY,
+            current_streak INT NOT NULL,
+            longest_streak INT NOT NULL,
+            streak_expires_on DATE NULL,
+            FOREIGN KEY (habit_id) REFERENCES habits(id)
+                ON DELETE CASCADE
+                ON UPDATE CASCADE
+        )
+    """)
+
+    _create_rollups_table(cursor)
+
+    for index_name, table_name, columns in TENANT_INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})")
+
+def use_database(cursor, db_name):
+    """
+    Select the database named after db_name input for the following statements. Nothing needs to be
+    selected on the SQLite backend, where the connection is bound to one database file.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used to execute SQL statements.
+        db_name (str): The name of the database.
+
+    Returns:
+        None
+    """
+    if dialect(cursor) != "sqlite":
+        cursor.execute(f"USE {db_name}")
+
+def upgrade_database(cursor):
+    """
+    Brings the tables of an already existing database up to date with the schema created by create_database.
+    The database must be selected with USE before calling this function. Each step is skipped if it was
+    already applied, so the function is safe to call on every start-up.
+
+    Applied steps:
+    - Adds the user_id column to every table, so existing rows belong to DEFAULT_USER_ID, and creates the
+      indexes leading with user_id.
+    - Replaces the idx_habits_user_name index with the unique uq_habits_user_name key. If a user already has
+      several habits with the same name, the key is not created and a message lists the duplicates.
+    - Creates the completion_rollups table. It starts out empty; backfill_rollups fills it from the history.
+    - Adds the streak_expires_on column to `streaks` and its index leading with user_id. Current streaks
+      without an expiry date get it from the history; those without any check-off are reset to 0.
+    - Adds the unique (habit_id, check_off_date) index to `check_off_dates`. Repeated check-offs of a habit
+      on the same date are merged into one first, a message reports how many rows were removed, and the
+      streaks of the affected habits are rebuilt for today.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used to execute SQL statements.
+
+    Returns:
+        None
+    """
+    if not column_exists(cursor, "habits", "user_id"):
+        for table_name in ("habits", "check_off_dates", "streaks"):
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN user_id INT NOT NULL DEFAULT {DEFAULT_USER_ID}")
+    if not column_exists(cursor, "completion_rollups", "habit_id"):
+        _create_rollups_table(cursor)
+    if not column_exists(cursor, "streaks", "streak_expires_on"):
+        cursor.execute("ALTER TABLE streaks ADD COLUMN streak_expires_on DATE NULL")
+    # Current streaks without an expiry date are never reset by refresh_all_streaks, so they get it from the
+    # history. This also covers a backfill interrupted after MySQL committed the ALTER TABLE. The periodicity
+    # is aggregated as well, which ONLY_FULL_GROUP_BY requires; it is the same on every row of the habit.
+    cursor.execute(f"""
+        UPDATE streaks
+        SET streak_expires_on = (
+            SELECT {_sql_add_days(cursor, "MAX(c.check_off_date)", "MAX(h.periodicity) + 1")}
+            FROM check_off_dates c
+            JOIN habits h ON h.id = c.habit_id
+            WHERE c.habit_id = streaks.habit_id
+        )
+        WHERE current_streak > 0 AND streak_expires_on IS NULL
+    """)
+    cursor.execute("UPDATE streaks SET current_streak = 0 WHERE current_streak > 0 AND streak_expires_on IS NULL")
+    for index_name, table_name, columns in TENANT_INDEXES:
+        if not index_exists(cursor, table_name, index_name):
+            cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({columns})")
+
+    if not index_exists(cursor, "check_off_dates", "uq_check_off_habit_date"):
+        cursor.execute("""
+            SELECT MIN(user_id), habit_id, check_off_date, COUNT(*) FROM check_off_dates
+            GROUP BY habit_id, check_off_date
+            HAVING COUNT(*) > 1
+        """)
+        duplicates = cursor.fetchall()
+        for owner, habit_id, check_off_date, _ in duplicates:
+            cursor.execute("DELETE FROM check_off_dates WHERE habit_id = %s AND check_off_date = %s",
+                           (habit_id, check_off_date))
+            cursor.execute("INSERT INTO check_off_dates (user_id, habit_id, check_off_date) VALUES (%s, %s, %s)",
+                           (owner, habit_id, check_off_date))
+        cursor.execute("""
+            CREATE UNIQUE INDEX uq_check_off_habit_date ON check_off_dates (habit_id, check_off_date)
+        """)
+        if duplicates:
+            habit_ids = sorted({habit_id for _, habit_id, _, _ in duplicates})
+            rebuild_streaks(cursor, datetime.date.today(), habit_ids, user_id=None)
+            removed = sum(count - 1 for _, _, _, count in duplicates)
+            print(f"Removed {removed} repeated check-off(s) of {len(habit_ids)} habit(s) and rebuilt their streaks.")
+
+    if not index_exists(cursor, "habits", "uq_habits_user_name"):
+        cursor.execute("""
+            SELECT user_id, habit_name FROM habits
+            GROUP BY user_id, habit_name
+            HAVING COUNT(*) > 1
+        """)
+        duplicates = cursor.fetchall()
+        if duplicates:
+            names = ", ".join(f"'{name}' (user {owner})" for owner, name in duplicates)
+            print(f"Habit names must be unique per user, rename or delete the duplicate habits: {names}.")
+        else:
+            cursor.execute("CREATE UNIQUE INDEX uq_habits_user_name ON habits (user_id, habit_name)")
+            if index_exists(cursor, "habits", "idx_habits_user_name"):
+                drop_on = "" if dialect(cursor) == "sqlite" else " ON habits"
+                cursor.execute(f"DROP INDEX idx_habits_user_name{drop_on}")
+
+def column_exists(cursor, table_name: str, column_name: str):
+    """
+    Check if a column exists in a table of the currently selected database.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used to execute the query.
+        table_name (str): The name of the table.
+        column_name (str): The name of the column to look for.
+
+    Returns:
+        bool: True if the column exists, False otherwise.
+    """
+    if dialect(cursor) == "sqlite":
+        query = "SELECT 1 FROM pragma_table_info(%s) WHERE name = %s LIMIT 1"
+    else:
+        query = """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            LIMIT 1
+        """
+    cursor.execute(query, (table_name, column_name))
+    return cursor.fetchone() is not None
+
+def index_exists(cursor, table_name: str, index_name: str):
+    """
+    Check if an index exists on a table of the currently selected database.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used to execute the query.
+        table_name (str): The name of the table.
+        index_name (str): The name of the index to look for.
+
+    Returns:
+        bool: True if the index exists, False otherwise.
+    """
+    if dialect(cursor) == "sqlite":
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s LIMIT 1"
+    else:
+        query = """
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1
+        """
+    cursor.execute(query, (table_name, index_name))
+    return cursor.fetchone() is not None
+
 def check_database_exists(cursor, db_name):
     """
-    Check if the database named after db_name input exists in the MySQL server.
+    Check if the database named after db_name input exists in the MySQL server. On the SQLite backend,
+    where the connection is bound to one database file, checks if that file already holds the habits tables.
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used to execute the query.
@@ -68,166 +408,1076 @@ def check_database_exists(cursor, db_name):
         bool: True if the database exists, False otherwise.
     """
     try:
-        cursor.execute(f"SHOW DATABASES LIKE '{db_name}'")
+        if dialect(cursor) == "sqlite":
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'habits'")
+        else:
+            cursor.execute(f"SHOW DATABASES LIKE '{db_name}'")
         result = cursor.fetchone()
         return result is not None
-    except mysql.connector.Error as err:
+    except DATABASE_ERRORS as err:
         print("Database query failed:", err)
         return False
 
+def register_mysql_errors(connector):
+    """
+    Add the errors of the MySQL driver to DATABASE_ERRORS and INTEGRITY_ERRORS, so the functions of this
+    module and their callers handle them like SQLite errors. Called once the driver has been imported.
+
+    Args:
+        connector (module): The mysql.connector module.
+
+    Returns:
+        None
+    """
+    global DATABASE_ERRORS, INTEGRITY_ERRORS
+    if connector.Error not in DATABASE_ERRORS:
+        DATABASE_ERRORS = DATABASE_ERRORS + (connector.Error,)
+        INTEGRITY_ERRORS = INTEGRITY_ERRORS + (connector.IntegrityError,)
+
+def use_habit_catalog(catalog):
+    """
+    Enable (or disable, with None) the in-process habit catalog used by the lookup functions of this module.
+    While enabled, create_habit and delete_habit keep the catalog in sync with the `habits` table.
+
+    Args:
+        catalog (habit_catalog.HabitCatalog | None): The catalog to use, or None to always query the database.
+
+    Returns:
+        None
+    """
+    global habit_catalog
+    habit_catalog = catalog
+
+def use_check_off_index(index):
+    """
+    Enable (or disable, with None) the in-memory check-off index kept up to date by this module.
+    While enabled, create_habit, delete_habit and the check-off functions update the index incrementally once
+    their transaction commits, and get_current_streak and get_longest_streak answer questions about past dates
+    from it.
+
+    Args:
+        index (streak_index.CheckOffIndex | None): The index to maintain, or None to stop maintaining it.
+
+    Returns:
+        None
+    """
+    global check_off_index
+    check_off_index = index
+
+def use_check_off_buffer(buffer):
+    """
+    Enable (or disable, with None) the write-behind check-off buffer consulted by is_habit_checked_off,
+    so check-offs acknowledged by the buffer count as checked off before they are written.
+
+    Args:
+        buffer (write_behind.CheckOffBuffer | None): The buffer, or None to only look at the database.
+
+    Returns:
+        None
+    """
+    global check_off_buffer
+    check_off_buffer = buffer
+
+def begin_cache_changes(cursor):
+    """
+    Hold back the changes this module makes to the habit catalog and the check-off index through cursor until
+    its transaction ends, so a rolled back transaction leaves no habits or check-offs behind in them. The
+    database sessions call it for the cursor they yield and end_cache_changes when they commit or roll back.
+    Changes made through a cursor without a session are applied right away.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The cursor of the session.
+
+    Returns:
+        None
+    """
+    _pending_cache_changes[cursor] = []
+
+def end_cache_changes(cursor, committed: bool):
+    """
+    Apply the changes held back for cursor since begin_cache_changes if its transaction committed, or undo
+    what the session's own lookups cached if it rolled back.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The cursor of the session.
+        committed (bool): Whether the transaction was committed.
+
+    Returns:
+        None
+    """
+    for apply, undo in _pending_cache_changes.pop(cursor, ()):
+        if committed:
+            apply()
+        elif undo is not None:
+            undo()
+
+def _on_commit(cursor, apply, undo=None):
+    """
+    Runs apply() when the transaction of cursor commits, or right away if cursor has no session. undo() runs
+    instead if the transaction rolls back.
+    """
+    changes = _pending_cache_changes.get(cursor)
+    if changes is None:
+        apply()
+    else:
+        changes.append((apply, undo))
+
 def create_habit(cursor, habit: Habit):
     """
-    Creates a habit and initializes its streak in the database (no commit inside).
+    Creates a habit for the user owning it (habit.user_id) and initializes its streak in the database
+    (no commit inside). Duplicate names are rejected by the unique (user_id, habit_name) key, so two
+    concurrent sessions cannot both create the same habit.
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): Database cursor.
         habit (Habit): The Habit object to be created.
 
     Returns:
-        None
+        int | None: The id of the new habit, or None if the user already has a habit with that name.
     """
-    def initialize_streak_for_habit(cursor, habit_id):
-        """
-        Inserts an initial streak record for the given habit_id,
-        setting current_streak and longest_streak to 0.
-        """
-        streak_query = """
-            INSERT INTO streaks (habit_id, current_streak, longest_streak)
-            VALUES (%s, %s, %s)
-        """
-        cursor.execute(streak_query, (habit_id, 0, 0))
-
-    existing_habit_id = get_habit_id(cursor, habit.name)
-    if existing_habit_id is not None:
+    try:
+        new_habit_id = habit.save_to_db(cursor)
+    except INTEGRITY_ERRORS:
         print(f"Habit '{habit.name.upper()}' already exists.")
-        return
+        return None
 
-    habit.save_to_db(cursor)
+    # Initialize the streak of the new habit with current_streak and longest_streak set to 0
+    streak_query = """
+        INSERT INTO streaks (user_id, habit_id, current_streak, longest_streak)
+        VALUES (%s, %s, %s, %s)
+    """
+    cursor.execute(streak_query, (habit.user_id, new_habit_id, 0, 0))
 
-    new_habit_id = get_habit_id(cursor, habit.name)
-    initialize_streak_for_habit(cursor, new_habit_id)
+    if habit_catalog is not None:
+        # The lookups of the session may cache the new habit before the commit, so a rollback removes it
+        _on_commit(cursor, partial(habit_catalog.add, new_habit_id, habit.user_id, habit.name, habit.periodicity,
+                                   habit.date_created),
+                   partial(habit_catalog.remove, new_habit_id))
+    if check_off_index is not None:
+        _on_commit(cursor, partial(check_off_index.add_habit, new_habit_id, habit.periodicity, user_id=habit.user_id))
 
     print(f"Habit '{habit.name}' with a periodicity of {habit.periodicity} days was created successfully on {habit.date_created}.")
+    return new_habit_id
+
+def create_habits(cursor, habits, batch_size: int = 1000):
+    """
+    Bulk version of create_habit for many Habit objects (no commit inside). The habits are inserted with
+    executemany in chunks of batch_size, followed by one query per chunk for their ids and one executemany
+    for their streak rows. Habits whose user already has a habit with the same name (case-insensitively),
+    including an earlier habit of the same batch, are skipped.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        habits (Iterable[Habit]): The habits to create.
+        batch_size (int): The maximum number of rows sent per statement.
+
+    Returns:
+        list[int | None]: For every habit, in order, the id of the new habit or None if it was skipped.
+    """
+    habits = list(habits)
+    insert_ignore = _sql_insert_ignore(cursor)
+    habit_ids = [None] * len(habits)
+
+    seen = set()
+    for start in range(0, len(habits), batch_size):
+        chunk = []
+        for position in range(start, min(start + batch_size, len(habits))):
+            key = (habits[position].user_id, habits[position].name.lower())
+            if key not in seen:
+                seen.add(key)
+                chunk.append(position)
+        if not chunk:
+            continue
+
+        placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+        if dialect(cursor) == "sqlite":
+            placeholders = f"VALUES {placeholders}"
+        key_params = [value for position in chunk for value in (habits[position].user_id, habits[position].name)]
+
+        # Names the users already have are skipped
+        cursor.execute(
+            f"SELECT user_id, habit_name FROM habits WHERE (user_id, habit_name) IN ({placeholders})",
+            key_params,
+        )
+        existing = {(owner, name.lower()) for owner, name in cursor.fetchall()}
+        chunk = [position for position in chunk
+                 if (habits[position].user_id, habits[position].name.lower()) not in existing]
+        if not chunk:
+            continue
+
+        # The unique key still guards against habits created concurrently since the query above
+        cursor.executemany(
+            f"{insert_ignore} INTO habits (user_id, habit_name, periodicity, date_created) VALUES (%s, %s, %s, %s)",
+            [(habits[position].user_id, habits[position].name, habits[position].periodicity,
+              habits[position].date_created) for position in chunk],
+        )
+
+        placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+        if dialect(cursor) == "sqlite":
+            placeholders = f"VALUES {placeholders}"
+        cursor.execute(
+            f"SELECT id, user_id, habit_name FROM habits WHERE (user_id, habit_name) IN ({placeholders})",
+            [value for position in chunk for value in (habits[position].user_id, habits[position].name)],
+        )
+        ids_by_key = {(owner, name.lower()): habit_id for habit_id, owner, name in cursor.fetchall()}
+        for position in chunk:
+            habit_ids[position] = ids_by_key.get((habits[position].user_id, habits[position].name.lower()))
+
+        new_habits = [(habits[position], habit_ids[position]) for position in chunk if habit_ids[position] is not None]
+        cursor.executemany(
+            f"{insert_ignore} INTO streaks (user_id, habit_id, current_streak, longest_streak) VALUES (%s, %s, 0, 0)",
+            [(habit.user_id, habit_id) for habit, habit_id in new_habits],
+        )
+
+        for habit, habit_id in new_habits:
+            if habit_catalog is not None:
+                _on_commit(cursor, partial(habit_catalog.add, habit_id, habit.user_id, habit.name, habit.periodicity,
+                                           habit.date_created),
+                           partial(habit_catalog.remove, habit_id))
+            if check_off_index is not None:
+                _on_commit(cursor, partial(check_off_index.add_habit, habit_id, habit.periodicity, user_id=habit.user_id))
+
+    return habit_ids
+
+def delete_habit(cursor, habit_id: int, user_id: int = DEFAULT_USER_ID):
+    """
+    Deletes a habit of a user from the database (no commit inside). Its check-off dates and streak are
+    removed by the cascading foreign keys.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        habit_id (int): The unique identifier of the habit.
+        user_id (int): The user owning the habit.
+
+    Returns:
+        bool: True if the habit was deleted, False if the user has no such habit.
+    """
+    cursor.execute("DELETE FROM habits WHERE user_id = %s AND id = %s", (user_id, habit_id))
+
+    deleted = cursor.rowcount > 0
+    if not deleted:
+        return False
 
-def get_habit_id(cursor, habit_name: str):
+    if habit_catalog is not None:
+        _on_commit(cursor, partial(habit_catalog.remove, habit_id))
+    if check_off_index is not None:
+        _on_commit(cursor, partial(check_off_index.remove_habit, habit_id))
+
+    return deleted
+
+def get_habit_id(cursor, habit_name: str, user_id: int = DEFAULT_USER_ID):
     """
-    Retrieve the habit_id for a given habit_name from the habits table.
+    Retrieve the habit_id for a given habit_name of a user from the habits table, or from the habit catalog
+    if one is enabled.
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used to execute SQL statements.
         habit_name (str): The name of the habit to look up.
+        user_id (int): The user owning the habit.
 
     Returns:
         int or None: The habit_id if found, otherwise None.
     """
-    query = "SELECT id FROM habits WHERE habit_name = %s"
-    cursor.execute(query, (habit_name,))
+    if habit_catalog is not None:
+        return habit_catalog.get_habit_id(cursor, habit_name, user_id)
+
+    query = "SELECT id FROM habits WHERE user_id = %s AND habit_name = %s"
+    cursor.execute(query, (user_id, habit_name))
     result = cursor.fetchone()
     if result:
         return result[0]  # id is the first column in the result tuple
     else:
         return None
 
-def is_habit_checked_off(cursor, habit_id: int, check_date: datetime.date):
+def is_habit_checked_off(cursor, habit_id: int, check_date: datetime.date, user_id: int = DEFAULT_USER_ID):
     """
-    Check if the habit is already checked off on the given date.
+    Check if the habit is already checked off on the given date. The lookup is answered by the
+    (user_id, habit_id, check_off_date) index, or by the write-behind buffer if the check-off is still pending.
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The DB cursor.
         habit_id (int): The habit's unique ID.
         check_date (datetime.date): The date to check.
+        user_id (int): The user owning the habit.
 
     Returns:
         bool: True if the habit is checked off on check_date, False otherwise.
     """
+    if check_off_buffer is not None and check_off_buffer.is_pending(habit_id, check_date, user_id):
+        return True
+
     query = """
-    SELECT 1 FROM check_off_dates WHERE habit_id = %s AND check_off_date = %s LIMIT 1
+    SELECT 1 FROM check_off_dates WHERE user_id = %s AND habit_id = %s AND check_off_date = %s LIMIT 1
     """
-    cursor.execute(query, (habit_id, check_date))
+    cursor.execute(query, (user_id, habit_id, check_date))
     return cursor.fetchone() is not None
 
-def check_off_habit(cursor, habit_id: int, check_date: datetime.date):
+def check_off_habit(cursor, habit_id: int, check_date: datetime.date, user_id: int = DEFAULT_USER_ID):
     """
-    Insert a check-off record for a habit on a given date and update the streaks table. Increments the current_streak by 1, if the current streak is greater than the longest_streak, changes the longest_streak to the value of the current_streak.
+    Insert a check-off record for a habit on a given date and update the streaks table (no commit inside).
+    Increments the current_streak by 1, raises the longest_streak to the new current_streak if it is greater
+    and moves the streak_expires_on date to 'periodicity' days after check_date.
+
+    The check-off is an insert guarded by the unique (habit_id, check_off_date) key followed by one combined
+    streak UPDATE, which only runs if the row was new. Two sessions checking off the same habit on the same
+    date at the same time therefore record and count it once. Nothing is recorded if the habit does not
+    belong to user_id.
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
         habit_id (int): The unique identifier of the habit.
         check_date (datetime.date): The date to check off the habit.
+        user_id (int): The user owning the habit.
 
     Returns:
-        None
+        bool: True if the check-off was recorded, False if it already existed or the user has no such habit.
+    """
+    if not record_check_off(cursor, habit_id, check_date, user_id):
+        return False
+
+    # longest_streak is assigned first so that it is computed from the current_streak before the increment;
+    # the expiry date (see streak_expiry) reads the periodicity in the same statement
+    expires_on = _sql_add_days(cursor, "%s", "(SELECT periodicity FROM habits WHERE id = streaks.habit_id) + 1")
+    cursor.execute(f"""
+        UPDATE streaks
+        SET longest_streak = {_sql_greatest(cursor)}(longest_streak, current_streak + 1),
+            current_streak = current_streak + 1,
+            streak_expires_on = {_sql_greatest(cursor)}(COALESCE(streak_expires_on, {expires_on}), {expires_on})
+        WHERE user_id = %s AND habit_id = %s
+    """, (check_date, check_date, user_id, habit_id))
+
+    return True
+
+def record_check_off(cursor, habit_id: int, check_date: datetime.date, user_id: int = DEFAULT_USER_ID):
+    """
+    Insert a check-off record for a habit on any date and add it to the completion rollups, without touching
+    the streaks table (no commit inside). Callers that record many check-offs, possibly out of order, use it
+    to run rebuild_streaks once for the affected habits instead of updating the streaks after every check-off.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        habit_id (int): The unique identifier of the habit.
+        check_date (datetime.date): The date to check off the habit.
+        user_id (int): The user owning the habit.
+
+    Returns:
+        bool: True if the check-off was recorded, False if it already existed or the user has no such habit.
+    """
+    insert_checkoff_query = f"""
+        {_sql_insert_ignore(cursor)} INTO check_off_dates (user_id, habit_id, check_off_date)
+        SELECT user_id, id, %s FROM habits WHERE user_id = %s AND id = %s
+    """
+    cursor.execute(insert_checkoff_query, (check_date, user_id, habit_id))
+    if cursor.rowcount < 1:
+        return False
+
+    _add_check_off_to_rollups(cursor, habit_id, check_date, user_id)
+
+    if check_off_index is not None:
+        _on_commit(cursor, partial(check_off_index.add_check_off, habit_id, check_date))
+
+    return True
+
+def backdate_check_off(cursor, habit_id: int, check_date: datetime.date, todays_date: datetime.date,
+                       user_id: int = DEFAULT_USER_ID, page_size: int = 100):
+    """
+    Insert a check-off for a habit on today's or any past date and update the streaks table (no commit inside).
+
+    Unlike check_off_habit, the date does not have to be later than the habit's other check-offs. Only the
+    streak run around check_date is recomputed: the neighbouring check-offs at most 'periodicity' days apart
+    are walked in both directions, page_size rows at a time, until a larger gap is found. The cost therefore
+    depends on the length of that run and not on the length of the habit's history. A new check-off can
+    only join runs, so the longest_streak becomes the larger of itself and the joined run. The current_streak
+    changes only if the joined run is the habit's latest run.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        habit_id (int): The unique identifier of the habit.
+        check_date (datetime.date): The date to check off the habit.
+        todays_date (datetime.date): Today's date; the current streak is evaluated on this date.
+        user_id (int): The user owning the habit.
+        page_size (int): The number of neighbouring check-offs read per query.
+
+    Returns:
+        bool: True if the check-off was recorded, False if it already existed or the user has no such habit.
+    """
+    if check_date > todays_date:
+        raise ValueError(f"Cannot check off a habit for {check_date}, which is after {todays_date}.")
+
+    if not record_check_off(cursor, habit_id, check_date, user_id):
+        return False
+
+    periodicity = _habit_schedule(cursor, habit_id, user_id)[0]
+    earlier_count, _, _ = _walk_run(cursor, habit_id, user_id, check_date, periodicity, -1, page_size)
+    later_count, run_end, is_latest_run = _walk_run(cursor, habit_id, user_id, check_date, periodicity, 1, page_size)
+    run_length = earlier_count + 1 + later_count
+
+    if is_latest_run:
+        current_streak = run_length if (todays_date - run_end).days <= periodicity else 0
+        expires_on = streak_expiry(run_end, periodicity) if current_streak else None
+        cursor.execute(f"""
+            UPDATE streaks
+            SET longest_streak = {_sql_greatest(cursor)}(longest_streak, %s),
+                current_streak = %s,
+                streak_expires_on = %s
+            WHERE user_id = %s AND habit_id = %s
+        """, (run_length, current_streak, expires_on, user_id, habit_id))
+    else:
+        cursor.execute(f"""
+            UPDATE streaks
+            SET longest_streak = {_sql_greatest(cursor)}(longest_streak, %s)
+            WHERE user_id = %s AND habit_id = %s
+        """, (run_length, user_id, habit_id))
+
+    return True
+
+def _walk_run(cursor, habit_id, user_id, check_date, periodicity, direction, page_size):
+    """
+    Walks the check-offs of a habit before (direction -1) or after (direction 1) check_date for as long as
+    they are at most 'periodicity' days apart.
+
+    Returns:
+        tuple[int, datetime.date, bool]: The number of check-offs walked, the date of the last one (check_date
+        if there are none), and whether the walk reached the habit's first or last check-off.
+    """
+    comparison, order = ("<", "DESC") if direction < 0 else (">", "ASC")
+    query = f"""
+        SELECT check_off_date FROM check_off_dates
+        WHERE user_id = %s AND habit_id = %s AND check_off_date {comparison} %s
+        ORDER BY check_off_date {order}
+        LIMIT %s
+    """
+
+    count = 0
+    edge = check_date
+    while True:
+        cursor.execute(query, (user_id, habit_id, edge, page_size))
+        dates = [row[0] for row in cursor.fetchall()]
+        for next_date in dates:
+            if abs((next_date - edge).days) > periodicity:
+                return count, edge, False
+            count += 1
+            edge = next_date
+        if len(dates) < page_size:
+            return count, edge, True
+
+def check_off_habits(cursor, pairs, batch_size: int = 1000, user_id: int = DEFAULT_USER_ID):
+    """
+    Bulk version of check_off_habit for many (habit_id, check_date) pairs (no commit inside). Pairs that are
+    already checked off, repeated in pairs, or of habits not owned by user_id are skipped. The remaining check-offs are inserted with
+    executemany in chunks of batch_size, and the streaks of the affected habits are then updated with one
+    UPDATE statement per chunk of habits: current_streak grows by the number of new check-offs and
+    longest_streak and streak_expires_on follow it, exactly as if check_off_habit had been called for each
+    new pair in order.
+
+    The pairs of a chunk that exist already are read with a locking read on MySQL, so no other session can
+    insert the missing ones before this one does; SQLite runs one session at a time. The inserts are guarded
+    by the unique (habit_id, check_off_date) key all the same, and a chunk counts as many new check-offs as
+    the database inserted.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        pairs (Iterable[tuple[int, datetime.date]]): The (habit_id, check_date) pairs to check off.
+        batch_size (int): The maximum number of rows sent per statement.
+        user_id (int): The user owning the habits.
+
+    Returns:
+        dict[int, dict]: For every habit in pairs, a dict with the number of pairs "checked_off" and "skipped",
+        and the resulting "current_streak" and "longest_streak".
+    """
+    pairs = list(pairs)
+
+    results = {}
+    for habit_id, _ in pairs:
+        results.setdefault(habit_id, {"checked_off": 0, "skipped": 0, "current_streak": 0, "longest_streak": 0})
+        results[habit_id]["skipped"] += 1
+
+    # Only check off habits owned by the user
+    schedules = {}  # habit_id -> (periodicity, date_created) of the habits owned by the user
+    habit_ids = sorted(results)
+    for start in range(0, len(habit_ids), batch_size):
+        chunk = habit_ids[start:start + batch_size]
+        id_placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(
+            f"SELECT id, periodicity, date_created FROM habits WHERE user_id = %s AND id IN ({id_placeholders})",
+            [user_id] + chunk,
+        )
+        schedules.update((habit_id, (periodicity, date_created)) for habit_id, periodicity, date_created in cursor.fetchall())
+
+    unique_pairs = sorted({pair for pair in pairs if pair[0] in schedules})
+    if not unique_pairs:
+        return results
+
+    # Insert the check-offs that do not exist yet
+    latest_expiries = {}  # habit_id -> streak_expires_on after the latest new check-off
+    insert_checkoff_query = f"""
+        {_sql_insert_ignore(cursor)} INTO check_off_dates (user_id, habit_id, check_off_date)
+        VALUES (%s, %s, %s)
+    """
+    locking_read = "" if dialect(cursor) == "sqlite" else "FOR UPDATE"
+    for start in range(0, len(unique_pairs), batch_size):
+        chunk = unique_pairs[start:start + batch_size]
+        placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+        if dialect(cursor) == "sqlite":
+            placeholders = f"VALUES {placeholders}"
+        cursor.execute(
+            f"""
+            SELECT habit_id, check_off_date FROM check_off_dates
+            WHERE user_id = %s AND (habit_id, check_off_date) IN ({placeholders})
+            {locking_read}
+            """,
+            [user_id] + [value for pair in chunk for value in pair],
+        )
+        existing_pairs = set(cursor.fetchall())
+
+        new_pairs = [pair for pair in chunk if pair not in existing_pairs]
+        if new_pairs:
+            cursor.executemany(insert_checkoff_query, [(user_id, habit_id, check_date) for habit_id, check_date in new_pairs])
+            if cursor.rowcount < len(new_pairs):
+                # Another session inserted some of the pairs after all; which ones is unknown, so only the
+                # latest pairs of the chunk, as many as were inserted, are counted
+                new_pairs = new_pairs[len(new_pairs) - max(cursor.rowcount, 0):]
+
+        for habit_id, check_date in new_pairs:
+            results[habit_id]["checked_off"] += 1
+            results[habit_id]["skipped"] -= 1
+            expires_on = streak_expiry(check_date, schedules[habit_id][0])
+            latest_expiries[habit_id] = max(latest_expiries.get(habit_id, expires_on), expires_on)
+            if check_off_index is not None:
+                _on_commit(cursor, partial(check_off_index.add_check_off, habit_id, check_date))
+
+        _add_to_rollups(cursor, [(user_id, habit_id) + schedules[habit_id] + (check_date,)
+                                 for habit_id, check_date in new_pairs])
+
+    # Update the streaks table in one statement per chunk of habits; longest_streak is assigned first so that
+    # it is computed from the current_streak before the increment
+    for start in range(0, len(habit_ids), batch_size):
+        chunk = [habit_id for habit_id in habit_ids[start:start + batch_size] if results[habit_id]["checked_off"]]
+        if not chunk:
+            continue
+
+        increment_cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        increments = [value for habit_id in chunk for value in (habit_id, results[habit_id]["checked_off"])]
+        expiries = [value for habit_id in chunk for value in (habit_id, latest_expiries[habit_id])]
+        id_placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"""
+            UPDATE streaks
+            SET longest_streak = {_sql_greatest(cursor)}(longest_streak, current_streak + CASE habit_id {increment_cases} END),
+                current_streak = current_streak + CASE habit_id {increment_cases} END,
+                streak_expires_on = {_sql_greatest(cursor)}(COALESCE(streak_expires_on, CASE habit_id {increment_cases} END),
+                                                            CASE habit_id {increment_cases} END)
+            WHERE user_id = %s AND habit_id IN ({id_placeholders})
+        """, increments + increments + expiries + expiries + [user_id] + chunk)
+
+    # Read back the resulting streaks
+    for start in range(0, len(habit_ids), batch_size):
+        chunk = habit_ids[start:start + batch_size]
+        id_placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(
+            f"SELECT habit_id, current_streak, longest_streak FROM streaks WHERE user_id = %s AND habit_id IN ({id_placeholders})",
+            [user_id] + chunk,
+        )
+        for habit_id, current_streak, longest_streak in cursor.fetchall():
+            results[habit_id]["current_streak"] = current_streak
+            results[habit_id]["longest_streak"] = longest_streak
+
+    return results
+
+def _habit_schedule(cursor, habit_id, user_id):
+    """
+    Looks up the (periodicity, date_created) of a habit of the user, in the habit catalog if one is enabled,
+    or returns None if the user has no such habit.
+    """
+    if habit_catalog is not None:
+        habit = habit_catalog.get_habit(cursor, habit_id, user_id)
+        return habit[1:] if habit is not None else None
+    cursor.execute("SELECT periodicity, date_created FROM habits WHERE user_id = %s AND id = %s", (user_id, habit_id))
+    return cursor.fetchone()
+
+def streak_expiry(last_check_off: datetime.date, periodicity: int):
+    """
+    The date on which a streak breaks if the habit is not checked off again after last_check_off: the first
+    day more than 'periodicity' days after it.
+
+    Args:
+        last_check_off (datetime.date): The latest check-off of the streak.
+        periodicity (int): The habit's periodicity in days.
+
+    Returns:
+        datetime.date: The value of the streak_expires_on column.
+    """
+    return last_check_off + datetime.timedelta(days=periodicity + 1)
+
+def rollup_period_start(period: str, day: datetime.date):
+    """
+    Get the first day of the week (Monday) or month containing day.
+
+    Args:
+        period (str): One of ROLLUP_PERIODS.
+        day (datetime.date): Any day of the period.
+
+    Returns:
+        datetime.date: The first day of the period.
+    """
+    if period == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown rollup period '{period}', expected one of {', '.join(ROLLUP_PERIODS)}.")
+
+def _rollup_period_end(period, period_start):
+    if period == "week":
+        return period_start + datetime.timedelta(days=6)
+    next_month = (period_start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return next_month - datetime.timedelta(days=1)
+
+def _expected_count(periodicity, date_created, period, period_start):
+    # The number of check-offs due in the period: one per 'periodicity' days, counted from date_created
+    period_end = _rollup_period_end(period, period_start)
+    first_day = max(period_start, date_created)
+    if first_day > period_end:
+        return 0
+    return -(-((period_end - first_day).days + 1) // periodicity)
+
+def _upsert_rollups(cursor, rows):
+    """
+    Inserts (user_id, habit_id, period, period_start, expected_count, completed_count) rows into
+    completion_rollups, adding completed_count to the rows that already exist.
+    """
+    if not rows:
+        return
+    if dialect(cursor) == "sqlite":
+        on_conflict = """
+            ON CONFLICT (habit_id, period, period_start)
+            DO UPDATE SET completed_count = completed_count + excluded.completed_count
+        """
+    else:
+        on_conflict = "ON DUPLICATE KEY UPDATE completed_count = completed_count + VALUES(completed_count)"
+    cursor.executemany(f"""
+        INSERT INTO completion_rollups (user_id, habit_id, period, period_start, expected_count, completed_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        {on_conflict}
+    """, rows)
+
+def _add_to_rollups(cursor, check_offs):
+    """
+    Counts new (user_id, habit_id, periodicity, date_created, check_date) check-offs in the week and month
+    rollups containing them, with one statement for all of them.
     """
-    # Insert the check-off date into check_off_dates table
-    insert_checkoff_query = """
-        INSERT INTO check_off_dates (habit_id, check_off_date)
-        VALUES (%s, %s)
+    counts = {}
+    for user_id, habit_id, periodicity, date_created, check_date in check_offs:
+        for period in ROLLUP_PERIODS:
+            start = rollup_period_start(period, check_date)
+            key = (user_id, habit_id, period, start, _expected_count(periodicity, date_created, period, start))
+            counts[key] = counts.get(key, 0) + 1
+    _upsert_rollups(cursor, [key + (count,) for key, count in counts.items()])
+
+def _add_check_off_to_rollups(cursor, habit_id, check_date, user_id):
+    """
+    Counts one new check-off in the week and month rollups containing it, like _add_to_rollups, with one
+    statement that reads the periodicity and date_created of the habit itself.
+    """
+    periods = " UNION ALL ".join(["SELECT %s AS period, %s AS period_start, %s AS period_end"] * len(ROLLUP_PERIODS))
+    period_params = []
+    for period in ROLLUP_PERIODS:
+        start = rollup_period_start(period, check_date)
+        period_params += [period, start, _rollup_period_end(period, start)]
+
+    # The expected count of _expected_count: one check-off per 'periodicity' days from the later of the
+    # period start and date_created, rounded up
+    due_days = _sql_days_between(cursor, "p.period_end", f"{_sql_greatest(cursor)}(p.period_start, h.date_created)")
+    divide = "/" if dialect(cursor) == "sqlite" else "DIV"
+    expected_count = f"""
+        CASE
+            WHEN h.date_created > p.period_end THEN 0
+            ELSE ({due_days} + h.periodicity) {divide} h.periodicity
+        END
+    """
+    if dialect(cursor) == "sqlite":
+        on_conflict = "ON CONFLICT (habit_id, period, period_start) DO UPDATE SET completed_count = completed_count + 1"
+    else:
+        on_conflict = "ON DUPLICATE KEY UPDATE completed_count = completed_count + 1"
+    cursor.execute(f"""
+        INSERT INTO completion_rollups (user_id, habit_id, period, period_start, expected_count, completed_count)
+        SELECT h.user_id, h.id, p.period, p.period_start, {expected_count}, 1
+        FROM habits h
+        CROSS JOIN ({periods}) AS p
+        WHERE h.user_id = %s AND h.id = %s
+        {on_conflict}
+    """, period_params + [user_id, habit_id])
+
+def refresh_rollups(cursor, todays_date: datetime.date, user_id: int = DEFAULT_USER_ID, habit_ids=None):
     """
-    cursor.execute(insert_checkoff_query, (habit_id, check_date))
+    Creates the rollup rows of the current week and month for every habit that does not have them yet, so
+    periods without any check-off still count as expected (no commit inside). Meant to run with the daily
+    streak refresh; periods skipped while the application was not running are filled in by backfill_rollups.
 
-    # Update the streaks table
-    cursor.execute("""UPDATE streaks SET current_streak = current_streak + 1 WHERE habit_id = %s""", (habit_id,))
-    cursor.execute("""UPDATE streaks SET longest_streak = current_streak WHERE habit_id = %s AND current_streak > longest_streak""", (habit_id,))
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        todays_date (datetime.date): The date whose week and month are created.
+        user_id (int | None): The user whose habits are refreshed, or None for the habits of every user.
+        habit_ids (Iterable[int] | None): The habits to refresh, or None to refresh every habit of the user.
 
-def update_streaks(cursor, habit_id: int, todays_date: datetime.date):
+    Returns:
+        int: The number of rollup rows created.
+    """
+    habit_filter = ""
+    filter_params = [todays_date]
+    if user_id is not None:
+        habit_filter += " AND user_id = %s"
+        filter_params.append(user_id)
+    if habit_ids is not None:
+        habit_ids = list(habit_ids)
+        if not habit_ids:
+            return 0
+        habit_filter += f" AND id IN ({', '.join(['%s'] * len(habit_ids))})"
+        filter_params.extend(habit_ids)
+
+    cursor.execute(
+        f"SELECT user_id, id, periodicity, date_created FROM habits WHERE date_created <= %s{habit_filter}",
+        filter_params,
+    )
+    habits = cursor.fetchall()
+
+    rows = []
+    for owner, habit_id, periodicity, date_created in habits:
+        for period in ROLLUP_PERIODS:
+            start = rollup_period_start(period, todays_date)
+            rows.append((owner, habit_id, period, start, _expected_count(periodicity, date_created, period, start), 0))
+    if not rows:
+        return 0
+
+    cursor.executemany(f"""
+        {_sql_insert_ignore(cursor)} INTO completion_rollups
+            (user_id, habit_id, period, period_start, expected_count, completed_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, rows)
+    return cursor.rowcount
+
+def backfill_rollups(cursor, todays_date: datetime.date, user_id: int = DEFAULT_USER_ID, batch_size: int = 10000):
+    """
+    Rebuilds the completion_rollups rows of a user from the habits and check_off_dates tables (no commit
+    inside): one row per habit and week or month from the habit's creation up to todays_date, plus the
+    periods of any check-offs outside that range. Used to fill the table for existing histories.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        todays_date (datetime.date): The last date rollups are created for.
+        user_id (int | None): The user whose rollups are rebuilt, or None for every user.
+        batch_size (int): The number of rows fetched and inserted at a time.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    user_filter = "" if user_id is None else "WHERE user_id = %s"
+    params = () if user_id is None else (user_id,)
+
+    cursor.execute(f"SELECT user_id, id, periodicity, date_created FROM habits {user_filter}", params)
+    habits = {habit_id: (owner, periodicity, date_created) for owner, habit_id, periodicity, date_created in cursor.fetchall()}
+
+    completed = {}  # (habit_id, period, period_start) -> completed_count
+    cursor.execute(f"SELECT habit_id, check_off_date FROM check_off_dates {user_filter}", params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for habit_id, check_date in rows:
+            for period in ROLLUP_PERIODS:
+                key = (habit_id, period, rollup_period_start(period, check_date))
+                completed[key] = completed.get(key, 0) + 1
+
+    for habit_id, (_, _, date_created) in habits.items():
+        for period in ROLLUP_PERIODS:
+            start = rollup_period_start(period, date_created)
+            while start <= todays_date:
+                completed.setdefault((habit_id, period, start), 0)
+                start = _rollup_period_end(period, start) + datetime.timedelta(days=1)
+
+    rows = []
+    for (habit_id, period, start), completed_count in completed.items():
+        owner, periodicity, date_created = habits[habit_id]
+        rows.append((owner, habit_id, period, start, _expected_count(periodicity, date_created, period, start),
+                     completed_count))
+
+    cursor.execute(f"DELETE FROM completion_rollups {user_filter}", params)
+    for start in range(0, len(rows), batch_size):
+        _upsert_rollups(cursor, rows[start:start + batch_size])
+    return len(rows)
+
+def get_completion_rates(cursor, start_date: datetime.date, end_date: datetime.date, period: str = "week",
+                         habit_ids=None, user_id: int = DEFAULT_USER_ID):
+    """
+    Get the completion rates of a user's habits over a date range by summing their weekly or monthly rollups.
+    Every week or month overlapping the range counts as a whole.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        start_date (datetime.date): The first day of the range.
+        end_date (datetime.date): The last day of the range.
+        period (str): One of ROLLUP_PERIODS, the granularity of the rollups summed.
+        habit_ids (Iterable[int] | None): The habits to report, or None for every habit of the user.
+        user_id (int): The user owning the habits.
+
+    Returns:
+        dict[int, dict]: For every habit with rollups in the range, the "completed" and "expected" check-offs
+        and the completion "rate" (completed / expected, at most 1.0).
+    """
+    query = """
+        SELECT habit_id, SUM(completed_count), SUM(expected_count) FROM completion_rollups
+        WHERE user_id = %s AND period = %s AND period_start BETWEEN %s AND %s
+    """
+    params = [user_id, period, rollup_period_start(period, start_date), end_date]
+    if habit_ids is not None:
+        habit_ids = list(habit_ids)
+        if not habit_ids:
+            return {}
+        query += f" AND habit_id IN ({', '.join(['%s'] * len(habit_ids))})"
+        params.extend(habit_ids)
+    cursor.execute(query + " GROUP BY habit_id", params)
+
+    rates = {}
+    for habit_id, completed_count, expected_count in cursor.fetchall():
+        completed_count, expected_count = int(completed_count), int(expected_count)
+        rate = min(1.0, completed_count / expected_count) if expected_count else 0.0
+        rates[habit_id] = {"completed": completed_count, "expected": expected_count, "rate": rate}
+    return rates
+
+def update_streaks(cursor, habit_id: int, todays_date: datetime.date, user_id: int = DEFAULT_USER_ID):
     """
     Updates the streaks table for a given habit id and date. Resets the current_streak to 0 if a habit streak is broken on that date; otherwise, leaves it unchanged.
+    Nothing is changed if the user has no such habit.
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
         habit_id (int): The unique identifier of the habit in the database.
         todays_date (datetime.date): Today's date when the habit was checked off.
+        user_id (int): The user owning the habit.
 
     Returns:
         None
     """
-
-    cursor.execute("SELECT periodicity FROM habits WHERE id = %s", (habit_id,))
-    result = cursor.fetchone()
-    periodicity = result[0]
-
-    streak_unbroken = False
+    if habit_catalog is not None:
+        habit = habit_catalog.get_habit(cursor, habit_id, user_id)
+        if habit is None:
+            return
+        periodicity = habit[1]
+    else:
+        cursor.execute("SELECT periodicity FROM habits WHERE user_id = %s AND id = %s", (user_id, habit_id))
+        result = cursor.fetchone()
+        if result is None:
+            return
+        periodicity = result[0]
 
     # Check if habit was checked off at least once in the last 'periodicity' days (before todays_date)
-    for i in range(0, periodicity + 1):
-        check_date = todays_date - datetime.timedelta(days=i)
-        cursor.execute("""SELECT 1 FROM check_off_dates WHERE habit_id = %s AND check_off_date = %s""", (habit_id, check_date))
-        if cursor.fetchone():
-            streak_unbroken = True
-            break
+    # with one range lookup on the (user_id, habit_id, check_off_date) index
+    window_start = todays_date - datetime.timedelta(days=periodicity)
+    cursor.execute("""
+        SELECT 1 FROM check_off_dates
+        WHERE user_id = %s AND habit_id = %s AND check_off_date BETWEEN %s AND %s
+        LIMIT 1
+    """, (user_id, habit_id, window_start, todays_date))
+    streak_unbroken = cursor.fetchone() is not None
 
     if not streak_unbroken:
         # Streak is broken, reset current streak to 0
-        cursor.execute("""UPDATE streaks SET current_streak = 0 WHERE habit_id = %s""", (habit_id,))
+        cursor.execute("""
+            UPDATE streaks SET current_streak = 0, streak_expires_on = NULL WHERE user_id = %s AND habit_id = %s
+        """, (user_id, habit_id))
     # Else: Do nothing if the streak is unbroken
 
-def get_all_habits(cursor):
+def refresh_all_streaks(cursor, todays_date: datetime.date, user_id: int = DEFAULT_USER_ID, habit_ids=None):
     """
-    Fetch all habit names from the database.
+    Resets the current_streak of every habit whose streak is broken on todays_date, using a single UPDATE
+    statement instead of calling update_streaks once per habit.
+
+    A streak is broken when the habit was not checked off at least once in the last 'periodicity' days
+    (todays_date included), which is the same rule update_streaks applies to a single habit. Check-offs keep
+    the streak_expires_on date of every current streak at the first day this is the case, so the statement
+    is a range scan of the (user_id, streak_expires_on) index that only reads the streaks expiring by
+    todays_date, and its cost does not depend on the number of habits. The expiry date of a reset streak
+    is cleared, so it is not read again on the following days.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        todays_date (datetime.date): The date on which the streaks are refreshed.
+        user_id (int | None): The user whose habits are refreshed, or None for the habits of every user.
+        habit_ids (Iterable[int] | None): The habits to refresh, or None to refresh every habit of the user.
+
+    Returns:
+        int: The number of habits whose current_streak was reset to 0.
+    """
+    streak_filter = ""
+    filter_params = []
+    if user_id is not None:
+        streak_filter += " AND user_id = %s"
+        filter_params.append(user_id)
+    if habit_ids is not None:
+        habit_ids = list(habit_ids)
+        if not habit_ids:
+            return 0
+        streak_filter += f" AND habit_id IN ({', '.join(['%s'] * len(habit_ids))})"
+        filter_params.extend(habit_ids)
+
+    query = f"""
+        UPDATE streaks
+        SET current_streak = 0, streak_expires_on = NULL
+        WHERE streak_expires_on <= %s{streak_filter}
+    """
+    cursor.execute(query, [todays_date] + filter_params)
+    return cursor.rowcount
+
+def rebuild_streaks(cursor, as_of_date: datetime.date, habit_ids=None, user_id: int = DEFAULT_USER_ID):
+    """
+    Recomputes current_streak, longest_streak and streak_expires_on in the streaks table from the
+    check_off_dates table (no commit inside), so the counters are correct no matter how often update_streaks
+    ran or in which order check-offs were inserted.
+
+    The computation is a single set-based statement (gaps-and-islands with window functions): check-offs of a
+    habit belong to the same streak as long as consecutive check-offs are at most 'periodicity' days apart.
+    The longest streak is the largest such run up to as_of_date; the current streak is the length of the
+    latest run, or 0 if its last check-off is more than 'periodicity' days before as_of_date.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        as_of_date (datetime.date): Check-offs after this date are ignored and current streaks are evaluated
+            on this date.
+        habit_ids (Iterable[int] | None): The habits to rebuild, or None to rebuild every habit of the user.
+        user_id (int | None): The user whose habits are rebuilt, or None for the habits of every user.
+
+    Returns:
+        int: The number of streak rows that changed.
+    """
+    check_off_filter = ""
+    habit_filter = "WHERE TRUE"
+    filter_params = []
+    if user_id is not None:
+        check_off_filter += " AND c.user_id = %s"
+        habit_filter += " AND h.user_id = %s"
+        filter_params.append(user_id)
+    if habit_ids is not None:
+        habit_ids = list(habit_ids)
+        if not habit_ids:
+            return 0
+        id_placeholders = ", ".join(["%s"] * len(habit_ids))
+        check_off_filter += f" AND c.habit_id IN ({id_placeholders})"
+        habit_filter += f" AND h.id IN ({id_placeholders})"
+        filter_params.extend(habit_ids)
+
+    previous_check_off = "LAG(c.check_off_date) OVER (PARTITION BY c.habit_id ORDER BY c.check_off_date)"
+    gap_days = _sql_days_between(cursor, "c.check_off_date", previous_check_off)
+    days_since_run_end = _sql_days_between(cursor, "%s", "runs.run_end")
+
+    streaks_query = f"""
+        WITH gaps AS (
+            SELECT c.habit_id, c.check_off_date,
+                   CASE
+                       WHEN {gap_days} <= h.periodicity
+                       THEN 0
+                       ELSE 1
+                   END AS starts_run
+            FROM check_off_dates c
+            JOIN habits h ON h.id = c.habit_id
+            WHERE c.check_off_date <= %s {check_off_filter}
+        ),
+        islands AS (
+            SELECT habit_id, check_off_date,
+                   SUM(starts_run) OVER (PARTITION BY habit_id ORDER BY check_off_date) AS run_id
+            FROM gaps
+        ),
+        runs AS (
+            SELECT habit_id, run_id, COUNT(*) AS run_length, MAX(check_off_date) AS run_end,
+                   ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY run_id DESC) AS run_rank
+            FROM islands
+            GROUP BY habit_id, run_id
+        ),
+        habit_streaks AS (
+            SELECT h.id AS habit_id,
+                   MAX(CASE
+                           WHEN runs.run_rank = 1 AND {days_since_run_end} <= h.periodicity
+                           THEN runs.run_length
+                           ELSE 0
+                       END) AS current_streak,
+                   COALESCE(MAX(runs.run_length), 0) AS longest_streak,
+                   MAX(CASE
+                           WHEN runs.run_rank = 1 AND {days_since_run_end} <= h.periodicity
+                           THEN {_sql_add_days(cursor, "runs.run_end", "h.periodicity + 1")}
+                       END) AS streak_expires_on
+            FROM habits h
+            LEFT JOIN runs ON runs.habit_id = h.id
+            {habit_filter}
+            GROUP BY h.id
+        )
+    """
+
+    # Only rows whose counters or expiry date differ are written, so the row count means the same on both
+    # backends
+    expiry_changed = (
+        "streaks.streak_expires_on IS NOT habit_streaks.streak_expires_on" if dialect(cursor) == "sqlite"
+        else "NOT (streaks.streak_expires_on <=> habit_streaks.streak_expires_on)"
+    )
+    changed = f"""
+        (streaks.current_streak <> habit_streaks.current_streak
+         OR streaks.longest_streak <> habit_streaks.longest_streak
+         OR {expiry_changed})
+    """
+    if dialect(cursor) == "sqlite":
+        # The CTEs go into a subquery, because sqlite3 reports no row count for statements starting with WITH
+        query = f"""
+            UPDATE streaks
+            SET current_streak = habit_streaks.current_streak,
+                longest_streak = habit_streaks.longest_streak,
+                streak_expires_on = habit_streaks.streak_expires_on
+            FROM ({streaks_query} SELECT * FROM habit_streaks) AS habit_streaks
+            WHERE habit_streaks.habit_id = streaks.habit_id AND {changed}
+        """
+    else:
+        query = streaks_query + f"""
+            UPDATE streaks
+            JOIN habit_streaks ON habit_streaks.habit_id = streaks.habit_id
+            SET streaks.current_streak = habit_streaks.current_streak,
+                streaks.longest_streak = habit_streaks.longest_streak,
+                streaks.streak_expires_on = habit_streaks.streak_expires_on
+            WHERE {changed}
+        """
+
+    cursor.execute(query,
+                   [as_of_date] + filter_params + [as_of_date, as_of_date] + filter_params)
+    return cursor.rowcount
+
+def get_all_habits(cursor, user_id: int = DEFAULT_USER_ID):
+    """
+    Fetch all habit names of a user from the database.
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor.
+        user_id (int): The user owning the habits.
 
     Returns:
         list of str: List of habit names.
     """
-    query = "SELECT habit_name FROM habits"
-    cursor.execute(query)
+    query = "SELECT habit_name FROM habits WHERE user_id = %s"
+    cursor.execute(query, (user_id,))
     results = cursor.fetchall()
     return [row[0] for row in results]  # Extract habit names from tuples
 
-def get_longest_streak(cursor, habit_id: int):
+def get_longest_streak(cursor, habit_id: int, user_id: int = DEFAULT_USER_ID, as_of_date: datetime.date = None):
     """
-    Retrieve the longest streak for a given habit ID.
+    Retrieve the longest streak for a given habit ID, now or up to a past date (see streaks_as_of).
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
         habit_id (int): The unique identifier of the habit.
+        user_id (int): The user owning the habit.
+        as_of_date (datetime.date | None): Ignore check-offs after this date, or None for the stored streak.
 
     Returns:
         int | None: The longest streak value, or None if not found.
     """
-    cursor.execute("SELECT longest_streak FROM streaks WHERE habit_id = %s", (habit_id,))
+    if as_of_date is not None:
+        streaks = streaks_as_of(cursor, habit_id, as_of_date, user_id)
+        return streaks[1] if streaks is not None else None
+
+    cursor.execute("SELECT longest_streak FROM streaks WHERE user_id = %s AND habit_id = %s", (user_id, habit_id))
     result = cursor.fetchone()
 
     if result:
@@ -235,38 +1485,123 @@ def get_longest_streak(cursor, habit_id: int):
     else:
         return None
 
-def get_current_streak(cursor, habit_id: int):
+def get_current_streak(cursor, habit_id: int, user_id: int = DEFAULT_USER_ID, as_of_date: datetime.date = None):
     """
-    Get the current streak for a habit by habit_id.
+    Get the current streak for a habit by habit_id, now or as it was on a past date (see streaks_as_of).
 
     Args:
         cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor.
         habit_id (int): The id of the habit.
+        user_id (int): The user owning the habit.
+        as_of_date (datetime.date | None): The date on which the streak is evaluated, or None for the stored streak.
 
     Returns:
         int: The current streak count (0 if none found).
     """
-    query = "SELECT current_streak FROM streaks WHERE habit_id = %s"
-    cursor.execute(query, (habit_id,))
+    if as_of_date is not None:
+        streaks = streaks_as_of(cursor, habit_id, as_of_date, user_id)
+        return streaks[0] if streaks is not None else 0
+
+    query = "SELECT current_streak FROM streaks WHERE user_id = %s AND habit_id = %s"
+    cursor.execute(query, (user_id, habit_id))
     result = cursor.fetchone()
     if result:
         return result[0]
     else:
         return 0
 
-def get_habit_by_periodicity(cursor, period: int):
+def streaks_as_of(cursor, habit_id: int, as_of_date: datetime.date, user_id: int = DEFAULT_USER_ID):
+    """
+    Compute the current and longest streak of a habit as they were on as_of_date, ignoring later check-offs.
+    With the check-off index enabled, the answer is two bisections of the habit's indexed check-off dates.
+    Otherwise the habit's check-offs up to as_of_date are read and their runs computed once.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        habit_id (int): The unique identifier of the habit.
+        as_of_date (datetime.date): The date on which the streaks are evaluated.
+        user_id (int): The user owning the habit.
+
+    Returns:
+        tuple[int, int] | None: (current_streak, longest_streak) on as_of_date, or None if the user has no
+        such habit.
+    """
+    index = check_off_index
+    if index is None or habit_id not in index:
+        schedule = _habit_schedule(cursor, habit_id, user_id)
+        if schedule is None:
+            return None
+        cursor.execute("""
+            SELECT check_off_date FROM check_off_dates
+            WHERE user_id = %s AND habit_id = %s AND check_off_date <= %s
+        """, (user_id, habit_id, as_of_date))
+        index = CheckOffIndex()
+        index.add_habit(habit_id, schedule[0], [row[0] for row in cursor.fetchall()])
+
+    current_streak = index.current_streak(habit_id, as_of_date, user_id)
+    if current_streak is None:
+        return None
+    return current_streak, index.longest_streak(habit_id, as_of_date, user_id)
+
+def get_habit_by_periodicity(cursor, period: int, user_id: int = DEFAULT_USER_ID):
     """
-    Retrieves habits with the specified periodicity.
+    Retrieves habits of a user with the specified periodicity.
 
     Args:
         cursor: Database cursor object.
         period (int): Periodicity in days to filter habits.
+        user_id (int): The user owning the habits.
 
     Returns:
         list[str]: List of habit names with the given periodicity.
     """
-    query = "SELECT habit_name FROM habits WHERE periodicity = %s"
-    cursor.execute(query, (period,))
+    query = "SELECT habit_name FROM habits WHERE user_id = %s AND periodicity = %s"
+    cursor.execute(query, (user_id, period))
     habits = cursor.fetchall()
 
     return [habit[0] for habit in habits]
+
+def iter_habits_with_streaks(cursor, user_id: int = DEFAULT_USER_ID, periodicity: int = None,
+                             order_by: str = "name", descending: bool = False, batch_size: int = 1000):
+    """
+    Stream the habits of a user together with their current and longest streak.
+
+    The habits and streaks tables are joined in one query and the rows are fetched batch_size at a time,
+    so listing any number of habits takes one round trip per batch and constant memory. The cursor must not
+    be used for other queries until the generator is exhausted or closed.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        user_id (int): The user owning the habits.
+        periodicity (int | None): Only list habits with this periodicity, or None to list all habits.
+        order_by (str): One of the keys of HABIT_LISTING_ORDER.
+        descending (bool): Sort in descending instead of ascending order.
+        batch_size (int): The number of rows fetched at a time.
+
+    Yields:
+        HabitWithStreaks: One row per habit. Habits without a streaks row have streaks of 0.
+    """
+    if order_by not in HABIT_LISTING_ORDER:
+        raise ValueError(f"Cannot order habits by '{order_by}', expected one of {', '.join(HABIT_LISTING_ORDER)}.")
+
+    direction = "DESC" if descending else "ASC"
+    periodicity_filter = "" if periodicity is None else "AND h.periodicity = %s"
+    params = (user_id,) if periodicity is None else (user_id, periodicity)
+
+    query = f"""
+        SELECT h.id, h.habit_name, h.periodicity, h.date_created,
+               COALESCE(s.current_streak, 0) AS current_streak,
+               COALESCE(s.longest_streak, 0) AS longest_streak
+        FROM habits h
+        LEFT JOIN streaks s ON s.user_id = h.user_id AND s.habit_id = h.id
+        WHERE h.user_id = %s {periodicity_filter}
+        ORDER BY {HABIT_LISTING_ORDER[order_by]} {direction}, h.id {direction}
+    """
+    cursor.execute(query, params)
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            yield HabitWithStreaks(*row)
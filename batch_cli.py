@@ -0,0 +1,484 @@
+import argparse
+import contextlib
+import datetime
+import functools
+import json
+import os
+import shlex
+import sys
+import time
+
+import analytics
+import data_transfer
+from database import open_database
+from habit_catalog import HabitCatalog
+from habit_class import Habit, DEFAULT_USER_ID
+from instrumentation import QueryStats
+
+# Operations that change the database are committed in groups of this many unless --commit-every says otherwise
+DEFAULT_COMMIT_EVERY = 1000
+
+
+class CommandError(Exception):
+    """
+    A command could not be run, e.g. because it names a habit that does not exist.
+    """
+
+
+class ScriptRunner:
+    """
+    Runs the commands of a script over one database session at a time, committing every commit_every
+    operations that change the database, or once at the end if commit_every is 0.
+
+    Every command produces one JSON-serializable record: {"command": ..., "ok": true, "result": ...} or
+    {"command": ..., "ok": false, "error": ...}. If a command fails with a database error, the operations
+    since the last commit are rolled back and the record reports how many.
+
+    Check-offs only insert the check-off and update the completion rollups; the streaks of the checked-off
+    habits are rebuilt with one rebuild_streaks before the next command of another kind and before every
+    commit. Scripts can therefore check off habits in any date order without walking a streak per check-off.
+
+    Attributes:
+        commit_every (int): The number of changing operations per commit, or 0 to commit once at the end.
+        todays_date (datetime.date): The date check-offs without a date are recorded for.
+        user_id (int): The user whose habits the commands manage.
+        commits (int): The number of commits so far.
+        errors (int): The number of failed commands so far.
+    """
+
+    def __init__(self, database, todays_date: datetime.date, user_id: int = DEFAULT_USER_ID,
+                 commit_every: int = DEFAULT_COMMIT_EVERY):
+        """
+        Initialize a ScriptRunner.
+
+        Args:
+            database (database.Database | sqlite_backend.SQLiteDatabase): The habits database.
+            todays_date (datetime.date): The date check-offs without a date are recorded for.
+            user_id (int): The user whose habits the commands manage.
+            commit_every (int): The number of changing operations per commit, or 0 to commit once at the end.
+        """
+        if commit_every < 0:
+            raise ValueError("commit_every must not be negative.")
+
+        self.database = database
+        self.todays_date = todays_date
+        self.user_id = user_id
+        self.commit_every = commit_every
+        self.commits = 0
+        self.errors = 0
+        self._session = None
+        self._cursor = None
+        self._pending = 0           # Changing operations since the last commit
+        self._stale_streaks = set()  # Habits checked off since their streaks were last rebuilt
+
+    def execute(self, args):
+        """
+        Run one parsed command.
+
+        Args:
+            args (argparse.Namespace): The command, as parsed by build_parser().
+
+        Returns:
+            dict: The record of the command.
+        """
+        record = {"command": args.command}
+        if args.handler is import_data:
+            self.commit()  # The import commits in chunks in sessions of its own, so it gets the database
+            cursor = self.database
+        else:
+            cursor = self._get_cursor()
+
+        try:
+            if args.handler is not check_off:
+                self._rebuild_streaks()
+            with contextlib.redirect_stdout(sys.stderr):  # Keep the messages of the analytics module out of the records
+                result = args.handler(cursor, self, args)
+        except CommandError as err:
+            self.errors += 1
+            record.update(ok=False, error=str(err))
+            return record
+        except analytics.DATABASE_ERRORS as err:
+            self.errors += 1
+            record.update(ok=False, error=f"Database query failed: {err}", rolled_back=self.rollback())
+            return record
+
+        record.update(ok=True, result=result)
+        if args.writes:
+            self._pending += 1
+            if self.commit_every and self._pending >= self.commit_every:
+                self.commit()
+        return record
+
+    def commit(self):
+        """
+        Commit the operations run since the last commit.
+
+        Returns:
+            None
+        """
+        if self._session is not None:
+            self._rebuild_streaks()
+            session, self._session, self._cursor = self._session, None, None
+            session.__exit__(None, None, None)
+            if self._pending:
+                self.commits += 1
+            self._pending = 0
+
+    def rollback(self):
+        """
+        Roll back the operations run since the last commit.
+
+        Returns:
+            int: The number of changing operations rolled back.
+        """
+        rolled_back = self._pending
+        self._stale_streaks.clear()
+        if self._session is not None:
+            session, self._session, self._cursor = self._session, None, None
+            session.__exit__(CommandError, CommandError("rolled back"), None)  # Rolls back and swallows the error
+        self._pending = 0
+        return rolled_back
+
+    def mark_stale(self, habit_id: int):
+        """
+        Note that a habit was checked off without updating its streaks.
+        """
+        self._stale_streaks.add(habit_id)
+
+    def _rebuild_streaks(self):
+        if self._stale_streaks:
+            analytics.rebuild_streaks(self._cursor, self.todays_date, sorted(self._stale_streaks), self.user_id)
+            self._stale_streaks.clear()
+
+    def _get_cursor(self):
+        if self._session is None:
+            self._session = self.database.session()
+            self._cursor = self._session.__enter__()
+        return self._cursor
+
+
+def create_habit(cursor, runner, args):
+    if args.periodicity < 1:
+        raise CommandError("The periodicity must be at least 1 day.")
+    habit = Habit(args.name, args.periodicity, args.created or runner.todays_date, runner.user_id)
+    habit_id = analytics.create_habit(cursor, habit)
+    if habit_id is None:
+        raise CommandError(f"Habit '{args.name}' already exists.")
+    return {"habit_id": habit_id, "name": args.name, "periodicity": args.periodicity}
+
+
+def check_off(cursor, runner, args):
+    habit_id = _habit_id(cursor, runner, args.name)
+    check_date = args.date or runner.todays_date
+    if check_date > runner.todays_date:
+        raise CommandError(f"Cannot check off a habit for {check_date}, which is after {runner.todays_date}.")
+
+    recorded = analytics.record_check_off(cursor, habit_id, check_date, runner.user_id)
+    if recorded:
+        runner.mark_stale(habit_id)
+    return {"habit_id": habit_id, "date": check_date.isoformat(), "new": recorded}
+
+
+def delete_habit(cursor, runner, args):
+    habit_id = _habit_id(cursor, runner, args.name)
+    analytics.delete_habit(cursor, habit_id, runner.user_id)
+    return {"habit_id": habit_id}
+
+
+def list_habits(cursor, runner, args):
+    if args.periodicity is None:
+        return analytics.get_all_habits(cursor, runner.user_id)
+    return analytics.get_habit_by_periodicity(cursor, args.periodicity, runner.user_id)
+
+
+def list_habits_with_streaks(cursor, runner, args):
+    return [
+        {"habit_id": habit.habit_id, "name": habit.name, "periodicity": habit.periodicity,
+         "current_streak": habit.current_streak, "longest_streak": habit.longest_streak}
+        for habit in analytics.iter_habits_with_streaks(cursor, runner.user_id, args.periodicity, args.order_by)
+    ]
+
+
+def get_longest_streak(cursor, runner, args):
+    habit_id = _habit_id(cursor, runner, args.name)
+    longest_streak = analytics.get_longest_streak(cursor, habit_id, runner.user_id, args.date)
+    return {"habit_id": habit_id, "longest_streak": longest_streak}
+
+
+def get_current_streak(cursor, runner, args):
+    habit_id = _habit_id(cursor, runner, args.name)
+    current_streak = analytics.get_current_streak(cursor, habit_id, runner.user_id, args.date)
+    return {"habit_id": habit_id, "current_streak": current_streak}
+
+
+def get_completion_rate(cursor, runner, args):
+    habit_id = _habit_id(cursor, runner, args.name)
+    rates = analytics.get_completion_rates(cursor, args.start, args.end, args.period, [habit_id], runner.user_id)
+    return {"habit_id": habit_id, **rates.get(habit_id, {"completed": 0, "expected": 0, "rate": None})}
+
+
+def backfill_rollups(cursor, runner, args):
+    return {"rollups": analytics.backfill_rollups(cursor, runner.todays_date, runner.user_id)}
+
+
+def export_data(cursor, runner, args):
+    try:
+        return data_transfer.export_data(cursor, args.directory, args.file_format, runner.user_id)
+    except OSError as err:
+        raise CommandError(f"Export failed: {err}") from None
+
+
+def import_data(database, runner, args):
+    try:
+        return data_transfer.import_data(database, args.directory, args.file_format, runner.user_id, runner.todays_date)
+    except (OSError, ValueError) as err:
+        raise CommandError(f"Import failed: {err}") from None
+
+
+def stats(cursor, runner, args):
+    query_stats = runner.database.query_stats
+    if query_stats is None:
+        return None
+    return {**query_stats.to_dict(), "prepared_statements": runner.database.statement_counts.to_dict()}
+
+
+def _habit_id(cursor, runner, name):
+    habit_id = analytics.get_habit_id(cursor, name, runner.user_id)
+    if habit_id is None:
+        raise CommandError(f"Habit '{name}' does not exist.")
+    return habit_id
+
+
+def build_parser():
+    """
+    Build the parser of the commands, with one subcommand per command of the interactive interface. Script
+    lines are parsed with the same subcommands.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog="user_interface.py",
+        description="Run Habits commands without the interactive prompt. Every command prints one JSON record.",
+    )
+    parser.add_argument("--dsn", help="the habits database, defaults to $HABITS_DATABASE_URL")
+    parser.add_argument("--user-id", type=int, default=int(os.environ.get("HABITS_USER_ID", DEFAULT_USER_ID)),
+                        help="the user whose habits are managed, defaults to $HABITS_USER_ID or 1")
+    parser.add_argument("--today", type=_date, default=None, help="the date to use as today (YYYY-MM-DD)")
+    parser.add_argument("--commit-every", type=int, default=DEFAULT_COMMIT_EVERY,
+                        help=f"commit every N changing operations, 0 to commit once at the end "
+                             f"(default {DEFAULT_COMMIT_EVERY})")
+    parser.add_argument("--stats", action="store_true", help="collect query statistics for the STATS command")
+
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+    _add_commands(commands)
+
+    run_parser = commands.add_parser("run", help="run the commands of a script file, one per line ('-' for stdin)")
+    run_parser.add_argument("script", help="the script file, or - to read the commands from stdin")
+    run_parser.add_argument("--stop-on-error", action="store_true", help="stop at the first failed command")
+    return parser
+
+
+def build_command_parser():
+    """
+    Build the parser of one script line: the subcommands of build_parser() without the global options.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = _LineParser(prog="script", add_help=False)
+    _add_commands(parser.add_subparsers(dest="command", required=True, metavar="command"), add_help=False)
+    return parser
+
+
+def _add_commands(commands, **parser_options):
+    # parser_options are passed to every subcommand parser, e.g. add_help=False for script lines
+    add_parser = functools.partial(commands.add_parser, **parser_options)
+
+    command = add_parser("create-habit", help="create a new habit")
+    command.add_argument("name")
+    command.add_argument("periodicity", type=int, help="the number of days between check-offs")
+    command.add_argument("--created", type=_date, help="the creation date, defaults to today")
+    command.set_defaults(handler=create_habit, writes=True)
+
+    command = add_parser("check-off", help="mark a habit as completed for today or an earlier date")
+    command.add_argument("name")
+    command.add_argument("--date", type=_date, help="the date of the check-off, defaults to today")
+    command.set_defaults(handler=check_off, writes=True)
+
+    command = add_parser("delete-habit", help="delete a habit and its check-off history")
+    command.add_argument("name")
+    command.set_defaults(handler=delete_habit, writes=True)
+
+    command = add_parser("list-habits", help="list the habit names")
+    command.add_argument("--periodicity", type=int, help="only list habits with this periodicity")
+    command.set_defaults(handler=list_habits, writes=False)
+
+    command = add_parser("list-habits-with-streaks", help="list the habits with their streaks")
+    command.add_argument("--periodicity", type=int, help="only list habits with this periodicity")
+    command.add_argument("--order-by", choices=sorted(analytics.HABIT_LISTING_ORDER), default="name")
+    command.set_defaults(handler=list_habits_with_streaks, writes=False)
+
+    command = add_parser("get-longest-streak", help="get the longest streak of a habit")
+    command.add_argument("name")
+    command.add_argument("--date", type=_date, help="ignore check-offs after this date, defaults to the stored streak")
+    command.set_defaults(handler=get_longest_streak, writes=False)
+
+    command = add_parser("get-current-streak", help="get the current streak of a habit")
+    command.add_argument("name")
+    command.add_argument("--date", type=_date, help="the date to evaluate the streak on, defaults to the stored streak")
+    command.set_defaults(handler=get_current_streak, writes=False)
+
+    command = add_parser("get-completion-rate", help="get the completion rate of a habit between two dates")
+    command.add_argument("name")
+    command.add_argument("start", type=_date)
+    command.add_argument("end", type=_date)
+    command.add_argument("--period", choices=analytics.ROLLUP_PERIODS, default="week")
+    command.set_defaults(handler=get_completion_rate, writes=False)
+
+    command = add_parser("backfill-rollups", help="recompute the completion rates from the check-off history")
+    command.set_defaults(handler=backfill_rollups, writes=True)
+
+    command = add_parser("export-data", help="export habits and check-offs to CSV or JSON Lines files")
+    command.add_argument("directory")
+    command.add_argument("--format", dest="file_format", choices=data_transfer.FORMATS, default="csv")
+    command.set_defaults(handler=export_data, writes=False)
+
+    command = add_parser("import-data", help="import habits and check-offs from exported files")
+    command.add_argument("directory")
+    command.add_argument("--format", dest="file_format", choices=data_transfer.FORMATS, default="csv")
+    command.set_defaults(handler=import_data, writes=False)
+
+    command = add_parser("stats", help="show the database statements run so far")
+    command.set_defaults(handler=stats, writes=False)
+
+
+class _LineParser(argparse.ArgumentParser):
+    # Report a bad script line as an error record instead of exiting, so the commands before it are kept
+    def error(self, message):
+        raise CommandError(message)
+
+    def exit(self, status=0, message=None):
+        raise CommandError(message.strip() if message else "This command cannot be used in a script.")
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', expected YYYY-MM-DD") from None
+
+
+def iter_script(file):
+    """
+    Read the commands of a script: one command per line with shell-like quoting, e.g.
+    check-off "Water the Plants" --date 2025-04-01. Blank lines and lines starting with # are skipped.
+
+    Args:
+        file (TextIO): The script.
+
+    Yields:
+        tuple[int, str]: The line number and the command line, split into words by split_command.
+    """
+    for line_number, line in enumerate(file, start=1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line_number, line
+
+
+def split_command(line: str):
+    """
+    Split a script line into the words of its command, with shell-like quoting.
+
+    Args:
+        line (str): The command line.
+
+    Returns:
+        list[str]: The words of the command.
+
+    Raises:
+        CommandError: If the line cannot be split, e.g. because of an unbalanced quote.
+    """
+    try:
+        return shlex.split(line)
+    except ValueError as err:
+        raise CommandError(f"Invalid command line: {err}.") from None
+
+
+def run_script(runner: ScriptRunner, file, output, stop_on_error: bool = False):
+    """
+    Run the commands of a script and write their records to output as JSON Lines, each with its line number.
+
+    Args:
+        runner (ScriptRunner): The runner to run the commands with.
+        file (TextIO): The script.
+        output (TextIO): The stream the records are written to.
+        stop_on_error (bool): Stop at the first failed command; the operations since the last commit are rolled back.
+
+    Returns:
+        int: The number of commands run.
+    """
+    parser = build_command_parser()
+    count = 0
+    for line_number, line in iter_script(file):
+        try:
+            args = parser.parse_args(split_command(line))
+        except CommandError as err:
+            runner.errors += 1
+            record = {"command": line.split()[0], "ok": False, "error": str(err)}
+        else:
+            record = runner.execute(args)
+        count += 1
+        output.write(json.dumps({"line": line_number, **record}, default=str) + "\n")
+
+        if stop_on_error and not record["ok"]:
+            runner.rollback()
+            break
+    runner.commit()
+    return count
+
+
+def main(argv=None):
+    """
+    Command-line entry point of the non-interactive mode: run one command, or a script of commands with
+    'run', and print one JSON record per command. Exits with status 1 if a command failed.
+    """
+    args = build_parser().parse_args(argv)
+    started = time.perf_counter()
+
+    with contextlib.redirect_stdout(sys.stderr):  # Database messages are not records
+        try:
+            database = open_database(args.dsn)
+        except analytics.DATABASE_ERRORS as err:
+            print("Database connection failed:", err)
+            return 1
+        if args.stats:
+            database.query_stats = QueryStats()
+
+        todays_date = args.today or datetime.date.today()
+        catalog = HabitCatalog()
+        database.run(catalog.load, args.user_id)
+        analytics.use_habit_catalog(catalog)
+        # A script runs the refresh before its first command, unlike the interactive prompt
+        database.run(analytics.refresh_all_streaks, todays_date, args.user_id)
+        database.run(analytics.refresh_rollups, todays_date, args.user_id)
+
+    runner = ScriptRunner(database, todays_date, args.user_id, args.commit_every)
+    if args.command == "run":
+        if args.script == "-":
+            count = run_script(runner, sys.stdin, sys.stdout, args.stop_on_error)
+        else:
+            with open(args.script, encoding="utf-8") as file:
+                count = run_script(runner, file, sys.stdout, args.stop_on_error)
+        print(f"{count} command(s), {runner.errors} failed, {runner.commits} commit(s) in "
+              f"{time.perf_counter() - started:.2f}s", file=sys.stderr)
+    else:
+        record = runner.execute(args)
+        runner.commit()
+        print(json.dumps(record, default=str))
+
+    return 1 if runner.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import random
+import sys
+import time
+
+import analytics
+from database import open_database
+from habit_catalog import HabitCatalog
+from habit_class import Habit
+from instrumentation import InstrumentedCursor, QueryStats
+
+# Share of habits per periodicity in the generated history
+DEFAULT_PERIODICITY_MIX = {1: 0.6, 3: 0.1, 7: 0.3}
+
+# Benchmark results whose p50 or p99 latency grew by more than this fraction are reported as regressions
+DEFAULT_THRESHOLD = 0.25
+
+# Each scale runs as its own user, so the benchmark can share a scratch database with earlier runs
+BENCHMARK_USER_ID_BASE = 1000000
+
+
+def generate_history(habit_count: int, years: float, end_date: datetime.date, periodicity_mix=None,
+                     density: float = 0.8, seed: int = 0):
+    """
+    Generate a reproducible synthetic habit history. Every habit is created years before end_date and
+    checked off once per period with probability density, on a random day of the period.
+
+    Args:
+        habit_count (int): The number of habits.
+        years (float): The length of the history in years.
+        end_date (datetime.date): The date of the last possible check-off.
+        periodicity_mix (dict[int, float]): Relative share of habits per periodicity, defaults to DEFAULT_PERIODICITY_MIX.
+        density (float): The probability that a habit is checked off in a period, between 0 and 1.
+        seed (int): The seed of the random generator; the same arguments always generate the same history.
+
+    Returns:
+        list[tuple[Habit, list[datetime.date]]]: The habits and their sorted check-off dates.
+    """
+    generator = random.Random(seed)
+    periodicity_mix = periodicity_mix or DEFAULT_PERIODICITY_MIX
+    periodicities, weights = zip(*sorted(periodicity_mix.items()))
+    start_date = end_date - datetime.timedelta(days=int(years * 365))
+
+    history = []
+    for number in range(habit_count):
+        periodicity = generator.choices(periodicities, weights)[0]
+        habit = Habit(f"Habit {number:06d}", periodicity, start_date)
+
+        check_off_dates = []
+        period_start = start_date
+        while period_start <= end_date:
+            if generator.random() < density:
+                check_date = period_start + datetime.timedelta(days=generator.randrange(periodicity))
+                if check_date <= end_date:
+                    check_off_dates.append(check_date)
+            period_start += datetime.timedelta(days=periodicity)
+        history.append((habit, check_off_dates))
+
+    return history
+
+
+def load_history(database, history, user_id: int, as_of_date: datetime.date, batch_size: int = 10000):
+    """
+    Replace the habits of user_id with a generated history, using bulk statements.
+
+    Args:
+        database (database.Database | sqlite_backend.SQLiteDatabase): The database to load into.
+        history (list[tuple[Habit, list[datetime.date]]]): The output of generate_history.
+        user_id (int): The user owning the loaded habits.
+        as_of_date (datetime.date): The date the streaks are computed for.
+        batch_size (int): The number of rows per statement.
+
+    Returns:
+        dict[str, int]: The habit ids by habit name.
+    """
+    with database.session() as cursor:
+        cursor.execute("DELETE FROM habits WHERE user_id = %s", (user_id,))
+        cursor.executemany(
+            "INSERT INTO habits (user_id, habit_name, periodicity, date_created) VALUES (%s, %s, %s, %s)",
+            [(user_id, habit.name, habit.periodicity, habit.date_created) for habit, _ in history],
+        )
+        cursor.execute("SELECT id, habit_name FROM habits WHERE user_id = %s", (user_id,))
+        habit_ids = {name: habit_id for habit_id, name in cursor.fetchall()}
+        cursor.executemany(
+            "INSERT INTO streaks (user_id, habit_id, current_streak, longest_streak) VALUES (%s, %s, 0, 0)",
+            [(user_id, habit_id) for habit_id in habit_ids.values()],
+        )
+
+    rows = [(user_id, habit_ids[habit.name], check_date) for habit, dates in history for check_date in dates]
+    for start in range(0, len(rows), batch_size):
+        with database.session() as cursor:
+            cursor.executemany(
+                "INSERT INTO check_off_dates (user_id, habit_id, check_off_date) VALUES (%s, %s, %s)",
+                rows[start:start + batch_size],
+            )
+
+    with database.session() as cursor:
+        analytics.rebuild_streaks(cursor, as_of_date, user_id=user_id)
+
+    return habit_ids
+
+
+def measure(database, function, *args):
+    """
+    Run function(cursor, *args) in its own session, like one CLI command.
+
+    Returns:
+        tuple[float, int]: The latency in milliseconds, commit included, and the number of statements executed.
+    """
+    stats = QueryStats()
+    started = time.perf_counter()
+    with database.session() as cursor:
+        function(InstrumentedCursor(cursor, stats), *args)
+    return (time.perf_counter() - started) * 1000, stats.round_trips
+
+
+def summarize(samples):
+    """
+    Summarize a list of (latency in ms, statement count) samples.
+
+    Returns:
+        dict: The number of calls, p50 and p99 latency in ms, and statements per call.
+    """
+    latencies = sorted(latency for latency, _ in samples)
+    return {
+        "calls": len(samples),
+        "p50_ms": round(_percentile(latencies, 50), 4),
+        "p99_ms": round(_percentile(latencies, 99), 4),
+        "queries_per_call": round(sum(queries for _, queries in samples) / len(samples), 2),
+    }
+
+
+def run_scale(database, habit_count: int, years: float, today: datetime.date, calls: int = 100,
+              periodicity_mix=None, density: float = 0.8, seed: int = 0):
+    """
+    Load a generated history of habit_count habits and time the analytics operations the CLI runs on it.
+
+    Args:
+        database (database.Database | sqlite_backend.SQLiteDatabase): A scratch database.
+        habit_count (int): The number of habits.
+        years (float): The length of the history in years.
+        today (datetime.date): The date the operations run on.
+        calls (int): The number of calls timed per operation, at most one per habit for check-offs;
+            whole-table operations run calls // 10 times.
+        periodicity_mix (dict[int, float]): See generate_history.
+        density (float): See generate_history.
+        seed (int): See generate_history.
+
+    Returns:
+        dict[str, dict]: The summary of every operation.
+    """
+    user_id = BENCHMARK_USER_ID_BASE + habit_count
+    history = generate_history(habit_count, years, today - datetime.timedelta(days=1), periodicity_mix, density, seed)
+    habit_ids = list(load_history(database, history, user_id, today).values())
+
+    generator = random.Random(seed)
+    sampled_ids = generator.sample(habit_ids, min(calls, len(habit_ids)))  # A habit is checked off once per day
+    repeats = max(1, calls // 10)
+
+    def startup(cursor):
+        analytics.refresh_all_streaks(cursor, today, user_id)
+        HabitCatalog().load(cursor, user_id)
+
+    def list_with_streaks(cursor):
+        for _ in analytics.iter_habits_with_streaks(cursor, user_id):
+            pass
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["create_habit"] = summarize([
+            measure(database, analytics.create_habit, Habit(f"New habit {number:06d}", 1, today, user_id))
+            for number in range(calls)
+        ])
+    results["check_off_habit"] = summarize([
+        measure(database, analytics.check_off_habit, habit_id, today, user_id) for habit_id in sampled_ids
+    ])
+    results["update_streaks"] = summarize([
+        measure(database, analytics.update_streaks, habit_id, today, user_id) for habit_id in sampled_ids
+    ])
+    results["startup_refresh"] = summarize([measure(database, startup) for _ in range(repeats)])
+    results["list_habits"] = summarize([
+        measure(database, analytics.get_all_habits, user_id) for _ in range(repeats)
+    ])
+    results["list_habits_with_streaks"] = summarize([measure(database, list_with_streaks) for _ in range(repeats)])
+
+    with database.session() as cursor:
+        cursor.execute("DELETE FROM habits WHERE user_id = %s", (user_id,))
+
+    return results
+
+
+def compare(baseline, results, threshold: float = DEFAULT_THRESHOLD):
+    """
+    Compare benchmark results with a baseline.
+
+    Args:
+        baseline (dict): Earlier output of run_benchmarks.
+        results (dict): Current output of run_benchmarks.
+        threshold (float): The allowed relative growth of a latency.
+
+    Returns:
+        list[str]: One message per regression; empty if there are none.
+    """
+    regressions = []
+    for scale, operations in results["scales"].items():
+        for operation, summary in operations.items():
+            expected = baseline.get("scales", {}).get(scale, {}).get(operation)
+            if expected is None:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                if summary[metric] > expected[metric] * (1 + threshold):
+                    regressions.append(
+                        f"{operation} at {scale} habits: {metric} {summary[metric]} > baseline {expected[metric]}"
+                    )
+            if summary["queries_per_call"] > expected["queries_per_call"]:
+                regressions.append(
+                    f"{operation} at {scale} habits: queries_per_call {summary['queries_per_call']} "
+                    f"> baseline {expected['queries_per_call']}"
+                )
+    return regressions
+
+
+def run_benchmarks(dsn: str, scales, years: float, calls: int, density: float, seed: int,
+                   today: datetime.date = None):
+    """
+    Run run_scale for every scale on the database named by dsn.
+
+    Returns:
+        dict: The benchmark configuration and the results per scale.
+    """
+    today = today or datetime.date.today()
+    with contextlib.redirect_stdout(io.StringIO()):
+        database = open_database(dsn)
+        scale_results = {
+            str(habit_count): run_scale(database, habit_count, years, today, calls, density=density, seed=seed)
+            for habit_count in scales
+        }
+
+    return {
+        "config": {"dsn": dsn.split("@")[-1], "years": years, "calls": calls, "density": density, "seed": seed,
+                   "today": today.isoformat()},
+        "scales": scale_results,
+    }
+
+
+def main(argv=None):
+    """
+    Command-line entry point: run the benchmarks, write the results as JSON and compare them with a baseline.
+    Exits with status 1 if a regression is found.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the habits analytics on generated histories.")
+    parser.add_argument("--dsn", default="sqlite:///:memory:", help="scratch database, defaults to in-memory SQLite")
+    parser.add_argument("--scales", type=int, nargs="+", default=[100, 1000], help="numbers of habits")
+    parser.add_argument("--years", type=float, default=1.0, help="years of check-off history")
+    parser.add_argument("--calls", type=int, default=100, help="timed calls per operation")
+    parser.add_argument("--density", type=float, default=0.8, help="probability of a check-off per period")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.dsn, args.scales, args.years, args.calls, args.density, args.seed)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(json.load(file), results, args.threshold)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import datetime
+
+import numpy as np
+
+from habit_class import DEFAULT_USER_ID
+
+# Day ordinal of 1970-01-01, the epoch of numpy.datetime64
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+HABIT_STREAKS_DTYPE = np.dtype([
+    ("habit_id", np.int64),
+    ("periodicity", np.int32),
+    ("current_streak", np.int32),
+    ("longest_streak", np.int32),
+    ("last_check_off", "datetime64[D]"),
+])
+
+STREAK_RUNS_DTYPE = np.dtype([
+    ("habit_id", np.int64),
+    ("start", "datetime64[D]"),
+    ("end", "datetime64[D]"),
+    ("length", np.int32),
+])
+
+
+class CheckOffHistory:
+    """
+    The check-off history of many habits as NumPy arrays of day ordinals (datetime.date.toordinal()).
+
+    The check-offs are stored in one array, grouped by habit and sorted by date within each habit, with a
+    parallel array of habit positions. Every function of this module works on all habits at once with
+    vectorized operations instead of looping over habits and dates in Python.
+
+    Attributes:
+        habit_ids (numpy.ndarray): The habit ids, one per habit (int64).
+        periodicities (numpy.ndarray): The periodicity of each habit (int32).
+        date_created (numpy.ndarray): The creation date of each habit as a day ordinal (int32).
+        habit_index (numpy.ndarray): The position in habit_ids of the habit of each check-off (int64).
+        days (numpy.ndarray): The check-off dates as day ordinals (int32).
+    """
+
+    def __init__(self, habit_ids, periodicities, date_created, habit_index, days):
+        """
+        Initialize a CheckOffHistory. The check-offs must be grouped by habit in the order of habit_ids and
+        sorted by date within each habit, as load_history returns them.
+        """
+        self.habit_ids = np.asarray(habit_ids, dtype=np.int64)
+        self.periodicities = np.asarray(periodicities, dtype=np.int32)
+        self.date_created = np.asarray(date_created, dtype=np.int32)
+        self.habit_index = np.asarray(habit_index, dtype=np.int64)
+        self.days = np.asarray(days, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.habit_ids)
+
+    @property
+    def offsets(self):
+        """
+        numpy.ndarray: The check-offs of habit i are days[offsets[i]:offsets[i + 1]].
+        """
+        counts = np.bincount(self.habit_index, minlength=len(self.habit_ids))
+        return np.concatenate(([0], np.cumsum(counts)))
+
+    def until(self, as_of_date: datetime.date):
+        """
+        Get the history without the check-offs after as_of_date.
+
+        Args:
+            as_of_date (datetime.date): The last date kept.
+
+        Returns:
+            CheckOffHistory: The history up to as_of_date.
+        """
+        keep = self.days <= as_of_date.toordinal()
+        return CheckOffHistory(self.habit_ids, self.periodicities, self.date_created,
+                               self.habit_index[keep], self.days[keep])
+
+
+def load_history(cursor, user_id: int = DEFAULT_USER_ID, batch_size: int = 100000):
+    """
+    Load the habits and check-off dates of a user into a CheckOffHistory. The check-offs are read in batches
+    of batch_size rows, ordered by habit and date.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        user_id (int): The user whose habits are loaded.
+        batch_size (int): The number of check-off rows fetched at a time.
+
+    Returns:
+        CheckOffHistory: The history of all habits of the user.
+    """
+    cursor.execute("SELECT id, periodicity, date_created FROM habits WHERE user_id = %s ORDER BY id", (user_id,))
+    habits = cursor.fetchall()
+    habit_ids = np.array([habit[0] for habit in habits], dtype=np.int64)
+    periodicities = np.array([habit[1] for habit in habits], dtype=np.int32)
+    date_created = np.array([habit[2].toordinal() for habit in habits], dtype=np.int32)
+
+    cursor.execute(
+        "SELECT habit_id, check_off_date FROM check_off_dates WHERE user_id = %s ORDER BY habit_id, check_off_date",
+        (user_id,),
+    )
+    habit_columns, day_columns = [], []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        habit_columns.append(np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)))
+        day_columns.append(np.fromiter((row[1].toordinal() for row in rows), dtype=np.int32, count=len(rows)))
+
+    check_off_habits = np.concatenate(habit_columns) if habit_columns else np.zeros(0, dtype=np.int64)
+    days = np.concatenate(day_columns) if day_columns else np.zeros(0, dtype=np.int32)
+
+    # Map habit ids to positions, dropping check-offs of habits created after the habits were read
+    habit_index = np.searchsorted(habit_ids, check_off_habits)
+    known = habit_index < len(habit_ids)
+    known[known] = habit_ids[habit_index[known]] == check_off_habits[known]
+
+    return CheckOffHistory(habit_ids, periodicities, date_created, habit_index[known], days[known])
+
+
+def streak_runs(history: CheckOffHistory):
+    """
+    Split the history into streaks (runs): check-offs of a habit at most 'periodicity' days apart, the rule
+    used throughout the analytics module.
+
+    Args:
+        history (CheckOffHistory): The history.
+
+    Returns:
+        numpy.ndarray: One record per run with the fields habit_id, start, end and length (STREAK_RUNS_DTYPE).
+    """
+    runs = _runs(history)
+    records = np.zeros(len(runs["length"]), dtype=STREAK_RUNS_DTYPE)
+    records["habit_id"] = history.habit_ids[runs["habit"]]
+    records["start"] = _to_datetime64(runs["start"])
+    records["end"] = _to_datetime64(runs["end"])
+    records["length"] = runs["length"]
+    return records
+
+
+def streak_length_distribution(history: CheckOffHistory, periodicity: int = None):
+    """
+    Count the streaks of every length across all habits.
+
+    Args:
+        history (CheckOffHistory): The history.
+        periodicity (int | None): Only count streaks of habits with this periodicity, or None for all habits.
+
+    Returns:
+        numpy.ndarray: Records with the fields length and count, sorted by length.
+    """
+    runs = _runs(history)
+    lengths = runs["length"]
+    if periodicity is not None:
+        lengths = lengths[history.periodicities[runs["habit"]] == periodicity]
+
+    values, counts = np.unique(lengths, return_counts=True)
+    records = np.zeros(len(values), dtype=[("length", np.int32), ("count", np.int64)])
+    records["length"] = values
+    records["count"] = counts
+    return records
+
+
+def habit_streaks(history: CheckOffHistory, as_of_date: datetime.date):
+    """
+    Compute the current and longest streak of every habit as of a date, ignoring later check-offs.
+
+    Args:
+        history (CheckOffHistory): The history.
+        as_of_date (datetime.date): The date on which the streaks are evaluated.
+
+    Returns:
+        numpy.ndarray: One record per habit (HABIT_STREAKS_DTYPE); last_check_off is NaT for habits that were
+        never checked off.
+    """
+    history = history.until(as_of_date)
+    runs = _runs(history)
+    habit_count = len(history)
+
+    longest = np.zeros(habit_count, dtype=np.int32)
+    np.maximum.at(longest, runs["habit"], runs["length"])
+
+    offsets = history.offsets
+    checked_off = offsets[1:] > offsets[:-1]
+    last_positions = offsets[1:][checked_off] - 1
+
+    last_day = np.zeros(habit_count, dtype=np.int64)
+    last_day[checked_off] = history.days[last_positions]
+    last_run_length = np.zeros(habit_count, dtype=np.int32)
+    last_run_length[checked_off] = runs["length"][runs["id"][last_positions]]
+
+    alive = checked_off & (as_of_date.toordinal() - last_day <= history.periodicities)
+
+    records = np.zeros(habit_count, dtype=HABIT_STREAKS_DTYPE)
+    records["habit_id"] = history.habit_ids
+    records["periodicity"] = history.periodicities
+    records["current_streak"] = np.where(alive, last_run_length, 0)
+    records["longest_streak"] = longest
+    records["last_check_off"] = np.where(checked_off, _to_datetime64(last_day), np.datetime64("NaT"))
+    return records
+
+
+def habits_at_risk(history: CheckOffHistory, todays_date: datetime.date):
+    """
+    Find the habits whose current streak breaks unless they are checked off today, i.e. whose last check-off
+    was exactly 'periodicity' days ago.
+
+    Args:
+        history (CheckOffHistory): The history.
+        todays_date (datetime.date): Today's date.
+
+    Returns:
+        numpy.ndarray: The records of habit_streaks for the habits at risk.
+    """
+    streaks = habit_streaks(history, todays_date)
+    days_since = (np.datetime64(todays_date, "D") - streaks["last_check_off"]).astype(np.int64)
+    at_risk = ~np.isnat(streaks["last_check_off"]) & (days_since == streaks["periodicity"])
+    return streaks[at_risk]
+
+
+def rolling_completion_rates(history: CheckOffHistory, start_date: datetime.date, end_date: datetime.date,
+                             window_days: int = 28):
+    """
+    Compute, for every habit and every day from start_date to end_date, the completion rate over the trailing
+    window of window_days days: the check-offs made divided by the check-offs the periodicity asks for in the
+    days of the window since the habit was created, capped at 1.
+
+    Args:
+        history (CheckOffHistory): The history.
+        start_date (datetime.date): The first day reported.
+        end_date (datetime.date): The last day reported.
+        window_days (int): The length of the trailing window in days.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: The reported days (datetime64[D]), and a float32 array of shape
+        (number of habits, number of days) with the rates; NaN where the habit did not exist yet.
+    """
+    first_day = start_date.toordinal() - window_days + 1
+    last_day = end_date.toordinal()
+    report_days = np.arange(start_date.toordinal(), last_day + 1)
+
+    in_range = (history.days >= first_day) & (history.days <= last_day)
+    flags = np.zeros((len(history), last_day - first_day + 1), dtype=np.int32)
+    flags[history.habit_index[in_range], history.days[in_range] - first_day] = 1
+
+    cumulative = np.concatenate((np.zeros((len(history), 1), dtype=np.int32), np.cumsum(flags, axis=1)), axis=1)
+    completed = cumulative[:, window_days:] - cumulative[:, :-window_days]
+
+    window_starts = np.maximum(report_days[np.newaxis, :] - window_days + 1, history.date_created[:, np.newaxis])
+    tracked_days = np.clip(report_days[np.newaxis, :] - window_starts + 1, 0, window_days)
+    expected = -(-tracked_days // history.periodicities[:, np.newaxis])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(expected > 0, np.minimum(1.0, completed / expected), np.nan).astype(np.float32)
+    return _to_datetime64(report_days), rates
+
+
+def weekday_heatmap(history: CheckOffHistory):
+    """
+    Count the check-offs of every habit per day of the week.
+
+    Args:
+        history (CheckOffHistory): The history.
+
+    Returns:
+        numpy.ndarray: An int64 array of shape (number of habits, 7), Monday first. Summing over axis 0 gives
+        the heatmap of the whole population.
+    """
+    weekdays = (history.days.astype(np.int64) - 1) % 7  # Day ordinal 1 (January 1 of year 1) is a Monday
+    counts = np.bincount(history.habit_index * 7 + weekdays, minlength=len(history) * 7)
+    return counts.reshape(len(history), 7)
+
+
+def _runs(history):
+    # Gaps-and-islands over the whole history: a run starts at a habit's first check-off and after every gap
+    # longer than the habit's periodicity
+    days = history.days
+    if len(days) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return {"id": empty, "habit": empty, "start": empty, "end": empty, "length": empty}
+
+    habit_index = history.habit_index
+    continues = (habit_index[1:] == habit_index[:-1]) & \
+                (days[1:] - days[:-1] <= history.periodicities[habit_index[1:]])
+    starts = np.concatenate(([True], ~continues))
+    ends = np.concatenate((~continues, [True]))
+
+    return {
+        "id": np.cumsum(starts) - 1,  # The run of every check-off
+        "habit": habit_index[starts],
+        "start": days[starts],
+        "end": days[ends],
+        "length": np.flatnonzero(ends) - np.flatnonzero(starts) + 1,
+    }
+
+
+def _to_datetime64(day_ordinals):
+    return (np.asarray(day_ordinals, dtype=np.int64) - EPOCH_ORDINAL).astype("datetime64[D]")
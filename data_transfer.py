@@ -0,0 +1,292 @@
+import csv
+import datetime
+import json
+import os
+
+import analytics
+from habit_class import DEFAULT_USER_ID
+
+# Supported file formats, used as the file extension of the exported tables
+FORMATS = ("csv", "jsonl")
+
+# Exported columns of each table, in file order
+TABLE_COLUMNS = {
+    "habits": ("id", "habit_name", "periodicity", "date_created"),
+    "check_off_dates": ("habit_id", "check_off_date"),
+    "streaks": ("habit_id", "current_streak", "longest_streak"),
+}
+
+# Sort order of the exported rows, so check-offs of a habit are written together and in date order
+TABLE_ORDER = {
+    "habits": "id",
+    "check_off_dates": "habit_id, check_off_date",
+    "streaks": "habit_id",
+}
+
+
+def table_path(directory: str, table_name: str, file_format: str):
+    """
+    Get the path of the file holding a table in an export directory, e.g. exports/habits.csv.
+
+    Args:
+        directory (str): The export directory.
+        table_name (str): One of the keys of TABLE_COLUMNS.
+        file_format (str): One of FORMATS.
+
+    Returns:
+        str: The path of the file.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unsupported file format '{file_format}', expected one of {', '.join(FORMATS)}.")
+    return os.path.join(directory, f"{table_name}.{file_format}")
+
+
+def iter_table(cursor, table_name: str, user_id: int = DEFAULT_USER_ID, batch_size: int = 10000):
+    """
+    Stream the rows of a user from one of the habits tables, fetching batch_size rows at a time.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        table_name (str): One of the keys of TABLE_COLUMNS.
+        user_id (int): The user owning the rows.
+        batch_size (int): The number of rows fetched at a time.
+
+    Yields:
+        tuple: One row with the columns of TABLE_COLUMNS[table_name].
+    """
+    columns = ", ".join(TABLE_COLUMNS[table_name])
+    cursor.execute(
+        f"SELECT {columns} FROM {table_name} WHERE user_id = %s ORDER BY {TABLE_ORDER[table_name]}",
+        (user_id,),
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def write_rows(path: str, columns, rows, file_format: str):
+    """
+    Write rows to a CSV file with a header line, or to a JSON Lines file with one object per row.
+    Dates are written in ISO-8601 format.
+
+    Args:
+        path (str): The path of the file.
+        columns (Sequence[str]): The column names.
+        rows (Iterable[tuple]): The rows to write.
+        file_format (str): One of FORMATS.
+
+    Returns:
+        int: The number of rows written.
+    """
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        if file_format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([_serialize(value) for value in row])
+                count += 1
+        else:
+            for row in rows:
+                record = {column: _serialize(value) for column, value in zip(columns, row)}
+                file.write(json.dumps(record) + "\n")
+                count += 1
+    return count
+
+
+def read_rows(path: str, file_format: str):
+    """
+    Stream the rows of a file written by write_rows as dicts mapping column names to string or JSON values.
+
+    Args:
+        path (str): The path of the file.
+        file_format (str): One of FORMATS.
+
+    Yields:
+        dict: One row.
+
+    Raises:
+        ValueError: If a line of a JSON Lines file is not valid JSON.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if file_format == "csv":
+            yield from csv.DictReader(file)
+        else:
+            for line_number, line in enumerate(file, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as err:
+                        raise ValueError(f"Line {line_number} of '{path}' is not valid JSON: {err}.") from None
+
+
+def export_data(cursor, directory: str, file_format: str = "csv", user_id: int = DEFAULT_USER_ID,
+                batch_size: int = 10000):
+    """
+    Export the habits, check-off dates and streaks of a user to one file per table in directory.
+    Rows are streamed from the database to the files, so memory use does not grow with the history.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        directory (str): The export directory, created if it does not exist.
+        file_format (str): One of FORMATS.
+        user_id (int): The user whose data is exported.
+        batch_size (int): The number of rows fetched at a time.
+
+    Returns:
+        dict[str, int]: The number of rows written per table.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    counts = {}
+    for table_name, columns in TABLE_COLUMNS.items():
+        path = table_path(directory, table_name, file_format)
+        counts[table_name] = write_rows(path, columns, iter_table(cursor, table_name, user_id, batch_size), file_format)
+    return counts
+
+
+def import_data(database, directory: str, file_format: str = "csv", user_id: int = DEFAULT_USER_ID,
+                as_of_date: datetime.date = None, chunk_size: int = 10000):
+    """
+    Import habits and check-off dates exported by export_data for a user.
+
+    Habits whose name the user already has are merged into the existing habit; the ids in the files are
+    only used to match check-offs to their habit. Rows are inserted with executemany, chunk_size rows per
+    statement and transaction, and check-offs that already exist are skipped. The streaks are not copied
+    from the files but recomputed from the merged history with a single rebuild_streaks at the end, and the
+    completion rollups are backfilled.
+
+    Both files are validated before anything is written, so a malformed file does not leave a partial
+    import behind; the check-offs file is read twice for that instead of being held in memory.
+
+    Args:
+        database (database.Database | sqlite_backend.SQLiteDatabase): The database to import into.
+        directory (str): The export directory.
+        file_format (str): One of FORMATS.
+        user_id (int): The user who owns the imported habits.
+        as_of_date (datetime.date): The date the streaks are recomputed for, defaults to today.
+        chunk_size (int): The number of rows per statement and transaction.
+
+    Returns:
+        dict[str, int]: The number of habits and check-off dates inserted, and of streaks that changed.
+
+    Raises:
+        ValueError: If a row of a file is malformed, e.g. has a periodicity that is not a positive integer.
+    """
+    as_of_date = as_of_date or datetime.date.today()
+    counts = {"habits": 0, "check_off_dates": 0, "streaks": 0}
+
+    # Validate both files first; the check-offs are parsed again while they are inserted
+    habit_parsers = {"id": int, "habit_name": _parse_name, "periodicity": _parse_periodicity,
+                     "date_created": _parse_date}
+    check_off_parsers = {"habit_id": int, "check_off_date": _parse_date}
+    habits_path = table_path(directory, "habits", file_format)
+    habit_rows = list(_iter_parsed_rows(habits_path, file_format, habit_parsers))
+    check_offs_path = table_path(directory, "check_off_dates", file_format)
+    for _ in _iter_parsed_rows(check_offs_path, file_format, check_off_parsers):
+        pass
+
+    # Habits: insert the ones the user does not have yet, then map the exported ids to the database ids
+    with database.session() as cursor:
+        existing_names = {name.lower() for name in analytics.get_all_habits(cursor, user_id)}
+
+    new_habits = {}
+    for _, name, periodicity, date_created in habit_rows:
+        if name.lower() not in existing_names and name.lower() not in new_habits:
+            new_habits[name.lower()] = (user_id, name, periodicity, date_created)
+
+    insert_habit_query = "INSERT INTO habits (user_id, habit_name, periodicity, date_created) VALUES (%s, %s, %s, %s)"
+    new_habits = list(new_habits.values())
+    for start in range(0, len(new_habits), chunk_size):
+        with database.session() as cursor:
+            cursor.executemany(insert_habit_query, new_habits[start:start + chunk_size])
+    counts["habits"] = len(new_habits)
+
+    with database.session() as cursor:
+        # Every habit needs a streaks row, like the ones create_habit initializes
+        cursor.execute("""
+            INSERT INTO streaks (user_id, habit_id, current_streak, longest_streak)
+            SELECT h.user_id, h.id, 0, 0 FROM habits h
+            WHERE h.user_id = %s AND NOT EXISTS (SELECT 1 FROM streaks s WHERE s.habit_id = h.id)
+        """, (user_id,))
+        cursor.execute("SELECT id, habit_name FROM habits WHERE user_id = %s", (user_id,))
+        ids_by_name = {name.lower(): habit_id for habit_id, name in cursor.fetchall()}
+    habit_ids = {exported_id: ids_by_name[name.lower()] for exported_id, name, _, _ in habit_rows}
+
+    # Check-off dates: stream the file and insert it chunk by chunk
+    chunk = []
+    for exported_id, check_off_date in _iter_parsed_rows(check_offs_path, file_format, check_off_parsers):
+        habit_id = habit_ids.get(exported_id)
+        if habit_id is None:
+            continue  # The check-off belongs to a habit that is not in the habits file
+        chunk.append((user_id, habit_id, check_off_date))
+        if len(chunk) == chunk_size:
+            counts["check_off_dates"] += _insert_check_offs(database, chunk)
+            chunk = []
+    if chunk:
+        counts["check_off_dates"] += _insert_check_offs(database, chunk)
+
+    with database.session() as cursor:
+        counts["streaks"] = analytics.rebuild_streaks(cursor, as_of_date, habit_ids=sorted(set(habit_ids.values())),
+                                                      user_id=user_id)
+        analytics.backfill_rollups(cursor, as_of_date, user_id)
+
+    # Cached check-off histories no longer match the database
+    if analytics.check_off_index is not None:
+        database.run(analytics.check_off_index.load, user_id)
+
+    return counts
+
+
+def _insert_check_offs(database, rows):
+    """
+    Insert (user_id, habit_id, check_off_date) rows in one transaction, skipping check-offs that already exist.
+    """
+    with database.session() as cursor:
+        cursor.executemany(f"{analytics._sql_insert_ignore(cursor)} INTO check_off_dates (user_id, habit_id, check_off_date) VALUES (%s, %s, %s)", rows)
+        return cursor.rowcount
+
+
+def _iter_parsed_rows(path, file_format, parsers):
+    """
+    Streams the rows of a file read by read_rows as tuples of the columns in parsers, each converted by its
+    parser. Raises a ValueError naming the file and row if a column is missing or cannot be converted.
+    """
+    for row_number, row in enumerate(read_rows(path, file_format), 1):
+        if not isinstance(row, dict):
+            raise ValueError(f"Row {row_number} of '{path}' is not an object.")
+        values = []
+        for column, parse in parsers.items():
+            value = row.get(column)
+            try:
+                values.append(parse(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"Row {row_number} of '{path}' has an invalid {column}: {value!r}.") from None
+        yield tuple(values)
+
+
+def _parse_name(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("A habit name must be a non-empty string.")
+    return value
+
+
+def _parse_periodicity(value):
+    periodicity = int(value)
+    if periodicity < 1:
+        raise ValueError("The periodicity must be a positive number of days.")
+    return periodicity
+
+
+def _serialize(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def _parse_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
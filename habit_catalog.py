@@ -0,0 +1,184 @@
+import threading
+from collections import OrderedDict
+from habit_class import DEFAULT_USER_ID
+
+
+class HabitCatalog:
+    """
+    In-process cache of the `habits` table for the duration of a session.
+
+    Holds (user_id, habit_name) -> id and id -> (habit_name, periodicity, date_created) so that commands do not have to
+    query the `habits` table every time they look up a habit by name. Names are matched case-insensitively,
+    like the MySQL default collation does. The catalog is bounded by max_size and evicts the least recently
+    used habit when it is full. Lookups that miss the cache fall back to the database and cache the result.
+    Names are scoped to the user owning the habit, so several users can have habits with the same name.
+
+    Attributes:
+        max_size (int): The maximum number of habits kept in the catalog.
+        hits (int): Number of lookups answered from the catalog.
+        misses (int): Number of lookups that had to query the database.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        """
+        Initialize an empty HabitCatalog.
+
+        Args:
+            max_size (int): The maximum number of habits kept in the catalog.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._habits = OrderedDict()  # id -> (user_id, habit_name, periodicity, date_created), least recently used first
+        self._ids_by_name = {}        # (user_id, habit_name.lower()) -> id
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._habits)
+
+    def load(self, cursor, user_id: int = None):
+        """
+        Fill the catalog with one query on the `habits` table. At most max_size habits are loaded.
+
+        Args:
+            cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+            user_id (int | None): Only load the habits of this user, or None to load habits of every user.
+
+        Returns:
+            int: The number of habits loaded.
+        """
+        if user_id is None:
+            query = "SELECT id, user_id, habit_name, periodicity, date_created FROM habits ORDER BY id LIMIT %s"
+            cursor.execute(query, (self.max_size,))
+        else:
+            query = """
+                SELECT id, user_id, habit_name, periodicity, date_created FROM habits
+                WHERE user_id = %s ORDER BY id LIMIT %s
+            """
+            cursor.execute(query, (user_id, self.max_size))
+        rows = cursor.fetchall()
+
+        with self._lock:
+            self._habits.clear()
+            self._ids_by_name.clear()
+            for row in rows:
+                self._store(*row)
+
+        return len(rows)
+
+    def get_habit_id(self, cursor, habit_name: str, user_id: int = DEFAULT_USER_ID):
+        """
+        Retrieve the habit_id for a given habit_name of a user, from the catalog if possible.
+
+        Args:
+            cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used on a cache miss.
+            habit_name (str): The name of the habit to look up.
+            user_id (int): The user owning the habit.
+
+        Returns:
+            int or None: The habit_id if found, otherwise None.
+        """
+        with self._lock:
+            habit_id = self._ids_by_name.get((user_id, habit_name.lower()))
+            if habit_id is not None:
+                self._habits.move_to_end(habit_id)
+                self.hits += 1
+                return habit_id
+            self.misses += 1
+
+        query = "SELECT id, user_id, habit_name, periodicity, date_created FROM habits WHERE user_id = %s AND habit_name = %s"
+        cursor.execute(query, (user_id, habit_name))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+
+        self.add(*result)
+        return result[0]
+
+    def get_habit(self, cursor, habit_id: int, user_id: int = None):
+        """
+        Retrieve the (habit_name, periodicity, date_created) of a habit, from the catalog if possible.
+
+        Args:
+            cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor used on a cache miss.
+            habit_id (int): The unique identifier of the habit.
+            user_id (int | None): Only return the habit if this user owns it, or None for any owner.
+
+        Returns:
+            tuple or None: (habit_name, periodicity, date_created) if found, otherwise None.
+        """
+        with self._lock:
+            habit = self._habits.get(habit_id)
+            if habit is not None:
+                self._habits.move_to_end(habit_id)
+                self.hits += 1
+                return habit[1:] if user_id is None or habit[0] == user_id else None
+            self.misses += 1
+
+        query = "SELECT id, user_id, habit_name, periodicity, date_created FROM habits WHERE id = %s"
+        cursor.execute(query, (habit_id,))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+
+        self.add(*result)
+        return result[2:] if user_id is None or result[1] == user_id else None
+
+    def add(self, habit_id: int, user_id: int, habit_name: str, periodicity: int, date_created):
+        """
+        Add a habit to the catalog, or refresh it if it is already cached.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            user_id (int): The user owning the habit.
+            habit_name (str): The name of the habit.
+            periodicity (int): The number of days between habit repetitions.
+            date_created (datetime.date): The date the habit was created.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._remove(habit_id)
+            self._store(habit_id, user_id, habit_name, periodicity, date_created)
+
+    def remove(self, habit_id: int):
+        """
+        Remove a habit from the catalog, e.g. after it was deleted from the database.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._remove(habit_id)
+
+    def clear(self):
+        """
+        Remove all habits from the catalog and reset the hit/miss counters.
+        """
+        with self._lock:
+            self._habits.clear()
+            self._ids_by_name.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _store(self, habit_id, user_id, habit_name, periodicity, date_created):
+        # Must be called with the lock held
+        self._habits[habit_id] = (user_id, habit_name, periodicity, date_created)
+        self._ids_by_name[(user_id, habit_name.lower())] = habit_id
+
+        while len(self._habits) > self.max_size:
+            _, (evicted_user_id, evicted_name, _, _) = self._habits.popitem(last=False)
+            self._ids_by_name.pop((evicted_user_id, evicted_name.lower()), None)
+
+    def _remove(self, habit_id):
+        # Must be called with the lock held
+        habit = self._habits.pop(habit_id, None)
+        if habit is not None:
+            self._ids_by_name.pop((habit[0], habit[1].lower()), None)
@@ -1,5 +1,11 @@
 from datetime import date
-from mysql.connector.cursor import MySQLCursor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # The MySQL driver is only needed for the type hint, the SQLite backend works without it
+    from mysql.connector.cursor import MySQLCursor
+
+# The user (tenant) owning habits when no user_id is given, e.g. in single-user installations
+DEFAULT_USER_ID = 1
 
 class Habit:
     """
@@ -9,9 +15,10 @@ class Habit:
         name (str): The name of the habit.
         periodicity (int): The number of days between habit check-ins.
         date_created (datetime.date): The date the habit was created.
+        user_id (int): The user (tenant) owning the habit.
     """
 
-    def __init__(self, name: str, periodicity: int, date_created: date):
+    def __init__(self, name: str, periodicity: int, date_created: date, user_id: int = DEFAULT_USER_ID):
         """
         Initialize a new Habit object.
 
@@ -19,24 +26,27 @@ class Habit:
             name (str): The name of the habit.
             periodicity (int): The number of days between habit repetitions.
             date_created (datetime.date): The date the habit was created.
+            user_id (int): The user (tenant) owning the habit, defaults to the single-user installation's user.
         """
         self.name = name
         self.periodicity = periodicity
         self.date_created = date_created
+        self.user_id = user_id
 
-    def save_to_db(self, cursor: MySQLCursor):
+    def save_to_db(self, cursor: "MySQLCursor"):
         """
         Save the habit to the database.
 
         Args:
-            cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+            cursor (mysql.connector.cursor.MySQLCursor): The MySQL (or SQLite backend) cursor to execute queries.
 
         Returns:
-            None
+            int: The id of the new habit.
         """
         query = """
-            INSERT INTO habits (habit_name, periodicity, date_created)
-            VALUES (%s, %s, %s)
+            INSERT INTO habits (user_id, habit_name, periodicity, date_created)
+            VALUES (%s, %s, %s, %s)
         """
-        params = (self.name, self.periodicity, self.date_created)
+        params = (self.user_id, self.name, self.periodicity, self.date_created)
         cursor.execute(query, params)
+        return cursor.lastrowid
@@ -0,0 +1,319 @@
+import json
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histograms have one bucket per power of two microseconds: bucket i counts statements that took
+# less than 2**i microseconds (and at least 2**(i - 1)), the last bucket everything slower
+HISTOGRAM_BUCKETS = 32
+
+# At most this many distinct SQL texts are remembered with their statement shape
+SHAPE_CACHE_SIZE = 1024
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+_REPEATED_GROUP = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+_REPEATED_CASE = re.compile(r"(WHEN %s THEN %s)(?: \1)+")
+
+
+def statement_shape(operation: str):
+    """
+    Reduce an SQL statement to its shape: whitespace is collapsed, and placeholder lists and repeated
+    value groups of any length are folded, so e.g. IN lists of 2 and of 200 ids have the same shape.
+
+    Args:
+        operation (str): The SQL statement.
+
+    Returns:
+        str: The statement shape.
+    """
+    shape = _WHITESPACE.sub(" ", operation).strip()
+    shape = _PLACEHOLDER_LIST.sub("%s, ...", shape)
+    shape = _REPEATED_GROUP.sub(r"\1, ...", shape)
+    return _REPEATED_CASE.sub(r"\1 ...", shape)
+
+
+class QueryStats:
+    """
+    Thread-safe collector of round-trip counts, rows returned and latency histograms, aggregated per calling
+    function and per statement shape. Fed by InstrumentedCursor.
+
+    Attributes:
+        round_trips (int): The number of statements executed in total.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty statistics.
+        """
+        self._lock = threading.Lock()
+        self._by_caller = {}     # "module.function" -> [round_trips, rows, total_seconds, histogram]
+        self._by_statement = {}  # statement shape -> [round_trips, rows, total_seconds, histogram]
+        self._shapes = {}        # SQL text -> statement shape
+        self.round_trips = 0
+
+    def shape_of(self, operation: str):
+        """
+        Get the statement shape of an SQL text. The shapes of the first SHAPE_CACHE_SIZE distinct texts are
+        cached, which covers the fixed statements of the analytics module.
+        """
+        shape = self._shapes.get(operation)
+        if shape is None:
+            shape = statement_shape(operation)
+            if len(self._shapes) < SHAPE_CACHE_SIZE:
+                self._shapes[operation] = shape
+        return shape
+
+    def record_statement(self, caller: str, shape: str, seconds: float):
+        """
+        Record one executed statement.
+
+        Args:
+            caller (str): The function that executed it, as "module.function".
+            shape (str): The statement shape.
+            seconds (float): The time the statement took.
+
+        Returns:
+            None
+        """
+        bucket = min(int(seconds * 1_000_000).bit_length(), HISTOGRAM_BUCKETS - 1)
+        with self._lock:
+            self.round_trips += 1
+            for entries, key in ((self._by_caller, caller), (self._by_statement, shape)):
+                entry = entries.get(key)
+                if entry is None:
+                    entry = entries[key] = [0, 0, 0.0, [0] * HISTOGRAM_BUCKETS]
+                entry[0] += 1
+                entry[2] += seconds
+                entry[3][bucket] += 1
+
+    def record_rows(self, caller: str, shape: str, rows: int):
+        """
+        Record rows fetched for a statement recorded earlier with record_statement.
+
+        Args:
+            caller (str): The function that executed the statement.
+            shape (str): The statement shape.
+            rows (int): The number of rows fetched.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for entries, key in ((self._by_caller, caller), (self._by_statement, shape)):
+                entry = entries.get(key)
+                if entry is not None:  # None if the statistics were reset since the statement ran
+                    entry[1] += rows
+
+    def reset(self):
+        """
+        Discard all recorded statistics.
+        """
+        with self._lock:
+            self._by_caller.clear()
+            self._by_statement.clear()
+            self.round_trips = 0
+
+    def to_dict(self):
+        """
+        Get the statistics in a JSON-serializable form.
+
+        Returns:
+            dict: "round_trips" and the entries "by_caller" and "by_statement", each with round_trips, rows,
+            total_ms, approximate p50_ms and p99_ms, and the latency histogram.
+        """
+        with self._lock:
+            return {
+                "round_trips": self.round_trips,
+                "by_caller": {key: _summarize(entry) for key, entry in self._by_caller.items()},
+                "by_statement": {key: _summarize(entry) for key, entry in self._by_statement.items()},
+            }
+
+    def dump(self, path: str):
+        """
+        Write the statistics of to_dict to a JSON file.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            None
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, indent=2)
+            file.write("\n")
+
+    def report(self, limit: int = 10):
+        """
+        Format the statistics as a table of the callers and statements that took the most time in total.
+
+        Args:
+            limit (int): The maximum number of statement shapes listed.
+
+        Returns:
+            str: The report.
+        """
+        stats = self.to_dict()
+        lines = [f"{stats['round_trips']} round trip(s)", "",
+                 f"{'calls':>7} {'rows':>8} {'total ms':>10} {'p50 ms':>8} {'p99 ms':>8}  function"]
+        for caller, entry in sorted(stats["by_caller"].items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(_format_line(entry, caller))
+
+        lines += ["", f"{'calls':>7} {'rows':>8} {'total ms':>10} {'p50 ms':>8} {'p99 ms':>8}  statement"]
+        statements = sorted(stats["by_statement"].items(), key=lambda item: -item[1]["total_ms"])
+        for shape, entry in statements[:limit]:
+            lines.append(_format_line(entry, shape if len(shape) <= 100 else shape[:97] + "..."))
+        return "\n".join(lines)
+
+
+class InstrumentedCursor:
+    """
+    Cursor wrapper recording every statement executed through it in a QueryStats. The calling function is
+    taken from the stack, so the statistics of e.g. analytics.get_habit_id are kept apart from those of
+    analytics.check_off_habit. Every other attribute (such as dialect or rowcount) is passed through to the
+    wrapped cursor.
+    """
+
+    def __init__(self, cursor, stats: QueryStats):
+        """
+        Wrap a cursor.
+
+        Args:
+            cursor (mysql.connector.cursor.MySQLCursor): The cursor to wrap.
+            stats (QueryStats): The statistics to record into.
+        """
+        self._cursor = cursor
+        self._stats = stats
+        self._last_statement = None
+
+    def execute(self, operation: str, params=()):
+        started = time.perf_counter()
+        result = self._cursor.execute(operation, params)
+        self._record(operation, time.perf_counter() - started)
+        return result
+
+    def executemany(self, operation: str, seq_params):
+        started = time.perf_counter()
+        result = self._cursor.executemany(operation, seq_params)
+        self._record(operation, time.perf_counter() - started)
+        return result
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._record_rows(1)
+        return row
+
+    def fetchmany(self, size: int = 1):
+        rows = self._cursor.fetchmany(size)
+        self._record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._record_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._record_rows(1)
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _record(self, operation, seconds):
+        frame = sys._getframe(2)  # The function that called execute or executemany
+        caller = f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+        shape = self._stats.shape_of(operation)
+        self._stats.record_statement(caller, shape, seconds)
+        self._last_statement = (caller, shape)
+
+    def _record_rows(self, rows):
+        if self._last_statement is not None and rows:
+            self._stats.record_rows(*self._last_statement, rows)
+
+
+class StartupTimer:
+    """
+    Records how long the phases of the application startup took, for diagnosing a slow start. Phases can be
+    recorded from several threads, e.g. by a refresh that continues in the background after the prompt is shown.
+    """
+
+    def __init__(self, started: float = None):
+        """
+        Start the timer.
+
+        Args:
+            started (float | None): The time.perf_counter() value the startup began at, defaults to now.
+        """
+        self.started = time.perf_counter() if started is None else started
+        self._lock = threading.Lock()
+        self._phases = []  # (name, start, end, thread name)
+
+    def record(self, name: str, start: float, end: float = None):
+        """
+        Record a phase that ran from start to end (time.perf_counter() values, end defaults to now).
+
+        Returns:
+            None
+        """
+        end = time.perf_counter() if end is None else end
+        with self._lock:
+            self._phases.append((name, start, end, threading.current_thread().name))
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Context manager recording the time its block takes as a phase, also if the block raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def report(self):
+        """
+        Format the phases in the order they started, with their offset from the start and their duration.
+
+        Returns:
+            str: The report.
+        """
+        with self._lock:
+            phases = sorted(self._phases, key=lambda phase: phase[1])
+        lines = [f"{'start ms':>9} {'took ms':>9}  phase"]
+        for name, start, end, thread in phases:
+            where = "" if thread == "MainThread" else f" [{thread}]"
+            lines.append(f"{(start - self.started) * 1000:>9.1f} {(end - start) * 1000:>9.1f}  {name}{where}")
+        return "\n".join(lines)
+
+
+def _summarize(entry):
+    round_trips, rows, total_seconds, histogram = entry
+    return {
+        "round_trips": round_trips,
+        "rows": rows,
+        "total_ms": round(total_seconds * 1000, 3),
+        "p50_ms": _histogram_percentile(histogram, round_trips, 50),
+        "p99_ms": _histogram_percentile(histogram, round_trips, 99),
+        "histogram": {f"<{2 ** bucket}us": count for bucket, count in enumerate(histogram) if count},
+    }
+
+
+def _histogram_percentile(histogram, total, percent):
+    # Upper bound of the bucket holding the percentile, in milliseconds
+    rank = -(-total * percent // 100)
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if seen >= rank:
+            return 2 ** bucket / 1000
+    return 0.0
+
+
+def _format_line(entry, name):
+    return (f"{entry['round_trips']:>7} {entry['rows']:>8} {entry['total_ms']:>10.3f} "
+            f"{entry['p50_ms']:>8.3f} {entry['p99_ms']:>8.3f}  {name}")
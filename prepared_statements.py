@@ -0,0 +1,315 @@
+import threading
+from collections import OrderedDict
+
+import analytics
+from instrumentation import statement_shape
+
+# The number of prepared statements kept per connection; beyond it the least recently used one is closed
+STATEMENT_CACHE_SIZE = 128
+
+# Statements that may go through the binary protocol; DDL and the like always use the plain cursor
+PREPARABLE_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+# MySQL server errors of prepared statements
+ER_UNKNOWN_STMT_HANDLER = 1243  # The statement was deallocated, e.g. by a reconnect
+ER_UNSUPPORTED_PS = 1295        # The statement cannot be prepared
+
+
+class StatementCounts:
+    """
+    Thread-safe counts of how often each SQL text was executed, how often it was prepared and how many of
+    its executions reused a prepared statement. Shared by the sessions of a database; the difference between
+    executions and prepares is the number of times the server did not have to parse the statement again.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty counts.
+        """
+        self._lock = threading.Lock()
+        self._counts = {}  # SQL text -> [executions, prepares, prepared executions]
+
+    def record(self, operation: str, prepared: bool = False, prepares: int = 0):
+        """
+        Count one execution of a statement.
+
+        Args:
+            operation (str): The SQL text.
+            prepared (bool): The execution used a prepared statement.
+            prepares (int): The number of times the statement was prepared for this execution.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entry = self._counts.get(operation)
+            if entry is None:
+                entry = self._counts[operation] = [0, 0, 0]
+            entry[0] += 1
+            entry[1] += prepares
+            entry[2] += prepared
+
+    def to_dict(self):
+        """
+        Get the counts, per statement shape (see instrumentation.statement_shape) and in total.
+
+        Returns:
+            dict: "executions", "prepares" and "prepared_executions" in total, and the same per shape under
+            "by_statement".
+        """
+        with self._lock:
+            counts = [(operation, list(entry)) for operation, entry in self._counts.items()]
+
+        by_statement = {}
+        for operation, (executions, prepares, prepared_executions) in counts:
+            entry = by_statement.setdefault(statement_shape(operation),
+                                            {"executions": 0, "prepares": 0, "prepared_executions": 0})
+            entry["executions"] += executions
+            entry["prepares"] += prepares
+            entry["prepared_executions"] += prepared_executions
+
+        totals = {key: sum(entry[key] for entry in by_statement.values())
+                  for key in ("executions", "prepares", "prepared_executions")}
+        return {**totals, "by_statement": by_statement}
+
+    def report(self, limit: int = 10):
+        """
+        Format the counts as a table of the most executed statements.
+
+        Args:
+            limit (int): The maximum number of statement shapes listed.
+
+        Returns:
+            str: The report.
+        """
+        counts = self.to_dict()
+        lines = [f"{counts['executions']} execution(s), {counts['prepared_executions']} of them prepared, "
+                 f"{counts['prepares']} prepare(s)", "",
+                 f"{'executed':>9} {'prepared':>9} {'prepares':>9}  statement"]
+        statements = sorted(counts["by_statement"].items(), key=lambda item: -item[1]["executions"])
+        for shape, entry in statements[:limit]:
+            shape = shape if len(shape) <= 100 else shape[:97] + "..."
+            lines.append(f"{entry['executions']:>9} {entry['prepared_executions']:>9} {entry['prepares']:>9}  {shape}")
+        return "\n".join(lines)
+
+
+class StatementRegistry:
+    """
+    The prepared statements of one MySQL connection: one cursor(prepared=True) per SQL text, kept open across
+    sessions for as long as the connection lives, so the server parses each statement once per connection.
+
+    A text is prepared the second time it is executed; statements run once, such as those with IN lists of
+    a length that does not come back, go through the plain cursor and never cost a prepare and a close. At
+    most 'size' statements stay prepared, the least recently used one is closed beyond that. If the
+    connection was reconnected in between, the statements are gone on the server and are prepared again on
+    their next execution.
+    """
+
+    def __init__(self, connection, size: int = STATEMENT_CACHE_SIZE):
+        """
+        Initialize an empty registry.
+
+        Args:
+            connection (mysql.connector.connection.MySQLConnection): The connection, not its pooled wrapper.
+            size (int): The maximum number of prepared statements.
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1.")
+
+        self.size = size
+        self._connection = connection
+        self._connection_id = None
+        self._cursors = OrderedDict()  # SQL text -> (the text object the cursor was prepared with, cursor)
+        self._seen = OrderedDict()     # SQL texts executed once, the oldest first
+        self._unpreparable = set()
+
+    def __len__(self):
+        return len(self._cursors)
+
+    def check_connection(self):
+        """
+        Forget the prepared statements if the connection was reconnected since the last session.
+
+        Returns:
+            None
+        """
+        connection_id = self._connection.connection_id
+        if connection_id != self._connection_id:
+            # Their statement ids are not valid on the new connection; they are prepared again on next use
+            self._seen.update(dict.fromkeys(self._cursors))
+            self._cursors.clear()
+            self._connection_id = connection_id
+
+    def cursor_for(self, operation: str):
+        """
+        Get the prepared cursor of a statement, creating it on the second execution of the statement.
+
+        Args:
+            operation (str): The SQL text.
+
+        Returns:
+            tuple: (text, cursor, is_new): the text object to execute on the cursor (the prepared cursor
+            compares texts by identity), the cursor, and whether the statement is prepared by this execution;
+            or None if the statement goes through the plain cursor.
+        """
+        entry = self._cursors.get(operation)
+        if entry is not None:
+            self._cursors.move_to_end(operation)
+            return entry + (False,)
+
+        if operation in self._unpreparable or not operation.lstrip()[:7].upper().startswith(PREPARABLE_STATEMENTS):
+            return None
+        if operation not in self._seen:
+            self._seen[operation] = None
+            if len(self._seen) > 4 * self.size:
+                self._seen.popitem(last=False)
+            return None
+
+        del self._seen[operation]
+        if len(self._cursors) >= self.size:
+            _, (_, evicted) = self._cursors.popitem(last=False)
+            close_cursor(self._connection, evicted)
+        entry = self._cursors[operation] = (operation, self._connection.cursor(prepared=True))
+        return entry + (True,)
+
+    def discard(self, operation: str, unpreparable: bool = False):
+        """
+        Drop the prepared cursor of a statement after it failed.
+
+        Args:
+            operation (str): The SQL text.
+            unpreparable (bool): The server cannot prepare the statement, so it always uses the plain cursor.
+
+        Returns:
+            None
+        """
+        self._cursors.pop(operation, None)
+        if unpreparable:
+            self._unpreparable.add(operation)
+
+    def close(self):
+        """
+        Close all prepared statements.
+
+        Returns:
+            None
+        """
+        while self._cursors:
+            _, (_, cursor) = self._cursors.popitem()
+            close_cursor(self._connection, cursor)
+
+
+class StatementCursor:
+    """
+    Cursor wrapper that runs the statements of a session on the prepared cursors of a StatementRegistry, and
+    on the plain cursor of the session when there is no registry (e.g. on SQLite, whose driver caches the
+    compiled statements of a connection itself) or the statement is not prepared. Every execution is counted
+    in a StatementCounts.
+
+    Results are read from the cursor that ran the last statement. Before another cursor of the same
+    connection executes, the rows the last one left unread are drained, since MySQL accepts no new command
+    while a result is pending. Every other attribute (such as dialect) is passed through to the plain cursor.
+    """
+
+    def __init__(self, cursor, counts: StatementCounts, registry: StatementRegistry = None, connection=None):
+        """
+        Wrap the plain cursor of a session.
+
+        Args:
+            cursor (mysql.connector.cursor.MySQLCursor): The plain cursor.
+            counts (StatementCounts): The counts to record into.
+            registry (StatementRegistry | None): The prepared statements of the session's connection.
+            connection (mysql.connector.connection.MySQLConnection | None): The connection, needed with a
+                registry.
+        """
+        self._cursor = cursor
+        self._counts = counts
+        self._registry = registry
+        self._connection = connection
+        self._active = cursor
+
+    def execute(self, operation: str, params=()):
+        self._drain()
+        prepared = self._registry.cursor_for(operation) if self._registry is not None else None
+        if prepared is None:
+            self._active = self._cursor
+            result = self._cursor.execute(operation, params)
+            self._counts.record(operation)
+            return result
+
+        text, cursor, is_new = prepared
+        try:
+            self._active = cursor
+            result = cursor.execute(text, tuple(params))
+        except analytics.DATABASE_ERRORS as err:
+            errno = getattr(err, "errno", None)
+            if errno not in (ER_UNKNOWN_STMT_HANDLER, ER_UNSUPPORTED_PS):
+                raise
+            # Run it on the plain cursor this time; a deallocated statement is prepared again next time
+            self._registry.discard(operation, unpreparable=errno == ER_UNSUPPORTED_PS)
+            self._active = self._cursor
+            result = self._cursor.execute(operation, params)
+            self._counts.record(operation)
+            return result
+
+        self._counts.record(operation, prepared=True, prepares=int(is_new))
+        return result
+
+    def executemany(self, operation: str, seq_params):
+        # The plain cursor sends an INSERT as one multi-row statement, where a prepared one executes per row
+        self._drain()
+        self._active = self._cursor
+        result = self._cursor.executemany(operation, seq_params)
+        self._counts.record(operation)
+        return result
+
+    def fetchone(self):
+        return self._active.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self._active.fetchmany(size)
+
+    def fetchall(self):
+        return self._active.fetchall()
+
+    def __iter__(self):
+        return iter(self._active)
+
+    @property
+    def rowcount(self):
+        return self._active.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._active.lastrowid
+
+    def close(self):
+        # The prepared cursors stay open with the registry of the connection
+        self._drain()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _drain(self):
+        if self._connection is not None and self._connection.unread_result:
+            self._active.fetchall()
+
+
+def close_cursor(connection, cursor):
+    """
+    Close a prepared cursor, reading its unread rows first.
+
+    Args:
+        connection (mysql.connector.connection.MySQLConnection): The connection of the cursor.
+        cursor (mysql.connector.cursor.MySQLCursorPrepared): The cursor.
+
+    Returns:
+        None
+    """
+    try:
+        if connection.unread_result:
+            cursor.fetchall()
+        cursor.close()
+    except analytics.DATABASE_ERRORS:
+        pass  # The statement is deallocated with the connection anyway
@@ -0,0 +1,114 @@
+import datetime
+import threading
+
+import analytics
+from habit_class import DEFAULT_USER_ID
+
+
+class RolloverScheduler:
+    """
+    Moves today's date of a long-running process forward at midnight and runs the daily maintenance for the
+    new day, so a session left open past midnight expires streaks like a new one would.
+
+    A background thread sleeps until the next midnight of the clock, or at most poll_interval seconds so a
+    changed system clock or a suspended machine is noticed, and then rolls over in one session: the streaks
+    whose streak_expires_on date has come are reset with analytics.refresh_all_streaks, which only reads the
+    expiring streaks through their index, and the rollup rows of a week or month that just started are
+    created. Days the process slept through are caught up by the same rollover, since every streak that
+    expired in between has an expiry date before the new date.
+
+    Attributes:
+        todays_date (datetime.date): The date of the last rollover, or the date the scheduler started with.
+        user_id (int): The user whose streaks are expired.
+        poll_interval (float): The maximum number of seconds between two looks at the clock.
+        expired_count (int): The number of streaks reset by rollovers so far.
+        error (Exception | None): The error of the last failed rollover; it is retried at the next look.
+    """
+
+    def __init__(self, database, todays_date: datetime.date, user_id: int = DEFAULT_USER_ID, on_rollover=None,
+                 clock=None, poll_interval: float = 60.0):
+        """
+        Initialize a RolloverScheduler; start() starts the background thread.
+
+        Args:
+            database (database.Database | sqlite_backend.SQLiteDatabase): The habits database.
+            todays_date (datetime.date): The date the process currently uses as today.
+            user_id (int): The user whose streaks are expired.
+            on_rollover (Callable[[datetime.date], None] | None): Called with the new date after every
+                rollover, e.g. to update the date a user interface uses.
+            clock (Callable[[], datetime.datetime] | None): Returns the local time, datetime.datetime.now by
+                default.
+            poll_interval (float): The maximum number of seconds between two looks at the clock.
+        """
+        self.todays_date = todays_date
+        self.user_id = user_id
+        self.poll_interval = poll_interval
+        self.expired_count = 0
+        self.error = None
+        self._database = database
+        self._on_rollover = on_rollover
+        self._clock = clock or datetime.datetime.now
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start watching the clock on a background thread.
+
+        Returns:
+            RolloverScheduler: self, for chaining.
+        """
+        self._thread = threading.Thread(target=self._run, name="day-rollover", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the background thread and wait for a rollover in progress to finish.
+
+        Returns:
+            None
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def roll_over(self, new_date: datetime.date):
+        """
+        Run the maintenance for a new day and make it today's date (commits).
+
+        Args:
+            new_date (datetime.date): The new date.
+
+        Returns:
+            int: The number of streaks that expired.
+        """
+        expired_count = self._database.run(self._roll_over, self.todays_date, new_date)
+        self.todays_date = new_date
+        self.expired_count += expired_count
+        if self._on_rollover is not None:
+            self._on_rollover(new_date)
+        return expired_count
+
+    def _roll_over(self, cursor, previous_date, new_date):
+        expired_count = analytics.refresh_all_streaks(cursor, new_date, self.user_id)
+        if any(analytics.rollup_period_start(period, new_date) != analytics.rollup_period_start(period, previous_date)
+               for period in analytics.ROLLUP_PERIODS):
+            analytics.refresh_rollups(cursor, new_date, self.user_id)
+        return expired_count
+
+    def _run(self):
+        while not self._stopped.wait(self._seconds_to_midnight()):
+            today = self._clock().date()
+            if today <= self.todays_date:
+                continue
+            try:
+                self.roll_over(today)
+                self.error = None
+            except analytics.DATABASE_ERRORS as err:
+                self.error = err  # todays_date stays behind, so the rollover is retried at the next look
+
+    def _seconds_to_midnight(self):
+        now = self._clock()
+        next_midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+        return max(0.0, min(self.poll_interval, (next_midnight - now).total_seconds()))
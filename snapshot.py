@@ -0,0 +1,388 @@
+import datetime
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from habit_class import DEFAULT_USER_ID
+from streak_index import build_run_arrays
+
+# File layout, all little-endian and 4-byte aligned:
+#   header | habit records | habit names (UTF-8, padded) | offsets (habit_count + 1 uint32)
+#   | check-off day ordinals | run_starts | longest_upto (check_off_count int32 each)
+# The check-offs of the habit in record i are at positions offsets[i] to offsets[i + 1] of the three columns.
+MAGIC = b"HABITSNP"
+VERSION = 1
+HEADER = struct.Struct("<8sIiiIII")  # magic, version, user_id, watermark, habit_count, check_off_count, names_size
+HABIT_RECORD = struct.Struct("<iiiII")  # habit_id, periodicity, date_created, name_offset, name_length
+
+
+def write_snapshot(cursor, path: str, user_id: int = DEFAULT_USER_ID, batch_size: int = 10000):
+    """
+    Write a snapshot of the habits and check-off history of a user to path, replacing it atomically.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        path (str): The path of the snapshot file.
+        user_id (int): The user whose habits are written.
+        batch_size (int): The number of check-off rows fetched at a time.
+
+    Returns:
+        int: The number of check-offs in the snapshot.
+    """
+    habits = _read_habits(cursor, user_id)
+    days_by_habit = {habit[0]: array("i") for habit in habits}
+    _read_check_offs(cursor, user_id, None, days_by_habit, batch_size)
+    return _write(path, user_id, habits, days_by_habit)
+
+
+def refresh_snapshot(cursor, path: str, user_id: int = DEFAULT_USER_ID, batch_size: int = 10000):
+    """
+    Bring a snapshot up to date, reading only the check-offs dated on or after its watermark (the date of
+    its latest check-off) from the database. The habits table is re-read, so new and deleted habits are
+    picked up too. Check-offs dated before the watermark that were added after the snapshot was written
+    (backdated check-offs) are found by counting the check-offs before the watermark per habit on the
+    (user_id, habit_id, check_off_date) index; the whole history of a habit whose count differs from the
+    snapshot is read again. A missing or incompatible snapshot is rewritten from scratch.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+        path (str): The path of the snapshot file.
+        user_id (int): The user whose habits are written.
+        batch_size (int): The number of check-off rows fetched at a time.
+
+    Returns:
+        int: The number of check-offs in the snapshot.
+    """
+    try:
+        old_snapshot = Snapshot(path)
+    except (OSError, ValueError):
+        return write_snapshot(cursor, path, user_id, batch_size)
+
+    with old_snapshot:
+        if old_snapshot.user_id != user_id:
+            return write_snapshot(cursor, path, user_id, batch_size)
+
+        habits = _read_habits(cursor, user_id)
+        days_by_habit = {habit[0]: old_snapshot.check_off_ordinals(habit[0]) for habit in habits}
+        watermark = old_snapshot.watermark
+
+    if watermark is not None:
+        stale_habit_ids = _habits_with_backdated_check_offs(cursor, user_id, watermark, days_by_habit)
+        stale_days = {habit_id: array("i") for habit_id in stale_habit_ids}
+        for start in range(0, len(stale_habit_ids), batch_size):
+            _read_check_offs(cursor, user_id, None, stale_days, batch_size, stale_habit_ids[start:start + batch_size])
+        days_by_habit.update(stale_days)
+
+    _read_check_offs(cursor, user_id, watermark, days_by_habit, batch_size)
+    return _write(path, user_id, habits, days_by_habit)
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot file written by write_snapshot.
+
+    The file is memory-mapped and its columns are used in place through memoryview casts, so opening a
+    snapshot only parses the small habit table, and queries bisect the mapped check-off dates directly.
+    This lets reporting processes answer check-off, streak and periodicity questions without a database
+    connection. Use it as a context manager, or call close() when done.
+
+    Attributes:
+        path (str): The path of the snapshot file.
+        user_id (int): The user whose habits are in the snapshot.
+        watermark (datetime.date | None): The date of the latest check-off in the snapshot.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open and map a snapshot file.
+
+        Args:
+            path (str): The path of the snapshot file.
+        """
+        if sys.byteorder != "little":
+            raise ValueError("Snapshots can only be read on little-endian hosts.")
+
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._load()
+        except (ValueError, struct.error):
+            self.close()
+            raise
+
+    def _load(self):
+        self._views = []
+        view = memoryview(self._mmap)
+        self._views.append(view)
+        if len(view) < HEADER.size:
+            raise ValueError(f"'{self.path}' is not a habits snapshot.")
+
+        magic, version, self.user_id, watermark, habit_count, check_off_count, names_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"'{self.path}' is not a version {VERSION} habits snapshot.")
+        self.watermark = datetime.date.fromordinal(watermark) if watermark else None
+
+        position = HEADER.size
+        records_end = position + habit_count * HABIT_RECORD.size
+        names_start = records_end
+        position = names_start + _padded(names_size)
+
+        self._offsets = self._column(view, position, habit_count + 1, "I")
+        position += (habit_count + 1) * 4
+        self._days = self._column(view, position, check_off_count, "i")
+        self._run_starts = self._column(view, position + check_off_count * 4, check_off_count, "i")
+        self._longest_upto = self._column(view, position + check_off_count * 8, check_off_count, "i")
+
+        self._habits = {}       # habit_id -> (record position, periodicity, date_created, name)
+        self._ids_by_name = {}  # habit_name.lower() -> habit_id
+        for i, record in enumerate(HABIT_RECORD.iter_unpack(view[HEADER.size:records_end])):
+            habit_id, periodicity, date_created, name_offset, name_length = record
+            name_start = names_start + name_offset
+            name = bytes(view[name_start:name_start + name_length]).decode("utf-8")
+            self._habits[habit_id] = (i, periodicity, datetime.date.fromordinal(date_created), name)
+            self._ids_by_name[name.lower()] = habit_id
+
+    def _column(self, view, start, length, typecode):
+        end = start + length * 4
+        if end > len(view):
+            raise ValueError(f"'{self.path}' is truncated.")
+        column = view[start:end].cast(typecode)
+        self._views.append(column)
+        return column
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._habits)
+
+    def close(self):
+        """
+        Release the column views and unmap the file.
+        """
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def get_all_habits(self):
+        """
+        Get the names of all habits in the snapshot.
+
+        Returns:
+            list[str]: The names of all habits in the snapshot.
+        """
+        return [habit[3] for habit in self._habits.values()]
+
+    def get_habit_id(self, habit_name: str):
+        """
+        Look up the habit_id of a habit by name.
+
+        Args:
+            habit_name (str): The name of the habit, matched case-insensitively.
+
+        Returns:
+            int or None: The habit_id if found, otherwise None.
+        """
+        return self._ids_by_name.get(habit_name.lower())
+
+    def get_habit(self, habit_id: int):
+        """
+        Look up the metadata of a habit.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+
+        Returns:
+            tuple or None: (habit_name, periodicity, date_created) if found, otherwise None.
+        """
+        habit = self._habits.get(habit_id)
+        if habit is None:
+            return None
+        return habit[3], habit[1], habit[2]
+
+    def get_habit_by_periodicity(self, period: int):
+        """
+        Get the habits with the given periodicity.
+
+        Args:
+            period (int): Periodicity in days to filter habits.
+
+        Returns:
+            list[str]: The names of the habits with the given periodicity.
+        """
+        return [habit[3] for habit in self._habits.values() if habit[1] == period]
+
+    def check_off_ordinals(self, habit_id: int):
+        """
+        Copy the check-off dates of a habit out of the snapshot.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+
+        Returns:
+            array: A copy of the habit's sorted check-off dates as day ordinals, empty for an unknown habit.
+        """
+        start, end = self._range(habit_id)
+        return array("i", self._days[start:end])
+
+    def is_habit_checked_off(self, habit_id: int, check_date: datetime.date):
+        """
+        Check if a habit was checked off on the given date.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            check_date (datetime.date): The date to check.
+
+        Returns:
+            bool: True if the habit is checked off on check_date, False otherwise.
+        """
+        start, end = self._range(habit_id)
+        day = check_date.toordinal()
+        position = bisect_left(self._days, day, start, end)
+        return position < end and self._days[position] == day
+
+    def get_current_streak(self, habit_id: int, as_of_date: datetime.date):
+        """
+        Get the current streak of a habit as it was on the given date.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            as_of_date (datetime.date): The date on which the streak is evaluated.
+
+        Returns:
+            int | None: The current streak on as_of_date, or None if the habit is not in the snapshot.
+        """
+        habit = self._habits.get(habit_id)
+        if habit is None:
+            return None
+
+        start, end = self._range(habit_id)
+        day = as_of_date.toordinal()
+        i = bisect_right(self._days, day, start, end) - 1
+        if i < start or day - self._days[i] > habit[1]:
+            return 0
+        return i - start - self._run_starts[i] + 1
+
+    def get_longest_streak(self, habit_id: int, as_of_date: datetime.date):
+        """
+        Get the longest streak of a habit up to the given date.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            as_of_date (datetime.date): Check-offs after this date are ignored.
+
+        Returns:
+            int | None: The longest streak up to as_of_date, or None if the habit is not in the snapshot.
+        """
+        if habit_id not in self._habits:
+            return None
+
+        start, end = self._range(habit_id)
+        i = bisect_right(self._days, as_of_date.toordinal(), start, end) - 1
+        if i < start:
+            return 0
+        return self._longest_upto[i]
+
+    def _range(self, habit_id):
+        habit = self._habits.get(habit_id)
+        if habit is None:
+            return 0, 0
+        return self._offsets[habit[0]], self._offsets[habit[0] + 1]
+
+
+def _read_habits(cursor, user_id):
+    cursor.execute(
+        "SELECT id, habit_name, periodicity, date_created FROM habits WHERE user_id = %s ORDER BY id",
+        (user_id,),
+    )
+    return cursor.fetchall()
+
+
+def _read_check_offs(cursor, user_id, since, days_by_habit, batch_size, habit_ids=None):
+    # Appends the check-offs dated on or after since (all check-offs if None) to the day arrays in days_by_habit,
+    # only those of habit_ids if given
+    check_off_filter = ""
+    filter_params = [user_id]
+    if since is not None:
+        check_off_filter += " AND check_off_date >= %s"
+        filter_params.append(since)
+    if habit_ids is not None:
+        check_off_filter += f" AND habit_id IN ({', '.join(['%s'] * len(habit_ids))})"
+        filter_params.extend(habit_ids)
+    cursor.execute(f"""
+        SELECT habit_id, check_off_date FROM check_off_dates
+        WHERE user_id = %s{check_off_filter}
+        ORDER BY habit_id, check_off_date
+    """, filter_params)
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for habit_id, check_off_date in rows:
+            days = days_by_habit.get(habit_id)
+            day = check_off_date.toordinal()
+            if days is not None and (not days or day > days[-1]):
+                days.append(day)
+
+
+def _habits_with_backdated_check_offs(cursor, user_id, watermark, days_by_habit):
+    # The habits with more or fewer check-offs dated before the watermark in the database than in days_by_habit
+    cursor.execute("""
+        SELECT habit_id, COUNT(*) FROM check_off_dates
+        WHERE user_id = %s AND check_off_date < %s
+        GROUP BY habit_id
+    """, (user_id, watermark))
+    counts = dict(cursor.fetchall())
+    watermark_day = watermark.toordinal()
+    return [habit_id for habit_id, days in days_by_habit.items()
+            if counts.get(habit_id, 0) != bisect_left(days, watermark_day)]
+
+
+def _write(path, user_id, habits, days_by_habit):
+    names = bytearray()
+    records = bytearray()
+    offsets = array("I", [0])
+    days, run_starts, longest_upto = array("i"), array("i"), array("i")
+
+    for habit_id, habit_name, periodicity, date_created in habits:
+        encoded_name = habit_name.encode("utf-8")
+        records += HABIT_RECORD.pack(habit_id, periodicity, date_created.toordinal(), len(names), len(encoded_name))
+        names += encoded_name
+
+        habit_days = days_by_habit[habit_id]
+        habit_run_starts, habit_longest_upto = build_run_arrays(habit_days, periodicity)
+        days.extend(habit_days)
+        run_starts.extend(habit_run_starts)
+        longest_upto.extend(habit_longest_upto)
+        offsets.append(len(days))
+
+    names_size = len(names)
+    names += bytes(_padded(names_size) - names_size)
+    watermark = max((habit_days[-1] for habit_days in days_by_habit.values() if habit_days), default=0)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, user_id, watermark, len(habits), len(days), names_size))
+        file.write(records)
+        file.write(names)
+        for column in (offsets, days, run_starts, longest_upto):
+            if sys.byteorder != "little":
+                column.byteswap()
+            file.write(column.tobytes())
+    os.replace(temporary_path, path)
+
+    return len(days)
+
+
+def _padded(size):
+    return (size + 3) // 4 * 4
@@ -0,0 +1,184 @@
+import datetime
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import analytics
+from instrumentation import InstrumentedCursor
+from prepared_statements import STATEMENT_CACHE_SIZE, StatementCounts, StatementCursor
+
+# Store dates as ISO-8601 text and read columns declared as DATE back as datetime.date, like MySQL does
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_converter("DATE", lambda value: datetime.date.fromisoformat(value.decode()))
+
+
+class SQLiteCursor:
+    """
+    Cursor wrapper that lets the analytics functions run unchanged on SQLite.
+
+    Translates the %s parameter markers used throughout the analytics module to SQLite's ? markers and
+    exposes dialect = "sqlite", which the few functions that need dialect-specific SQL check.
+    """
+
+    dialect = "sqlite"
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, operation: str, params=()):
+        self._cursor.execute(operation.replace("%s", "?"), tuple(params))
+
+    def executemany(self, operation: str, seq_params):
+        self._cursor.executemany(operation.replace("%s", "?"), [tuple(params) for params in seq_params])
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+
+class SQLiteConnection:
+    """
+    SQLite connection with the subset of the mysql.connector connection interface used by this application.
+    Foreign keys are enforced, so deleting a habit cascades to its check-off dates and streaks as on MySQL.
+    The driver keeps the compiled statements of the connection, up to STATEMENT_CACHE_SIZE of them, and
+    reuses them when the same SQL text is executed again.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Open an SQLite database file, or a private in-memory database for ":memory:".
+
+        Args:
+            path (str): The path of the database file, or ":memory:".
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                                           cached_statements=STATEMENT_CACHE_SIZE)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+
+    def cursor(self):
+        return SQLiteCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+def connect(path: str = ":memory:"):
+    """
+    Open an SQLite database for use with the analytics functions.
+
+    Args:
+        path (str): The path of the database file, or ":memory:" for an in-memory database.
+
+    Returns:
+        SQLiteConnection: The connection.
+    """
+    return SQLiteConnection(path)
+
+
+class SQLiteDatabase:
+    """
+    Embedded counterpart of database.Database: the same session() and run() interface on one SQLite
+    connection. Sessions are serialized with a lock, so the database can still be shared by several threads.
+
+    Attributes:
+        query_stats (instrumentation.QueryStats | None): If set, the cursors of all sessions record their
+            statements into it.
+        statement_counts (prepared_statements.StatementCounts): The executions of every statement run by the
+            sessions. Statements are prepared by the driver's cache, so no prepares are counted.
+    """
+
+    query_stats = None
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Open the SQLite database, creating the habits tables if they do not exist yet.
+
+        Args:
+            path (str): The path of the database file, or ":memory:".
+        """
+        self.db_name = path
+        self.statement_counts = StatementCounts()
+        self._connection = connect(path)
+        self._lock = threading.RLock()
+
+        with self.session() as cursor:
+            if analytics.check_database_exists(cursor, path):
+                analytics.upgrade_database(cursor)
+                print("Database located successfully.")
+            else:
+                print("Database not found. Creating database...")
+                analytics.create_database(cursor, path)
+                print("Database created successfully.")
+
+    @contextmanager
+    def session(self):
+        """
+        Context manager scoping one transaction. Yields a cursor, commits when the block succeeds and rolls
+        back when it raises. Changes to the in-process caches of analytics are applied once the transaction
+        commits.
+
+        Yields:
+            SQLiteCursor: The cursor of the session.
+        """
+        with self._lock:
+            cursor = StatementCursor(self._connection.cursor(), self.statement_counts)
+            session_cursor = cursor if self.query_stats is None else InstrumentedCursor(cursor, self.query_stats)
+            analytics.begin_cache_changes(session_cursor)
+            committed = False
+            try:
+                yield session_cursor
+                self._connection.commit()
+                committed = True
+            except Exception:
+                self._connection.rollback()
+                raise
+            finally:
+                analytics.end_cache_changes(session_cursor, committed)
+                cursor.close()
+
+    def run(self, function, *args, **kwargs):
+        """
+        Run function(cursor, *args, **kwargs) in its own session and commit it.
+
+        Args:
+            function (Callable): A function taking a cursor as its first argument, e.g. analytics.get_habit_id.
+            *args: Further positional arguments for function.
+            **kwargs: Keyword arguments for function.
+
+        Returns:
+            The return value of function.
+        """
+        with self.session() as cursor:
+            return function(cursor, *args, **kwargs)
+
+    def close(self):
+        """
+        Close the SQLite connection.
+        """
+        self._connection.close()
@@ -0,0 +1,249 @@
+import datetime
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+def build_run_arrays(day_ordinals, periodicity: int):
+    """
+    Compute the streak run arrays for a sorted sequence of check-off day ordinals.
+
+    Check-offs belong to the same run (streak) as long as consecutive check-offs are at most 'periodicity'
+    days apart, which is the rule used by analytics.update_streaks and analytics.rebuild_streaks.
+
+    Args:
+        day_ordinals (Sequence[int]): Sorted, distinct check-off dates as datetime.date.toordinal() values.
+        periodicity (int): The number of days between habit repetitions.
+
+    Returns:
+        tuple[array, array]: run_starts[i] is the index of the first check-off of the run containing
+        check-off i, and longest_upto[i] is the longest run among check-offs 0..i.
+    """
+    run_starts = array("i")
+    longest_upto = array("i")
+
+    for i, day in enumerate(day_ordinals):
+        _append_run(run_starts, longest_upto, day_ordinals, i, day, periodicity)
+
+    return run_starts, longest_upto
+
+
+def _append_run(run_starts, longest_upto, day_ordinals, i, day, periodicity):
+    if i > 0 and day - day_ordinals[i - 1] <= periodicity:
+        run_starts.append(run_starts[i - 1])
+    else:
+        run_starts.append(i)
+
+    run_length = i - run_starts[i] + 1
+    longest_upto.append(max(longest_upto[i - 1], run_length) if i > 0 else run_length)
+
+
+class CheckOffIndex:
+    """
+    In-memory index of the check-off history, answering streak questions for any date.
+
+    Every habit's check-off dates are kept as a sorted array of int day ordinals, together with the run
+    arrays from build_run_arrays. Questions about a date are answered with one bisection, so the current and
+    longest streak of a habit on any past date cost O(log n) instead of a replay of its history. Appending a
+    check-off after the latest one is O(1); an out-of-order check-off rebuilds that habit's arrays. The index
+    can be updated and queried from several threads.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty CheckOffIndex.
+        """
+        self._habits = {}  # habit_id -> [periodicity, day_ordinals, run_starts, longest_upto, user_id]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._habits)
+
+    def __contains__(self, habit_id):
+        return habit_id in self._habits
+
+    def load(self, cursor, user_id: int = None, batch_size: int = 10000):
+        """
+        Fill the index from the `habits` and `check_off_dates` tables. The check-offs are read in batches of
+        batch_size rows, ordered by habit and date.
+
+        Args:
+            cursor (mysql.connector.cursor.MySQLCursor): The MySQL cursor to execute queries.
+            user_id (int | None): Only load the habits of this user, or None to load habits of every user.
+            batch_size (int): The number of check-off rows fetched at a time.
+
+        Returns:
+            int: The number of check-offs loaded.
+        """
+        user_filter = "" if user_id is None else "WHERE user_id = %s"
+        params = () if user_id is None else (user_id,)
+
+        habits = {}
+        cursor.execute(f"SELECT id, user_id, periodicity FROM habits {user_filter}", params)
+        for habit_id, owner, periodicity in cursor.fetchall():
+            habits[habit_id] = [periodicity, array("i"), None, None, owner]
+
+        cursor.execute(
+            f"SELECT habit_id, check_off_date FROM check_off_dates {user_filter} ORDER BY habit_id, check_off_date",
+            params,
+        )
+        count = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for habit_id, check_off_date in rows:
+                habit = habits.get(habit_id)
+                if habit is not None:
+                    habit[1].append(check_off_date.toordinal())
+                    count += 1
+
+        for habit in habits.values():
+            habit[2], habit[3] = build_run_arrays(habit[1], habit[0])
+
+        with self._lock:
+            self._habits = habits
+        return count
+
+    def add_habit(self, habit_id: int, periodicity: int, check_off_dates=(), user_id: int = None):
+        """
+        Add a habit to the index, replacing it if it is already indexed.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            periodicity (int): The number of days between habit repetitions.
+            check_off_dates (Iterable[datetime.date]): The dates the habit was checked off.
+            user_id (int | None): The user owning the habit, or None if the queries do not check the owner.
+
+        Returns:
+            None
+        """
+        day_ordinals = array("i", sorted({check_date.toordinal() for check_date in check_off_dates}))
+        run_starts, longest_upto = build_run_arrays(day_ordinals, periodicity)
+        with self._lock:
+            self._habits[habit_id] = [periodicity, day_ordinals, run_starts, longest_upto, user_id]
+
+    def remove_habit(self, habit_id: int):
+        """
+        Remove a habit from the index, e.g. after it was deleted from the database.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._habits.pop(habit_id, None)
+
+    def add_check_off(self, habit_id: int, check_date: datetime.date):
+        """
+        Record a new check-off of an indexed habit. Check-offs of habits that are not indexed are ignored.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            check_date (datetime.date): The date the habit was checked off.
+
+        Returns:
+            bool: True if the check-off was added, False if it was already indexed or the habit is unknown.
+        """
+        with self._lock:
+            return self._add_check_off(habit_id, check_date)
+
+    def _add_check_off(self, habit_id, check_date):
+        # Must be called with the lock held
+        habit = self._habits.get(habit_id)
+        if habit is None:
+            return False
+
+        periodicity, day_ordinals, run_starts, longest_upto, _ = habit
+        day = check_date.toordinal()
+
+        if not day_ordinals or day > day_ordinals[-1]:
+            # Common case: the check-off extends the history, update the run arrays in place
+            day_ordinals.append(day)
+            _append_run(run_starts, longest_upto, day_ordinals, len(day_ordinals) - 1, day, periodicity)
+            return True
+
+        position = bisect_left(day_ordinals, day)
+        if day_ordinals[position] == day:
+            return False
+
+        day_ordinals.insert(position, day)
+        habit[2], habit[3] = build_run_arrays(day_ordinals, periodicity)
+        return True
+
+    def is_checked_off(self, habit_id: int, check_date: datetime.date):
+        """
+        Check if an indexed habit was checked off on the given date.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            check_date (datetime.date): The date to check.
+
+        Returns:
+            bool: True if the habit is checked off on check_date, False otherwise.
+        """
+        with self._lock:
+            habit = self._habits.get(habit_id)
+            if habit is None:
+                return False
+
+            day_ordinals = habit[1]
+            day = check_date.toordinal()
+            position = bisect_left(day_ordinals, day)
+            return position < len(day_ordinals) and day_ordinals[position] == day
+
+    def current_streak(self, habit_id: int, as_of_date: datetime.date, user_id: int = None):
+        """
+        Get the current streak of a habit as it was on the given date.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            as_of_date (datetime.date): The date on which the streak is evaluated.
+            user_id (int | None): Only answer if this user owns the habit, or None for any owner.
+
+        Returns:
+            int | None: The current streak on as_of_date, or None if the habit is not indexed.
+        """
+        with self._lock:
+            habit = self._get(habit_id, user_id)
+            if habit is None:
+                return None
+
+            periodicity, day_ordinals, run_starts, _, _ = habit
+            day = as_of_date.toordinal()
+            i = bisect_right(day_ordinals, day) - 1
+            if i < 0 or day - day_ordinals[i] > periodicity:
+                return 0
+            return i - run_starts[i] + 1
+
+    def longest_streak(self, habit_id: int, as_of_date: datetime.date, user_id: int = None):
+        """
+        Get the longest streak of a habit up to the given date.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            as_of_date (datetime.date): Check-offs after this date are ignored.
+            user_id (int | None): Only answer if this user owns the habit, or None for any owner.
+
+        Returns:
+            int | None: The longest streak up to as_of_date, or None if the habit is not indexed.
+        """
+        with self._lock:
+            habit = self._get(habit_id, user_id)
+            if habit is None:
+                return None
+
+            day_ordinals, longest_upto = habit[1], habit[3]
+            i = bisect_right(day_ordinals, as_of_date.toordinal()) - 1
+            if i < 0:
+                return 0
+            return longest_upto[i]
+
+    def _get(self, habit_id, user_id):
+        # Must be called with the lock held
+        habit = self._habits.get(habit_id)
+        if habit is None or (user_id is not None and habit[4] is not None and habit[4] != user_id):
+            return None
+        return habit
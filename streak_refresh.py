@@ -0,0 +1,224 @@
+import datetime
+import threading
+import time
+from itertools import islice
+
+import analytics
+from habit_class import DEFAULT_USER_ID
+
+
+class StreakRefresher:
+    """
+    Refreshes the streaks and completion rollups of a user's habits for today on a background thread, so the
+    command prompt does not have to wait for the daily refresh at startup.
+
+    The habits are refreshed in batches of batch_size, each in its own session. A command that reads or
+    updates the streaks of a habit calls wait_for first: if the background thread has not reached the habit
+    yet, it is refreshed right away with the command's cursor, so a command only ever waits for its own
+    habit (or for the batch that is being refreshed at that moment), never for the whole refresh. Commands
+    that read every habit call wait_all. Sessions of the SQLite backend are serialized, which is why the
+    background thread claims its batches inside its session and the waiting commands refresh with their own
+    cursor instead of waiting for the thread.
+
+    Attributes:
+        todays_date (datetime.date): The date the streaks are refreshed for.
+        user_id (int): The user whose habits are refreshed.
+        batch_size (int): The number of habits refreshed per background session.
+        reset_count (int): The number of broken streaks reset so far.
+        error (Exception | None): The error that stopped the background thread, if any. The habits it did not
+            refresh are then refreshed by the commands that wait for them.
+    """
+
+    def __init__(self, database, todays_date: datetime.date, user_id: int = DEFAULT_USER_ID, batch_size: int = 500,
+                 timer=None):
+        """
+        Initialize a StreakRefresher; start() starts the background thread.
+
+        Args:
+            database (database.Database | sqlite_backend.SQLiteDatabase): The habits database.
+            todays_date (datetime.date): The date the streaks are refreshed for.
+            user_id (int): The user whose habits are refreshed.
+            batch_size (int): The number of habits refreshed per background session.
+            timer (instrumentation.StartupTimer | None): If set, the background refresh is recorded as a phase.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+
+        self.todays_date = todays_date
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.reset_count = 0
+        self.error = None
+        self._database = database
+        self._timer = timer
+        self._condition = threading.Condition()
+        self._unclaimed = None       # Ordered dict of the habit ids nobody started refreshing, None until loaded
+        self._in_progress = set()    # Habit ids being refreshed and not committed yet
+        self._loading = False
+        self._thread_batch = ()      # The batch claimed by the background thread
+        self._thread = None
+
+    @property
+    def finished(self):
+        """
+        bool: True once every habit has been refreshed.
+        """
+        with self._condition:
+            return self._unclaimed is not None and not self._unclaimed and not self._in_progress
+
+    def start(self):
+        """
+        Start refreshing on a background thread.
+
+        Returns:
+            StreakRefresher: self, for chaining.
+        """
+        self._thread = threading.Thread(target=self._run, name="streak-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self, timeout: float = None):
+        """
+        Wait for the background thread to end.
+
+        Args:
+            timeout (float | None): The maximum number of seconds to wait, or None to wait until it ends.
+
+        Returns:
+            bool: True if every habit has been refreshed.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.finished
+
+    def wait_for(self, cursor, habit_id: int):
+        """
+        Make sure a habit's streaks are refreshed before a command reads or updates them.
+
+        Args:
+            cursor (mysql.connector.cursor.MySQLCursor): The cursor of the command's session, used to refresh
+                the habit if the background thread has not reached it yet.
+            habit_id (int): The habit.
+
+        Returns:
+            None
+        """
+        self._refresh_now(cursor, {habit_id})
+
+    def wait_all(self, cursor):
+        """
+        Make sure the streaks of every habit are refreshed, refreshing the habits the background thread has
+        not reached yet with the cursor of the command.
+
+        Args:
+            cursor (mysql.connector.cursor.MySQLCursor): The cursor of the command's session.
+
+        Returns:
+            None
+        """
+        self._refresh_now(cursor, None)
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            self._database.run(self._load)
+            while self._database.run(self._refresh_next_batch):
+                self._release(self._thread_batch, refreshed=True)  # Only now that the batch is committed
+                self._thread_batch = ()
+        except Exception as err:
+            self.error = err
+            self._release(self._thread_batch, refreshed=False)
+            self._thread_batch = ()
+        finally:
+            if self._timer is not None:
+                self._timer.record("refresh streaks and rollups", started)
+
+    def _load(self, cursor):
+        # Load the ids of the habits to refresh, unless another thread loads them already
+        with self._condition:
+            self._condition.wait_for(lambda: not self._loading)
+            if self._unclaimed is not None:
+                return
+            self._loading = True
+
+        habit_ids = None
+        try:
+            cursor.execute("SELECT id FROM habits WHERE user_id = %s ORDER BY id", (self.user_id,))
+            habit_ids = [row[0] for row in cursor.fetchall()]
+        finally:
+            with self._condition:
+                self._loading = False
+                if habit_ids is not None:
+                    self._unclaimed = dict.fromkeys(habit_ids)
+                self._condition.notify_all()
+
+    def _refresh_next_batch(self, cursor):
+        # Claimed inside the session, so a command holding the (serialized) SQLite session never waits for a
+        # batch the background thread has claimed but cannot start
+        self._release(self._thread_batch, refreshed=False)  # Left over from an attempt that was retried
+        with self._condition:
+            self._thread_batch = self._claim(None, self.batch_size)
+        if not self._thread_batch:
+            return False
+        self._refresh(cursor, self._thread_batch)
+        return True
+
+    def _refresh_now(self, cursor, wanted):
+        with self._condition:
+            loaded = self._unclaimed is not None
+        if not loaded:
+            self._load(cursor)
+
+        while True:
+            with self._condition:
+                claimed = self._claim(wanted, self.batch_size)
+                if not claimed:
+                    # Wait for the habits the background thread is refreshing, or for habits it gives back
+                    self._condition.wait_for(lambda: not self._busy(wanted) or self._claim_count(wanted))
+                    if not self._busy(wanted) and not self._claim_count(wanted):
+                        return
+                    continue
+
+            try:
+                self._refresh(cursor, claimed)
+            except BaseException:
+                self._release(claimed, refreshed=False)
+                raise
+            self._release(claimed, refreshed=True)
+
+    def _refresh(self, cursor, habit_ids):
+        reset_count = analytics.refresh_all_streaks(cursor, self.todays_date, self.user_id, habit_ids)
+        analytics.refresh_rollups(cursor, self.todays_date, self.user_id, habit_ids)
+        with self._condition:
+            self.reset_count += reset_count
+
+    def _claim(self, wanted, limit: int = None):
+        # Move unclaimed habits (all, or only the wanted ones) to the in-progress set; call with the lock held
+        if self._unclaimed is None:
+            return []
+        if wanted is None:
+            claimed = list(islice(self._unclaimed, limit))
+        else:
+            claimed = [habit_id for habit_id in wanted if habit_id in self._unclaimed][:limit]
+        for habit_id in claimed:
+            del self._unclaimed[habit_id]
+        self._in_progress.update(claimed)
+        return claimed
+
+    def _claim_count(self, wanted):
+        if self._unclaimed is None:
+            return 0
+        if wanted is None:
+            return len(self._unclaimed)
+        return sum(1 for habit_id in wanted if habit_id in self._unclaimed)
+
+    def _busy(self, wanted):
+        return bool(self._in_progress if wanted is None else self._in_progress & wanted)
+
+    def _release(self, habit_ids, refreshed: bool):
+        # Mark claimed habits as refreshed, or give them back to be refreshed by somebody else
+        with self._condition:
+            self._in_progress.difference_update(habit_ids)
+            if not refreshed and habit_ids:
+                self._unclaimed.update(dict.fromkeys(habit_ids))
+            self._condition.notify_all()
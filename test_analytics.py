@@ -1,6 +1,8 @@
-import mysql.connector
 import datetime
 import analytics
+import sqlite_backend
+from habit_catalog import HabitCatalog
+from streak_index import CheckOffIndex
 from habit_class import Habit
 import pytest
 
@@ -61,13 +63,25 @@ EXPECTED_LONGEST_STREAKS = {
         SAMPLE_HABITS[4].name: 3,   # Meditate(TEST)
     }
 
-@pytest.fixture(scope="module")
-def testing_cursor():
+@pytest.fixture(scope="module", params=["sqlite", "mysql"])
+def testing_cursor(request):
     """
-    Creates a MySQL connection and cursor for testing.
+    Creates a connection and cursor for testing, once for an in-memory SQLite database
+    and once for the MySQL server.
     Yields the cursor and ensures cleanup afterward.
     """
-    connection = mysql.connector.connect(
+    if request.param == "sqlite":
+        connection = sqlite_backend.connect(":memory:")
+        cursor = connection.cursor()
+        yield cursor, connection
+
+        cursor.close()
+        connection.close()
+        return
+
+    mysql_connector = pytest.importorskip("mysql.connector")
+    analytics.register_mysql_errors(mysql_connector)
+    connection = mysql_connector.connect(
         host="localhost",
         user="root",
         password="MYpassword"
@@ -103,7 +117,7 @@ def test_create_sample_habits(testing_cursor):
     """
     cursor, connection = testing_cursor
 
-    cursor.execute(f"USE {DB_NAME}")
+    analytics.use_database(cursor, DB_NAME)
 
     count_created = 0
 
@@ -126,7 +140,7 @@ def test_get_habit_id(testing_cursor):
         - The habit ID for "Study(TEST)" is 1.
     """
     cursor, connection = testing_cursor
-    cursor.execute(f"USE {DB_NAME}")
+    analytics.use_database(cursor, DB_NAME)
 
     habit_name_1 = SAMPLE_HABITS[3].name
     habit_id_1 = analytics.get_habit_id(cursor, habit_name_1)
@@ -143,7 +157,7 @@ def test_check_off_and_get_current_streak(testing_cursor):
     On dates in EXPECTED_CURRENT_STREAKS, assert the current streak is calculated correctly.
     """
     cursor, connection = testing_cursor
-    cursor.execute(f"USE {DB_NAME}")
+    analytics.use_database(cursor, DB_NAME)
 
     # Map habit names to habit_ids using get_habit_id
     habit_ids = {}
@@ -202,7 +216,7 @@ def test_habit_check_offs(testing_cursor):
 
     """
     cursor, connection = testing_cursor
-    cursor.execute(f"USE {DB_NAME}")
+    analytics.use_database(cursor, DB_NAME)
 
     study_id = analytics.get_habit_id(cursor, SAMPLE_HABITS[0].name)
     workout_id = analytics.get_habit_id(cursor, SAMPLE_HABITS[2].name)
@@ -226,7 +240,7 @@ def test_get_habit_by_periodicity(testing_cursor):
     Ensures it returns the correct habit names from the test database.
     """
     cursor, _ = testing_cursor
-    cursor.execute(f"USE {DB_NAME}")
+    analytics.use_database(cursor, DB_NAME)
 
     # Periodicity: 1-day habits
     result_1 = analytics.get_habit_by_periodicity(cursor, 1)
@@ -247,7 +261,7 @@ def test_get_all_habits(testing_cursor):
     Tests the get_all_habits function to ensure it returns all habit names from the database.
     """
     cursor, _ = testing_cursor
-    cursor.execute(f"USE {DB_NAME}")
+    analytics.use_database(cursor, DB_NAME)
 
     habit_names = analytics.get_all_habits(cursor)
     expected_names = [habit.name for habit in SAMPLE_HABITS]
@@ -260,7 +274,7 @@ def test_get_longest_streak(testing_cursor):
     and a predefined mapping for expected longest streaks.
     """
     cursor, _ = testing_cursor
-    cursor.execute(f"USE {DB_NAME}")
+    analytics.use_database(cursor, DB_NAME)
 
     for habit in SAMPLE_HABITS:
         habit_id = analytics.get_habit_id(cursor, habit.name)
@@ -271,3 +285,444 @@ def test_get_longest_streak(testing_cursor):
         assert longest_streak == expected, (
             f"Longest streak for '{habit.name}' was {longest_streak}, expected {expected}"
         )
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_streaks_as_of_date(testing_cursor, use_index):
+    """
+    Tests that get_current_streak and get_longest_streak answer for past dates of the simulated month, from
+    the check-off history and from the check-off index, with the same results as the day-by-day simulation.
+    """
+    cursor, _ = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+    if use_index:
+        index = CheckOffIndex()
+        index.load(cursor, user_id=1)
+        analytics.use_check_off_index(index)
+
+    try:
+        for habit in SAMPLE_HABITS:
+            habit_id = analytics.get_habit_id(cursor, habit.name)
+            for as_of_date, expected_streaks in EXPECTED_CURRENT_STREAKS.items():
+                assert analytics.get_current_streak(cursor, habit_id, as_of_date=as_of_date) == expected_streaks[habit.name]
+            assert analytics.get_longest_streak(cursor, habit_id, as_of_date=datetime.date(2025, 4, 30)) == \
+                EXPECTED_LONGEST_STREAKS[habit.name]
+            assert analytics.get_longest_streak(cursor, habit_id, as_of_date=datetime.date(2025, 3, 31)) == 0
+
+            # Habits of other users are not answered
+            assert analytics.get_current_streak(cursor, habit_id, 2, datetime.date(2025, 4, 11)) == 0
+            assert analytics.get_longest_streak(cursor, habit_id, 2, datetime.date(2025, 4, 30)) is None
+    finally:
+        analytics.use_check_off_index(None)
+
+def test_refresh_all_streaks(testing_cursor):
+    """
+    Tests the refresh_all_streaks function on dates after the simulated month.
+
+    Asserts:
+        - On May 1, 2025 no streak is broken, because every habit was checked off on April 30, 2025.
+        - On May 3, 2025 only the daily habits Study(TEST) and Workout(TEST) are reset.
+        - Read(TEST) (periodicity 3) keeps its current streak on May 3, 2025.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    read_id = analytics.get_habit_id(cursor, SAMPLE_HABITS[3].name)
+    read_streak = analytics.get_current_streak(cursor, read_id)
+
+    assert analytics.refresh_all_streaks(cursor, datetime.date(2025, 5, 1)) == 0
+
+    assert analytics.refresh_all_streaks(cursor, datetime.date(2025, 5, 3)) == 2
+    connection.commit()
+
+    for habit in (SAMPLE_HABITS[0], SAMPLE_HABITS[2]):
+        habit_id = analytics.get_habit_id(cursor, habit.name)
+        assert analytics.get_current_streak(cursor, habit_id) == 0
+
+    assert analytics.get_current_streak(cursor, read_id) == read_streak
+
+def test_check_off_habits(testing_cursor):
+    """
+    Tests the bulk check_off_habits function after the streaks were refreshed on May 3, 2025.
+
+    Asserts:
+        - Repeated and already existing check-offs are skipped.
+        - Study(TEST) gets two new check-offs and a current streak of 2, while its longest streak stays 12.
+        - Read(TEST) gets one new check-off on top of its current streak of 1.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    study_id = analytics.get_habit_id(cursor, SAMPLE_HABITS[0].name)
+    read_id = analytics.get_habit_id(cursor, SAMPLE_HABITS[3].name)
+
+    results = analytics.check_off_habits(cursor, [
+        (study_id, datetime.date(2025, 5, 4)),
+        (study_id, datetime.date(2025, 5, 5)),
+        (study_id, datetime.date(2025, 5, 5)),
+        (study_id, datetime.date(2025, 4, 30)),
+        (read_id, datetime.date(2025, 5, 2)),
+    ], batch_size=2)
+    connection.commit()
+
+    assert results[study_id] == {"checked_off": 2, "skipped": 2, "current_streak": 2, "longest_streak": 12}
+    assert results[read_id] == {"checked_off": 1, "skipped": 0, "current_streak": 2, "longest_streak": 13}
+    assert analytics.is_habit_checked_off(cursor, study_id, datetime.date(2025, 5, 5))
+
+def test_rebuild_streaks(testing_cursor):
+    """
+    Tests the rebuild_streaks function by recomputing the streaks table from the check-off history
+    as of earlier dates.
+
+    Asserts:
+        - As of each date in EXPECTED_CURRENT_STREAKS, the rebuilt current streaks match the expected ones.
+        - As of April 30, 2025, the rebuilt longest streaks match EXPECTED_LONGEST_STREAKS.
+        - Rebuilding only one habit leaves the other habits untouched.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    habit_ids = {habit.name: analytics.get_habit_id(cursor, habit.name) for habit in SAMPLE_HABITS}
+
+    for as_of_date, expected_streaks in EXPECTED_CURRENT_STREAKS.items():
+        analytics.rebuild_streaks(cursor, as_of_date)
+        for habit_name, expected_streak in expected_streaks.items():
+            current_streak = analytics.get_current_streak(cursor, habit_ids[habit_name])
+            assert current_streak == expected_streak, (
+                f"As of {as_of_date}, habit '{habit_name}' has streak {current_streak}, expected {expected_streak}"
+            )
+
+    analytics.rebuild_streaks(cursor, datetime.date(2025, 4, 30))
+    for habit_name, expected_streak in EXPECTED_LONGEST_STREAKS.items():
+        assert analytics.get_longest_streak(cursor, habit_ids[habit_name]) == expected_streak
+
+    # Study(TEST) was checked off on April 29 and 30 and on May 4 and 5, 2025
+    study_id = habit_ids[SAMPLE_HABITS[0].name]
+    meditate_id = habit_ids[SAMPLE_HABITS[4].name]
+    meditate_streak = analytics.get_current_streak(cursor, meditate_id)
+    analytics.rebuild_streaks(cursor, datetime.date(2025, 5, 5), habit_ids=[study_id])
+    assert analytics.get_current_streak(cursor, study_id) == 2
+    assert analytics.get_current_streak(cursor, meditate_id) == meditate_streak
+
+    analytics.rebuild_streaks(cursor, datetime.date(2025, 5, 5))
+    connection.commit()
+
+def test_delete_habit_cascades(testing_cursor):
+    """
+    Tests that delete_habit removes a habit together with its check-off dates and streak.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    analytics.create_habit(cursor, Habit("Temporary(TEST)", 1, CREATION_DATE))
+    habit_id = analytics.get_habit_id(cursor, "Temporary(TEST)")
+    analytics.check_off_habit(cursor, habit_id, CREATION_DATE)
+    connection.commit()
+
+    assert analytics.delete_habit(cursor, habit_id)
+    connection.commit()
+
+    assert analytics.get_habit_id(cursor, "Temporary(TEST)") is None
+    cursor.execute("SELECT COUNT(*) FROM check_off_dates WHERE habit_id = %s", (habit_id,))
+    assert cursor.fetchone()[0] == 0
+    cursor.execute("SELECT COUNT(*) FROM streaks WHERE habit_id = %s", (habit_id,))
+    assert cursor.fetchone()[0] == 0
+    assert not analytics.delete_habit(cursor, habit_id)
+
+def test_habits_are_scoped_to_users(testing_cursor):
+    """
+    Tests that a second user can have a habit with the same name as a habit of the default user,
+    and that the analytics functions only see the habits of the user they are called for.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    other_user_id = 2
+    analytics.create_habit(cursor, Habit(SAMPLE_HABITS[0].name, 2, CREATION_DATE, user_id=other_user_id))
+    connection.commit()
+
+    default_study_id = analytics.get_habit_id(cursor, SAMPLE_HABITS[0].name)
+    other_study_id = analytics.get_habit_id(cursor, SAMPLE_HABITS[0].name, other_user_id)
+    assert other_study_id is not None
+    assert other_study_id != default_study_id
+
+    assert analytics.get_all_habits(cursor, other_user_id) == [SAMPLE_HABITS[0].name]
+    assert analytics.get_habit_by_periodicity(cursor, 2, other_user_id) == [SAMPLE_HABITS[0].name]
+    assert analytics.get_habit_by_periodicity(cursor, 2) == []
+
+    # A user cannot check off or read the habits of another user
+    analytics.check_off_habit(cursor, default_study_id, datetime.date(2025, 5, 6), other_user_id)
+    assert not analytics.is_habit_checked_off(cursor, default_study_id, datetime.date(2025, 5, 6))
+    assert analytics.get_longest_streak(cursor, default_study_id, other_user_id) is None
+
+    analytics.check_off_habit(cursor, other_study_id, datetime.date(2025, 5, 6), other_user_id)
+    assert analytics.is_habit_checked_off(cursor, other_study_id, datetime.date(2025, 5, 6), other_user_id)
+    assert analytics.get_current_streak(cursor, other_study_id, other_user_id) == 1
+
+    assert not analytics.delete_habit(cursor, other_study_id)
+    assert analytics.delete_habit(cursor, other_study_id, other_user_id)
+    connection.commit()
+
+def test_iter_habits_with_streaks(testing_cursor):
+    """
+    Tests that iter_habits_with_streaks lists every habit with the same streaks as the per-habit getters.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    habits = list(analytics.iter_habits_with_streaks(cursor, batch_size=2))
+    assert sorted(habit.name for habit in habits) == sorted(analytics.get_all_habits(cursor))
+    for habit in habits:
+        assert habit.current_streak == analytics.get_current_streak(cursor, habit.habit_id)
+        assert habit.longest_streak == analytics.get_longest_streak(cursor, habit.habit_id)
+
+    weekly = list(analytics.iter_habits_with_streaks(cursor, periodicity=7, order_by="longest_streak", descending=True))
+    assert [habit.name for habit in weekly] == [SAMPLE_HABITS[1].name, SAMPLE_HABITS[4].name]
+
+    with pytest.raises(ValueError):
+        next(analytics.iter_habits_with_streaks(cursor, order_by="habit_name; DROP TABLE habits"))
+
+def test_habit_names_are_unique_per_user(testing_cursor):
+    """
+    Tests that the database rejects a second habit with the same name (case-insensitively) for the same user,
+    and that create_habits creates many habits at once, skipping duplicates.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    study_id = analytics.get_habit_id(cursor, SAMPLE_HABITS[0].name)
+    assert analytics.create_habit(cursor, Habit(SAMPLE_HABITS[0].name.upper(), 1, CREATION_DATE)) is None
+    with pytest.raises(analytics.INTEGRITY_ERRORS):
+        Habit(SAMPLE_HABITS[0].name.lower(), 1, CREATION_DATE).save_to_db(cursor)
+    assert analytics.get_habit_id(cursor, SAMPLE_HABITS[0].name) == study_id
+
+    new_habits = [
+        Habit("Stretch(TEST)", 1, CREATION_DATE),
+        Habit(SAMPLE_HABITS[3].name, 3, CREATION_DATE),   # Read(TEST) already exists
+        Habit("STRETCH(TEST)", 2, CREATION_DATE),          # Duplicate within the batch
+        Habit("Journal(TEST)", 7, CREATION_DATE),
+    ]
+    habit_ids = analytics.create_habits(cursor, new_habits, batch_size=3)
+    connection.commit()
+
+    assert habit_ids[1] is None and habit_ids[2] is None
+    assert habit_ids[0] == analytics.get_habit_id(cursor, "Stretch(TEST)")
+    assert habit_ids[3] == analytics.get_habit_id(cursor, "Journal(TEST)")
+    assert analytics.get_current_streak(cursor, habit_ids[3]) == 0
+    assert analytics.get_longest_streak(cursor, habit_ids[3]) == 0
+
+    for habit_id in (habit_ids[0], habit_ids[3]):
+        assert analytics.delete_habit(cursor, habit_id)
+    connection.commit()
+
+def test_check_off_habit_is_idempotent(testing_cursor):
+    """
+    Tests that check_off_habit reports whether the check-off was new and counts a repeated check-off only once.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    habit_id = analytics.create_habit(cursor, Habit("Floss(TEST)", 1, CREATION_DATE))
+    assert analytics.check_off_habit(cursor, habit_id, CREATION_DATE)
+    assert not analytics.check_off_habit(cursor, habit_id, CREATION_DATE)
+    assert analytics.check_off_habit(cursor, habit_id, CREATION_DATE + datetime.timedelta(days=1))
+    assert not analytics.check_off_habit(cursor, habit_id, CREATION_DATE, user_id=2)
+
+    assert analytics.get_current_streak(cursor, habit_id) == 2
+    assert analytics.get_longest_streak(cursor, habit_id) == 2
+
+    assert analytics.delete_habit(cursor, habit_id)
+    connection.commit()
+
+def test_backdate_check_off(testing_cursor):
+    """
+    Tests that backdate_check_off updates the streaks exactly as a full rebuild_streaks would, for check-offs
+    that extend, join or stand apart from the existing runs.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    habit_id = analytics.create_habit(cursor, Habit("Backdated(TEST)", 1, CREATION_DATE))
+    for day in (1, 2, 3, 5, 6, 8):
+        analytics.check_off_habit(cursor, habit_id, datetime.date(2025, 4, day))
+    analytics.rebuild_streaks(cursor, datetime.date(2025, 4, 8), habit_ids=[habit_id])
+
+    # (check-off day, today) pairs: joins 6 and 8, joins everything, stands apart, after the streak expired
+    for day, today in ((7, 8), (4, 8), (20, 22), (10, 22)):
+        assert analytics.backdate_check_off(cursor, habit_id, datetime.date(2025, 4, day),
+                                            datetime.date(2025, 4, today), page_size=2)
+        current_streak = analytics.get_current_streak(cursor, habit_id)
+        longest_streak = analytics.get_longest_streak(cursor, habit_id)
+
+        analytics.rebuild_streaks(cursor, datetime.date(2025, 4, today), habit_ids=[habit_id])
+        assert current_streak == analytics.get_current_streak(cursor, habit_id)
+        assert longest_streak == analytics.get_longest_streak(cursor, habit_id)
+
+    assert analytics.get_longest_streak(cursor, habit_id) == 8
+    assert not analytics.backdate_check_off(cursor, habit_id, datetime.date(2025, 4, 4), datetime.date(2025, 4, 22))
+    with pytest.raises(ValueError):
+        analytics.backdate_check_off(cursor, habit_id, datetime.date(2025, 4, 23), datetime.date(2025, 4, 22))
+
+    assert analytics.delete_habit(cursor, habit_id)
+    connection.commit()
+
+def test_completion_rollups(testing_cursor):
+    """
+    Tests that check-offs keep the weekly and monthly completion rollups up to date, that refresh_rollups adds
+    periods without check-offs, and that backfill_rollups rebuilds the same rollups from the history.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    # Created on Tuesday, April 1, 2025 and due every other day
+    habit_id = analytics.create_habit(cursor, Habit("Rollup(TEST)", 2, CREATION_DATE))
+    analytics.check_off_habit(cursor, habit_id, datetime.date(2025, 4, 1))
+    analytics.check_off_habit(cursor, habit_id, datetime.date(2025, 4, 3))
+    analytics.check_off_habit(cursor, habit_id, datetime.date(2025, 4, 8))
+    analytics.backdate_check_off(cursor, habit_id, datetime.date(2025, 4, 5), datetime.date(2025, 4, 8))
+    analytics.check_off_habits(cursor, [(habit_id, datetime.date(2025, 4, 10))])
+
+    def rates(end_day, period="week"):
+        return analytics.get_completion_rates(cursor, CREATION_DATE, datetime.date(2025, 4, end_day), period,
+                                              habit_ids=[habit_id])[habit_id]
+
+    # 3 of 3 check-offs due from Tuesday to Sunday of the first week, 2 of 4 in the second week
+    assert rates(13) == {"completed": 5, "expected": 7, "rate": 5 / 7}
+    assert rates(30, "month") == {"completed": 5, "expected": 15, "rate": 1 / 3}
+
+    assert analytics.refresh_rollups(cursor, datetime.date(2025, 4, 20)) > 0
+    assert rates(20)["expected"] == 11
+
+    analytics.backfill_rollups(cursor, datetime.date(2025, 4, 20))
+    assert rates(20) == {"completed": 5, "expected": 11, "rate": 5 / 11}
+    assert rates(30, "month")["completed"] == 5
+
+    assert analytics.delete_habit(cursor, habit_id)
+    assert analytics.get_completion_rates(cursor, CREATION_DATE, datetime.date(2025, 4, 30), habit_ids=[habit_id]) == {}
+    connection.commit()
+
+def test_update_streaks_window(testing_cursor):
+    """
+    Tests that update_streaks keeps a streak while a check-off lies in the last 'periodicity' days up to and
+    including the given date, and ignores check-offs after that date.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+
+    habit_id = analytics.create_habit(cursor, Habit("Window(TEST)", 3, CREATION_DATE))
+    analytics.check_off_habit(cursor, habit_id, datetime.date(2025, 4, 1))
+
+    analytics.update_streaks(cursor, habit_id, datetime.date(2025, 4, 4))
+    assert analytics.get_current_streak(cursor, habit_id) == 1
+    analytics.update_streaks(cursor, habit_id, datetime.date(2025, 4, 5))
+    assert analytics.get_current_streak(cursor, habit_id) == 0
+
+    analytics.check_off_habit(cursor, habit_id, datetime.date(2025, 4, 10))
+    analytics.update_streaks(cursor, habit_id, datetime.date(2025, 4, 7))
+    assert analytics.get_current_streak(cursor, habit_id) == 0
+
+    assert analytics.delete_habit(cursor, habit_id)
+    connection.commit()
+
+def test_catalog_lookups_check_the_owner(testing_cursor):
+    """
+    Tests that with the habit catalog enabled, update_streaks and backdate_check_off leave a habit of another
+    user alone instead of failing.
+    """
+    cursor, connection = testing_cursor
+    analytics.use_database(cursor, DB_NAME)
+    analytics.use_habit_catalog(HabitCatalog())
+    try:
+        habit_id = analytics.create_habit(cursor, Habit("Owner(TEST)", 1, CREATION_DATE))
+        analytics.check_off_habit(cursor, habit_id, datetime.date(2025, 4, 1))
+
+        other_user_id = 2
+        analytics.update_streaks(cursor, habit_id, datetime.date(2025, 4, 10), other_user_id)
+        assert not analytics.backdate_check_off(cursor, habit_id, datetime.date(2025, 4, 2),
+                                                datetime.date(2025, 4, 10), other_user_id)
+        assert analytics.get_current_streak(cursor, habit_id) == 1
+        assert not analytics.is_habit_checked_off(cursor, habit_id, datetime.date(2025, 4, 2))
+
+        assert analytics.delete_habit(cursor, habit_id)
+        connection.commit()
+    finally:
+        analytics.use_habit_catalog(None)
+
+def test_check_off_habits_counts_only_its_inserts(mocker):
+    """
+    Tests that check_off_habits does not fail when another session inserts one of its pairs between reading
+    the existing pairs and inserting the new ones, and only counts the check-offs it inserted.
+    """
+    connection = sqlite_backend.connect(":memory:")
+    cursor = connection.cursor()
+    analytics.create_database(cursor, ":memory:")
+    habit_id = analytics.create_habit(cursor, Habit("Study", 1, CREATION_DATE))
+
+    executemany = cursor.executemany
+    def insert_concurrently(operation, seq_params):
+        if "check_off_dates" in operation:
+            cursor.execute("INSERT INTO check_off_dates (user_id, habit_id, check_off_date) VALUES (%s, %s, %s)",
+                           (1, habit_id, datetime.date(2025, 4, 1)))
+        return executemany(operation, seq_params)
+    mocker.patch.object(cursor, "executemany", side_effect=insert_concurrently)
+
+    results = analytics.check_off_habits(cursor, [(habit_id, datetime.date(2025, 4, day)) for day in (1, 2, 3)])
+
+    assert results[habit_id]["checked_off"] == 2
+    assert results[habit_id]["skipped"] == 1
+    assert results[habit_id]["current_streak"] == 2
+    cursor.execute("SELECT COUNT(*) FROM check_off_dates WHERE habit_id = %s", (habit_id,))
+    assert cursor.fetchone()[0] == 3
+    connection.close()
+
+def test_upgrade_merges_repeated_check_offs(capsys):
+    """
+    Tests that upgrade_database merges repeated check-offs of a habit on the same date before it adds the
+    unique (habit_id, check_off_date) index to a database created without it, and rebuilds the inflated streaks.
+    """
+    connection = sqlite_backend.connect(":memory:")
+    cursor = connection.cursor()
+    analytics.create_database(cursor, ":memory:")
+    habit_id = analytics.create_habit(cursor, Habit("Study", 1, CREATION_DATE))
+    today = datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+
+    cursor.execute("DROP INDEX uq_check_off_habit_date")
+    cursor.executemany("INSERT INTO check_off_dates (user_id, habit_id, check_off_date) VALUES (%s, %s, %s)",
+                       [(1, habit_id, yesterday), (1, habit_id, yesterday), (1, habit_id, yesterday), (1, habit_id, today)])
+    cursor.execute("UPDATE streaks SET current_streak = 4, longest_streak = 4 WHERE habit_id = %s", (habit_id,))
+
+    analytics.upgrade_database(cursor)
+
+    assert "Removed 2 repeated check-off(s) of 1 habit(s)" in capsys.readouterr().out
+    assert analytics.index_exists(cursor, "check_off_dates", "uq_check_off_habit_date")
+    cursor.execute("SELECT check_off_date FROM check_off_dates WHERE habit_id = %s ORDER BY check_off_date", (habit_id,))
+    assert [row[0] for row in cursor.fetchall()] == [yesterday, today]
+    assert analytics.get_current_streak(cursor, habit_id) == 2
+    assert analytics.get_longest_streak(cursor, habit_id) == 2
+    with pytest.raises(analytics.INTEGRITY_ERRORS):
+        cursor.execute("INSERT INTO check_off_dates (user_id, habit_id, check_off_date) VALUES (%s, %s, %s)",
+                       (1, habit_id, today))
+    connection.close()
+
+def test_upgrade_backfills_missing_streak_expiries():
+    """
+    Tests that upgrade_database gives current streaks without an expiry date (e.g. after an interrupted
+    backfill) the expiry of their latest check-off, and resets those without check-offs, so that
+    refresh_all_streaks sees every current streak.
+    """
+    connection = sqlite_backend.connect(":memory:")
+    cursor = connection.cursor()
+    analytics.create_database(cursor, ":memory:")
+    read_id = analytics.create_habit(cursor, Habit("Read", 3, CREATION_DATE))
+    sleep_id = analytics.create_habit(cursor, Habit("Sleep", 1, CREATION_DATE))
+    analytics.check_off_habit(cursor, read_id, datetime.date(2025, 4, 1))
+    analytics.check_off_habit(cursor, read_id, datetime.date(2025, 4, 2))
+    cursor.execute("UPDATE streaks SET current_streak = 2, streak_expires_on = NULL")
+
+    analytics.upgrade_database(cursor)
+
+    cursor.execute("SELECT habit_id, current_streak, streak_expires_on FROM streaks ORDER BY habit_id")
+    assert cursor.fetchall() == [(read_id, 2, datetime.date(2025, 4, 6)), (sleep_id, 0, None)]
+    assert analytics.refresh_all_streaks(cursor, datetime.date(2025, 4, 6)) == 1
+    assert analytics.get_current_streak(cursor, read_id) == 0
+    connection.close()
@@ -0,0 +1,89 @@
+import json
+import pytest
+import analytics
+import batch_cli
+
+@pytest.fixture
+def dsn(tmp_path):
+    """
+    The DSN of an SQLite database file; the habit catalog main() enables is disabled again afterwards.
+    """
+    yield f"sqlite:///{tmp_path / 'habits.db'}"
+    analytics.use_habit_catalog(None)
+
+def records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+def test_single_commands(dsn, capsys):
+    options = ["--dsn", dsn, "--today", "2025-04-10"]
+    assert batch_cli.main(options + ["create-habit", "Read", "1", "--created", "2025-04-01"]) == 0
+    assert batch_cli.main(options + ["check-off", "Read"]) == 0
+    assert batch_cli.main(options + ["check-off", "Read", "--date", "2025-04-09"]) == 0
+    assert batch_cli.main(options + ["get-current-streak", "Read"]) == 0
+    assert batch_cli.main(options + ["get-current-streak", "Sleep"]) == 1
+    assert batch_cli.main(options + ["get-current-streak", "Read", "--date", "2025-04-09"]) == 0
+    assert batch_cli.main(options + ["get-longest-streak", "Read", "--date", "2025-04-08"]) == 0
+
+    created, checked_off, backdated, streak, missing, past_streak, past_longest = records(capsys)
+    assert created["ok"] and created["result"]["name"] == "Read"
+    assert checked_off["result"]["date"] == "2025-04-10" and checked_off["result"]["new"]
+    assert backdated["result"]["date"] == "2025-04-09"
+    assert streak["result"]["current_streak"] == 2
+    assert missing == {"command": "get-current-streak", "ok": False, "error": "Habit 'Sleep' does not exist."}
+    assert past_streak["result"]["current_streak"] == 1
+    assert past_longest["result"]["longest_streak"] == 0
+
+def test_script(dsn, tmp_path, capsys):
+    script = tmp_path / "script.txt"
+    script.write_text("""
+        # Check-offs in any date order; the streaks are rebuilt before they are read
+        create-habit "Water the Plants" 3 --created 2025-04-01
+        check-off "Water the Plants" --date 2025-04-07
+        check-off "Water the Plants" --date 2025-04-01
+        check-off "Water the Plants" --date 2025-04-04
+        check-off "Water the Plants" --date 2025-04-04
+        check-off Sleep
+        list-habits-with-streaks
+        no-such-command
+    """)
+
+    assert batch_cli.main(["--dsn", dsn, "--today", "2025-04-08", "--commit-every", "2", "run", str(script)]) == 1
+
+    output = records(capsys)
+    assert [record["line"] for record in output] == [3, 4, 5, 6, 7, 8, 9, 10]
+    assert [record["ok"] for record in output] == [True] * 5 + [False, True, False]
+    assert output[4]["result"]["new"] is False
+    assert output[6]["result"] == [{"habit_id": 1, "name": "Water the Plants", "periodicity": 3,
+                                    "current_streak": 3, "longest_streak": 3}]
+
+def test_script_stops_and_rolls_back_on_error(dsn, capsys, monkeypatch):
+    batch_cli.main(["--dsn", dsn, "--today", "2025-04-08", "create-habit", "Read", "1"])
+
+    monkeypatch.setattr("sys.stdin", iter(["check-off Read\n", "check-off Sleep\n", "check-off Read --date 2025-04-07\n"]))
+    assert batch_cli.main(["--dsn", dsn, "--today", "2025-04-08", "--commit-every", "0", "run", "--stop-on-error", "-"]) == 1
+    assert batch_cli.main(["--dsn", dsn, "--today", "2025-04-08", "get-current-streak", "Read"]) == 0
+
+    output = records(capsys)
+    assert [record["command"] for record in output] == ["create-habit", "check-off", "check-off", "get-current-streak"]
+    assert output[-1]["result"]["current_streak"] == 0
+
+def test_bad_script_lines_are_error_records(dsn, tmp_path, capsys):
+    script = tmp_path / "script.txt"
+    script.write_text('create-habit Read 1\ncheck-off "Read\nlist-habits -h\nlist-habits\n')
+
+    assert batch_cli.main(["--dsn", dsn, "--today", "2025-04-08", "run", str(script)]) == 1
+
+    output = records(capsys)
+    assert [record["ok"] for record in output] == [True, False, False, True]
+    assert output[1]["command"] == "check-off" and "quotation" in output[1]["error"]
+    assert output[3]["result"] == ["Read"]
+
+def test_export_to_a_file_is_an_error_record(dsn, tmp_path, capsys):
+    target = tmp_path / "export"
+    target.write_text("not a directory")
+
+    assert batch_cli.main(["--dsn", dsn, "export-data", str(target)]) == 1
+
+    failed, = records(capsys)
+    assert failed["ok"] is False
+    assert failed["error"].startswith("Export failed:")
@@ -0,0 +1,35 @@
+import datetime
+import benchmark
+
+END_DATE = datetime.date(2025, 4, 30)
+
+def test_generate_history_is_reproducible():
+    history = benchmark.generate_history(20, 0.5, END_DATE, density=0.5, seed=7)
+    again = benchmark.generate_history(20, 0.5, END_DATE, density=0.5, seed=7)
+
+    assert [(habit.name, habit.periodicity, dates) for habit, dates in history] == \
+           [(habit.name, habit.periodicity, dates) for habit, dates in again]
+    for habit, dates in history:
+        assert dates == sorted(set(dates))
+        assert all(habit.date_created <= check_date <= END_DATE for check_date in dates)
+
+def test_run_benchmarks_reports_every_operation():
+    results = benchmark.run_benchmarks("sqlite:///:memory:", [10], years=0.1, calls=5, density=0.8, seed=0,
+                                       today=END_DATE)
+
+    operations = results["scales"]["10"]
+    assert set(operations) == {"create_habit", "check_off_habit", "update_streaks", "startup_refresh",
+                               "list_habits", "list_habits_with_streaks"}
+    assert operations["list_habits_with_streaks"]["queries_per_call"] == 1
+    assert operations["check_off_habit"]["calls"] == 5
+
+def test_compare_flags_slower_latencies_and_more_queries():
+    baseline = {"scales": {"10": {"check_off_habit": {"p50_ms": 1.0, "p99_ms": 2.0, "queries_per_call": 3}}}}
+    results = {"scales": {"10": {"check_off_habit": {"p50_ms": 1.1, "p99_ms": 3.0, "queries_per_call": 4}}}}
+
+    regressions = benchmark.compare(baseline, results, threshold=0.25)
+
+    assert len(regressions) == 2
+    assert "p99_ms" in regressions[0]
+    assert "queries_per_call" in regressions[1]
+    assert benchmark.compare(baseline, baseline) == []
@@ -0,0 +1,88 @@
+import datetime
+import pytest
+import analytics
+import sqlite_backend
+from habit_class import Habit
+from streak_index import CheckOffIndex
+
+np = pytest.importorskip("numpy")
+bulk_analytics = pytest.importorskip("bulk_analytics")
+
+CREATION_DATE = datetime.date(2025, 4, 1)
+
+CHECKOFFS = {
+    "Study": (1, [d for d in range(1, 31) if d not in [4, 12, 15, 28]]),
+    "Water the Plants": (7, [1, 6, 11, 18, 25, 30]),
+    "Read": (3, [1, 5, 6, 7, 9, 12, 14, 16, 17, 19, 20, 22, 23, 25, 30]),
+    "Meditate": (7, []),
+}
+
+@pytest.fixture(scope="module")
+def cursor():
+    """
+    Creates an in-memory SQLite database with sample habits and check-offs.
+    """
+    connection = sqlite_backend.connect(":memory:")
+    cursor = connection.cursor()
+    analytics.create_database(cursor, ":memory:")
+    for name, (periodicity, days) in CHECKOFFS.items():
+        habit_id = analytics.create_habit(cursor, Habit(name, periodicity, CREATION_DATE))
+        analytics.check_off_habits(cursor, [(habit_id, datetime.date(2025, 4, day)) for day in days])
+    connection.commit()
+    yield cursor
+    cursor.close()
+    connection.close()
+
+def test_habit_streaks_match_the_index(cursor):
+    history = bulk_analytics.load_history(cursor, batch_size=7)
+    index = CheckOffIndex()
+    index.load(cursor)
+
+    for day in range(1, 32):
+        as_of_date = datetime.date(2025, 4, 1) + datetime.timedelta(days=day - 1)
+        streaks = bulk_analytics.habit_streaks(history, as_of_date)
+        for record in streaks:
+            habit_id = int(record["habit_id"])
+            assert record["current_streak"] == index.current_streak(habit_id, as_of_date)
+            assert record["longest_streak"] == index.longest_streak(habit_id, as_of_date)
+
+def test_streak_length_distribution(cursor):
+    history = bulk_analytics.load_history(cursor)
+    runs = bulk_analytics.streak_runs(history)
+
+    assert runs["length"].sum() == sum(len(days) for _, days in CHECKOFFS.values())
+    distribution = bulk_analytics.streak_length_distribution(history, periodicity=1)
+    # Study: April 1-3, 5-11, 13-14, 16-27 and 29-30
+    assert distribution.tolist() == [(2, 2), (3, 1), (7, 1), (12, 1)]
+
+def test_habits_at_risk(cursor):
+    history = bulk_analytics.load_history(cursor)
+
+    # Read (every 3 days) was last checked off on April 30 and Water the Plants (every 7 days) on April 30
+    assert bulk_analytics.habits_at_risk(history, datetime.date(2025, 5, 3))["periodicity"].tolist() == [3]
+    at_risk = bulk_analytics.habits_at_risk(history, datetime.date(2025, 5, 7))
+    assert at_risk["periodicity"].tolist() == [7]
+    assert at_risk["last_check_off"][0] == np.datetime64("2025-04-30")
+
+def test_rolling_completion_rates(cursor):
+    history = bulk_analytics.load_history(cursor)
+    days, rates = bulk_analytics.rolling_completion_rates(history, datetime.date(2025, 4, 1),
+                                                          datetime.date(2025, 4, 30), window_days=7)
+
+    assert len(days) == 30 and rates.shape == (4, 30)
+    study = list(CHECKOFFS).index("Study")
+    # April 1-7 without April 4: 6 of 7 daily check-offs
+    assert rates[study, 6] == pytest.approx(6 / 7)
+    # Meditate was never checked off
+    assert np.all(rates[list(CHECKOFFS).index("Meditate")] == 0)
+
+def test_weekday_heatmap(cursor):
+    history = bulk_analytics.load_history(cursor)
+    heatmap = bulk_analytics.weekday_heatmap(history)
+
+    assert heatmap.shape == (4, 7)
+    water = list(CHECKOFFS).index("Water the Plants")
+    expected = [0] * 7
+    for day in CHECKOFFS["Water the Plants"][1]:
+        expected[datetime.date(2025, 4, day).weekday()] += 1
+    assert heatmap[water].tolist() == expected
@@ -0,0 +1,80 @@
+import datetime
+import pytest
+import analytics
+import data_transfer
+from habit_class import Habit
+from sqlite_backend import SQLiteDatabase
+
+CREATION_DATE = datetime.date(2025, 4, 1)
+AS_OF_DATE = datetime.date(2025, 4, 10)
+
+@pytest.fixture
+def source_database():
+    """
+    Creates an in-memory SQLite database with two habits and their check-offs.
+    """
+    database = SQLiteDatabase(":memory:")
+    with database.session() as cursor:
+        analytics.create_habit(cursor, Habit("Study", 1, CREATION_DATE))
+        analytics.create_habit(cursor, Habit("Water the Plants", 7, CREATION_DATE))
+        study_id = analytics.get_habit_id(cursor, "Study")
+        plants_id = analytics.get_habit_id(cursor, "Water the Plants")
+        pairs = [(study_id, CREATION_DATE + datetime.timedelta(days=day)) for day in (0, 1, 2, 5, 6, 7, 8, 9)]
+        pairs += [(plants_id, CREATION_DATE), (plants_id, datetime.date(2025, 4, 8))]
+        analytics.check_off_habits(cursor, pairs)
+        analytics.rebuild_streaks(cursor, AS_OF_DATE)
+    yield database
+    database.close()
+
+@pytest.mark.parametrize("file_format", data_transfer.FORMATS)
+def test_export_and_import_round_trip(source_database, tmp_path, file_format):
+    with source_database.session() as cursor:
+        counts = data_transfer.export_data(cursor, str(tmp_path), file_format, batch_size=3)
+    assert counts == {"habits": 2, "check_off_dates": 10, "streaks": 2}
+
+    target_database = SQLiteDatabase(":memory:")
+    counts = data_transfer.import_data(target_database, str(tmp_path), file_format, as_of_date=AS_OF_DATE, chunk_size=4)
+    assert counts["habits"] == 2
+    assert counts["check_off_dates"] == 10
+
+    with source_database.session() as cursor:
+        expected = [habit[1:] for habit in analytics.iter_habits_with_streaks(cursor)]
+    with target_database.session() as cursor:
+        assert [habit[1:] for habit in analytics.iter_habits_with_streaks(cursor)] == expected
+    target_database.close()
+
+def test_import_merges_into_existing_habits(source_database, tmp_path):
+    with source_database.session() as cursor:
+        data_transfer.export_data(cursor, str(tmp_path))
+
+    counts = data_transfer.import_data(source_database, str(tmp_path), as_of_date=AS_OF_DATE)
+
+    assert counts == {"habits": 0, "check_off_dates": 0, "streaks": 0}
+    with source_database.session() as cursor:
+        assert len(analytics.get_all_habits(cursor)) == 2
+
+def test_unsupported_format_is_rejected(source_database, tmp_path):
+    with source_database.session() as cursor:
+        with pytest.raises(ValueError):
+            data_transfer.export_data(cursor, str(tmp_path), "xml")
+
+@pytest.mark.parametrize("file_format", data_transfer.FORMATS)
+def test_malformed_import_writes_nothing(source_database, tmp_path, file_format):
+    with source_database.session() as cursor:
+        data_transfer.export_data(cursor, str(tmp_path), file_format)
+    path = tmp_path / f"check_off_dates.{file_format}"
+    bad_row = "1,2025-04-31\n" if file_format == "csv" else '{"habit_id": 1, "check_off_date": "2025-04-31"}\n'
+    path.write_text(path.read_text() + bad_row)
+
+    target_database = SQLiteDatabase(":memory:")
+    with pytest.raises(ValueError, match="Row 11 .* invalid check_off_date"):
+        data_transfer.import_data(target_database, str(tmp_path), file_format, as_of_date=AS_OF_DATE)
+    with target_database.session() as cursor:
+        assert analytics.get_all_habits(cursor) == []
+
+    path = tmp_path / f"habits.{file_format}"
+    bad_row = "3,Read,abc,2025-04-01\n" if file_format == "csv" else '{"id": 3, "habit_name": "Read", "periodicity": "abc"}\n'
+    path.write_text(path.read_text() + bad_row)
+    with pytest.raises(ValueError, match="invalid periodicity: 'abc'"):
+        data_transfer.import_data(target_database, str(tmp_path), file_format, as_of_date=AS_OF_DATE)
+    target_database.close()
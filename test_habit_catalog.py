@@ -0,0 +1,99 @@
+import pytest
+from datetime import date
+from habit_catalog import HabitCatalog
+
+CREATION_DATE = date(2025, 4, 1)
+
+HABIT_ROWS = [
+    (1, 1, "Study", 1, CREATION_DATE),
+    (2, 1, "Water the Plants", 7, CREATION_DATE),
+    (3, 1, "Read", 3, CREATION_DATE),
+]
+
+def test_load_fills_catalog_with_one_query(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.fetchall.return_value = HABIT_ROWS
+
+    catalog = HabitCatalog()
+    loaded = catalog.load(mock_cursor)
+
+    assert loaded == 3
+    assert len(catalog) == 3
+    mock_cursor.execute.assert_called_once()
+
+def test_lookups_hit_catalog_case_insensitively(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.fetchall.return_value = HABIT_ROWS
+    catalog = HabitCatalog()
+    catalog.load(mock_cursor)
+    mock_cursor.reset_mock()
+
+    assert catalog.get_habit_id(mock_cursor, "READ") == 3
+    assert catalog.get_habit(mock_cursor, 2) == ("Water the Plants", 7, CREATION_DATE)
+    assert catalog.get_habit(mock_cursor, 2, user_id=1) == ("Water the Plants", 7, CREATION_DATE)
+    assert catalog.get_habit(mock_cursor, 2, user_id=2) is None
+
+    mock_cursor.execute.assert_not_called()
+    assert catalog.hits == 4
+    assert catalog.misses == 0
+
+def test_miss_falls_back_to_database_and_is_cached(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.fetchone.return_value = (4, 1, "Meditate", 7, CREATION_DATE)
+    catalog = HabitCatalog()
+
+    assert catalog.get_habit_id(mock_cursor, "Meditate") == 4
+    assert catalog.get_habit_id(mock_cursor, "meditate") == 4
+
+    mock_cursor.execute.assert_called_once()
+    assert catalog.hits == 1
+    assert catalog.misses == 1
+
+def test_unknown_habit_is_not_cached(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.fetchone.return_value = None
+    catalog = HabitCatalog()
+
+    assert catalog.get_habit_id(mock_cursor, "Unknown") is None
+    assert catalog.get_habit(mock_cursor, 99) is None
+    assert len(catalog) == 0
+
+def test_names_are_scoped_to_users(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.fetchone.return_value = None
+    catalog = HabitCatalog()
+    catalog.add(3, 1, "Read", 3, CREATION_DATE)
+    catalog.add(7, 2, "Read", 1, CREATION_DATE)
+
+    assert catalog.get_habit_id(mock_cursor, "Read", user_id=1) == 3
+    assert catalog.get_habit_id(mock_cursor, "Read", user_id=2) == 7
+    assert catalog.get_habit_id(mock_cursor, "Read", user_id=3) is None
+
+def test_least_recently_used_habit_is_evicted(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.fetchone.return_value = None
+    catalog = HabitCatalog(max_size=2)
+
+    catalog.add(*HABIT_ROWS[0])
+    catalog.add(*HABIT_ROWS[1])
+    catalog.get_habit_id(mock_cursor, "Study")  # Study is now the most recently used
+    catalog.add(*HABIT_ROWS[2])
+
+    assert len(catalog) == 2
+    assert catalog.get_habit_id(mock_cursor, "Study") == 1
+    assert catalog.get_habit_id(mock_cursor, "Water the Plants") is None
+
+def test_remove_invalidates_habit(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.fetchone.return_value = None
+    catalog = HabitCatalog()
+    catalog.add(*HABIT_ROWS[2])
+
+    catalog.remove(3)
+
+    assert catalog.get_habit_id(mock_cursor, "Read") is None
+    mock_cursor.execute.assert_called_once()
+
+def test_max_size_must_be_positive():
+    with pytest.raises(ValueError):
+        HabitCatalog(max_size=0)
@@ -12,17 +12,24 @@ def test_habit_initialization():
     assert habit.name == name
     assert habit.periodicity == periodicity
     assert habit.date_created == creation_date
+    assert habit.user_id == 1
 
 def test_save_to_db_executes_correct_query(mocker):
-    habit = Habit("Read", 3, date(2025, 6, 14))
+    habit = Habit("Read", 3, date(2025, 6, 14), user_id=2)
     mock_cursor = mocker.Mock()
 
     habit.save_to_db(mock_cursor)
 
     expected_query = """
-            INSERT INTO habits (habit_name, periodicity, date_created)
-            VALUES (%s, %s, %s)
+            INSERT INTO habits (user_id, habit_name, periodicity, date_created)
+            VALUES (%s, %s, %s, %s)
         """
-    expected_params = ("Read", 3, date(2025, 6, 14))
+    expected_params = (2, "Read", 3, date(2025, 6, 14))
 
     mock_cursor.execute.assert_called_once_with(expected_query, expected_params)
+
+def test_save_to_db_returns_new_id(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.lastrowid = 42
+
+    assert Habit("Read", 3, date(2025, 6, 14)).save_to_db(mock_cursor) == 42
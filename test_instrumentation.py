@@ -0,0 +1,56 @@
+import datetime
+import analytics
+from habit_class import Habit
+from instrumentation import InstrumentedCursor, QueryStats, StartupTimer, statement_shape
+from sqlite_backend import SQLiteDatabase
+
+def test_statement_shape_folds_lists():
+    two_ids = "SELECT id FROM habits WHERE user_id = %s AND id IN (%s, %s)"
+    many_ids = "SELECT id FROM habits\n    WHERE user_id = %s AND id IN (" + ", ".join(["%s"] * 200) + ")"
+    assert statement_shape(two_ids) == statement_shape(many_ids)
+
+    rows = "SELECT 1 FROM t WHERE (a, b) IN (VALUES (%s, %s), (%s, %s), (%s, %s))"
+    assert statement_shape(rows) == "SELECT 1 FROM t WHERE (a, b) IN (VALUES (%s, ...), ...)"
+
+def test_cursor_records_callers_statements_and_rows(mocker):
+    cursor = mocker.Mock()
+    cursor.fetchall.return_value = [("Study",), ("Read",)]
+    stats = QueryStats()
+
+    habits = analytics.get_all_habits(InstrumentedCursor(cursor, stats))
+
+    assert habits == ["Study", "Read"]
+    assert stats.round_trips == 1
+    entry = stats.to_dict()["by_caller"]["analytics.get_all_habits"]
+    assert entry["round_trips"] == 1
+    assert entry["rows"] == 2
+    assert sum(entry["histogram"].values()) == 1
+
+def test_database_sessions_are_instrumented():
+    database = SQLiteDatabase(":memory:")
+    database.query_stats = QueryStats()
+
+    with database.session() as cursor:
+        assert analytics.dialect(cursor) == "sqlite"
+        analytics.create_habit(cursor, Habit("Study", 1, datetime.date(2025, 4, 1)))
+    database.run(analytics.get_all_habits)
+
+    stats = database.query_stats.to_dict()
+    assert stats["by_caller"]["analytics.get_all_habits"]["rows"] == 1
+    assert "habit_class.save_to_db" in stats["by_caller"]
+    assert "analytics.get_all_habits" in database.query_stats.report()
+
+    database.query_stats.reset()
+    assert database.query_stats.round_trips == 0
+    database.close()
+
+def test_startup_timer_reports_phases():
+    timer = StartupTimer()
+    with timer.phase("open database"):
+        pass
+    timer.record("load habit catalog", timer.started)
+
+    lines = timer.report().splitlines()
+    assert len(lines) == 3
+    assert lines[1].endswith("load habit catalog")
+    assert lines[2].endswith("open database")
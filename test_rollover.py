@@ -0,0 +1,94 @@
+import datetime
+import time
+import pytest
+import analytics
+from habit_class import Habit
+from rollover import RolloverScheduler
+from sqlite_backend import SQLiteDatabase
+
+CREATION_DATE = datetime.date(2025, 4, 1)
+TODAY = datetime.date(2025, 4, 10)
+
+@pytest.fixture
+def database():
+    """
+    Creates an in-memory SQLite database with a daily habit (id 1) and a habit with a periodicity of 3
+    (id 2), both checked off from April 1 to 9, 2025.
+    """
+    database = SQLiteDatabase(":memory:")
+    with database.session() as cursor:
+        analytics.create_habit(cursor, Habit("Study", 1, CREATION_DATE))
+        analytics.create_habit(cursor, Habit("Read", 3, CREATION_DATE))
+        for day in range(9):
+            check_date = CREATION_DATE + datetime.timedelta(days=day)
+            analytics.check_off_habits(cursor, [(1, check_date), (2, check_date)])
+    yield database
+    database.close()
+
+def streaks(database):
+    with database.session() as cursor:
+        cursor.execute("SELECT habit_id, current_streak, streak_expires_on FROM streaks ORDER BY habit_id")
+        return cursor.fetchall()
+
+def test_check_offs_keep_the_expiry_date(database):
+    assert streaks(database) == [(1, 9, datetime.date(2025, 4, 11)), (2, 9, datetime.date(2025, 4, 13))]
+
+    with database.session() as cursor:
+        analytics.check_off_habit(cursor, 1, TODAY)
+        analytics.backdate_check_off(cursor, 2, datetime.date(2025, 4, 11), datetime.date(2025, 4, 11))
+
+        # rebuild_streaks computes the same counters and expiry dates from the history
+        assert analytics.rebuild_streaks(cursor, datetime.date(2025, 4, 11)) == 0
+
+    assert streaks(database) == [(1, 10, datetime.date(2025, 4, 12)), (2, 10, datetime.date(2025, 4, 15))]
+
+def test_check_off_reads_the_schedule_in_its_statements(database):
+    executions = database.statement_counts.to_dict()["executions"]
+    with database.session() as cursor:
+        # The check-off, the rollup upsert and the streak update, without looking up the habit first
+        assert analytics.check_off_habit(cursor, 2, TODAY)
+    assert database.statement_counts.to_dict()["executions"] - executions == 3
+
+    assert streaks(database)[1] == (2, 10, datetime.date(2025, 4, 14))
+    with database.session() as cursor:
+        cursor.execute("SELECT period, expected_count, completed_count FROM completion_rollups "
+                       "WHERE habit_id = 2 AND period_start = %s", (datetime.date(2025, 4, 7),))
+        assert cursor.fetchall() == [("week", 3, 4)]
+
+def test_roll_over_resets_only_expired_streaks(database):
+    new_dates = []
+    scheduler = RolloverScheduler(database, TODAY, on_rollover=new_dates.append)
+
+    assert scheduler.roll_over(datetime.date(2025, 4, 11)) == 1
+    assert streaks(database) == [(1, 0, None), (2, 9, datetime.date(2025, 4, 13))]
+    assert scheduler.roll_over(datetime.date(2025, 4, 12)) == 0
+    assert scheduler.roll_over(datetime.date(2025, 4, 14)) == 1  # April 13 was slept through
+
+    assert streaks(database) == [(1, 0, None), (2, 0, None)]
+    assert scheduler.expired_count == 2
+    assert scheduler.todays_date == datetime.date(2025, 4, 14)
+    assert new_dates == [datetime.date(2025, 4, 11), datetime.date(2025, 4, 12), datetime.date(2025, 4, 14)]
+
+    with database.session() as cursor:
+        # April 14 starts a week, so its rollup rows exist
+        cursor.execute("SELECT COUNT(*) FROM completion_rollups WHERE period = 'week' AND period_start = %s",
+                       (datetime.date(2025, 4, 14),))
+        assert cursor.fetchone()[0] == 2
+
+def test_background_rollover_at_midnight(database):
+    now = [datetime.datetime(2025, 4, 10, 23, 59, 59)]
+    scheduler = RolloverScheduler(database, TODAY, clock=lambda: now[0], poll_interval=0.01).start()
+    try:
+        time.sleep(0.05)
+        assert scheduler.todays_date == TODAY
+
+        now[0] = datetime.datetime(2025, 4, 11, 0, 0, 1)
+        deadline = time.monotonic() + 5
+        while scheduler.todays_date == TODAY and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+
+    assert scheduler.todays_date == datetime.date(2025, 4, 11)
+    assert scheduler.error is None
+    assert streaks(database)[0] == (1, 0, None)
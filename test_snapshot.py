@@ -0,0 +1,103 @@
+import datetime
+import pytest
+import analytics
+import sqlite_backend
+import snapshot
+from habit_class import Habit
+from streak_index import CheckOffIndex
+
+CREATION_DATE = datetime.date(2025, 4, 1)
+
+CHECKOFFS = {
+    "Study": [d for d in range(1, 31) if d not in [4, 12, 15, 28]],
+    "Water the Plants": [1, 6, 11, 18, 25, 30],
+    "Read": [1, 5, 6, 7, 9, 12, 14, 16, 17, 19, 20, 22, 23, 25, 30],
+}
+PERIODICITIES = {"Study": 1, "Water the Plants": 7, "Read": 3}
+
+@pytest.fixture
+def cursor():
+    """
+    Creates an in-memory SQLite database with sample habits and check-offs.
+    """
+    connection = sqlite_backend.connect(":memory:")
+    cursor = connection.cursor()
+    analytics.create_database(cursor, ":memory:")
+    for name, days in CHECKOFFS.items():
+        analytics.create_habit(cursor, Habit(name, PERIODICITIES[name], CREATION_DATE))
+        habit_id = analytics.get_habit_id(cursor, name)
+        analytics.check_off_habits(cursor, [(habit_id, datetime.date(2025, 4, day)) for day in days])
+    connection.commit()
+    yield cursor
+    cursor.close()
+    connection.close()
+
+def test_snapshot_answers_like_the_index(cursor, tmp_path):
+    path = str(tmp_path / "habits.snapshot")
+    assert snapshot.write_snapshot(cursor, path, batch_size=7) == sum(len(days) for days in CHECKOFFS.values())
+
+    index = CheckOffIndex()
+    index.load(cursor)
+
+    with snapshot.Snapshot(path) as habits:
+        assert habits.watermark == datetime.date(2025, 4, 30)
+        assert sorted(habits.get_all_habits()) == sorted(CHECKOFFS)
+        assert habits.get_habit_by_periodicity(7) == ["Water the Plants"]
+
+        for name in CHECKOFFS:
+            habit_id = habits.get_habit_id(name.upper())
+            assert habits.get_habit(habit_id) == (name, PERIODICITIES[name], CREATION_DATE)
+            for day in range(1, 32):
+                as_of_date = datetime.date(2025, 4, 1) + datetime.timedelta(days=day - 1)
+                assert habits.is_habit_checked_off(habit_id, as_of_date) == index.is_checked_off(habit_id, as_of_date)
+                assert habits.get_current_streak(habit_id, as_of_date) == index.current_streak(habit_id, as_of_date)
+                assert habits.get_longest_streak(habit_id, as_of_date) == index.longest_streak(habit_id, as_of_date)
+
+        assert habits.get_habit_id("Unknown") is None
+        assert habits.get_current_streak(999, CREATION_DATE) is None
+        assert not habits.is_habit_checked_off(999, CREATION_DATE)
+
+def test_refresh_reads_new_check_offs_and_habits(cursor, tmp_path):
+    path = str(tmp_path / "habits.snapshot")
+    snapshot.write_snapshot(cursor, path)
+
+    study_id = analytics.get_habit_id(cursor, "Study")
+    analytics.check_off_habits(cursor, [(study_id, datetime.date(2025, 5, 1)), (study_id, datetime.date(2025, 5, 2))])
+    analytics.create_habit(cursor, Habit("Meditate", 7, CREATION_DATE))
+    meditate_id = analytics.get_habit_id(cursor, "Meditate")
+    analytics.check_off_habit(cursor, meditate_id, datetime.date(2025, 5, 2))
+
+    assert snapshot.refresh_snapshot(cursor, path) == sum(len(days) for days in CHECKOFFS.values()) + 3
+
+    with snapshot.Snapshot(path) as habits:
+        assert habits.watermark == datetime.date(2025, 5, 2)
+        assert habits.get_current_streak(study_id, datetime.date(2025, 5, 2)) == 4
+        assert habits.get_current_streak(meditate_id, datetime.date(2025, 5, 2)) == 1
+
+def test_refresh_reads_backdated_check_offs(cursor, tmp_path):
+    path = str(tmp_path / "habits.snapshot")
+    snapshot.write_snapshot(cursor, path)
+
+    study_id = analytics.get_habit_id(cursor, "Study")
+    analytics.backdate_check_off(cursor, study_id, datetime.date(2025, 4, 4), datetime.date(2025, 4, 30))
+    meditate_id = analytics.create_habit(cursor, Habit("Meditate", 7, CREATION_DATE))
+    analytics.backdate_check_off(cursor, meditate_id, datetime.date(2025, 4, 10), datetime.date(2025, 4, 30))
+
+    assert snapshot.refresh_snapshot(cursor, path) == sum(len(days) for days in CHECKOFFS.values()) + 2
+
+    index = CheckOffIndex()
+    index.load(cursor)
+    with snapshot.Snapshot(path) as habits:
+        assert habits.watermark == datetime.date(2025, 4, 30)
+        assert habits.is_habit_checked_off(study_id, datetime.date(2025, 4, 4))
+        assert habits.is_habit_checked_off(meditate_id, datetime.date(2025, 4, 10))
+        for habit_id in (study_id, meditate_id):
+            as_of_date = datetime.date(2025, 4, 30)
+            assert habits.get_longest_streak(habit_id, as_of_date) == index.longest_streak(habit_id, as_of_date)
+
+def test_invalid_file_is_rejected(tmp_path):
+    path = tmp_path / "habits.snapshot"
+    path.write_bytes(b"not a snapshot" * 4)
+
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(str(path))
@@ -0,0 +1,79 @@
+import pytest
+from datetime import date
+from streak_index import CheckOffIndex, build_run_arrays
+
+# Check-off days in April 2025 of the Read habit (periodicity 3) from test_analytics.py
+READ_DAYS = [1, 5, 6, 7, 9, 12, 14, 16, 17, 19, 20, 22, 23, 25, 30]
+READ_DATES = [date(2025, 4, day) for day in READ_DAYS]
+
+def test_build_run_arrays():
+    run_starts, longest_upto = build_run_arrays([1, 2, 3, 6, 7, 20], 1)
+
+    assert list(run_starts) == [0, 0, 0, 3, 3, 5]
+    assert list(longest_upto) == [1, 2, 3, 3, 3, 3]
+
+@pytest.mark.parametrize("as_of_date, expected_current, expected_longest", [
+    (date(2025, 3, 31), 0, 0),
+    (date(2025, 4, 1), 1, 1),
+    (date(2025, 4, 5), 1, 1),
+    (date(2025, 4, 11), 4, 4),
+    (date(2025, 4, 16), 7, 7),
+    (date(2025, 4, 26), 13, 13),
+    (date(2025, 4, 29), 0, 13),
+    (date(2025, 4, 30), 1, 13),
+])
+def test_streaks_as_of_date(as_of_date, expected_current, expected_longest):
+    index = CheckOffIndex()
+    index.add_habit(4, 3, READ_DATES)
+
+    assert index.current_streak(4, as_of_date) == expected_current
+    assert index.longest_streak(4, as_of_date) == expected_longest
+
+def test_add_check_off_in_order_matches_full_build():
+    incremental = CheckOffIndex()
+    incremental.add_habit(4, 3)
+    for check_date in READ_DATES:
+        assert incremental.add_check_off(4, check_date)
+
+    full = CheckOffIndex()
+    full.add_habit(4, 3, READ_DATES)
+
+    for day in range(1, 31):
+        as_of_date = date(2025, 4, day)
+        assert incremental.current_streak(4, as_of_date) == full.current_streak(4, as_of_date)
+        assert incremental.longest_streak(4, as_of_date) == full.longest_streak(4, as_of_date)
+
+def test_add_check_off_out_of_order_and_duplicate():
+    index = CheckOffIndex()
+    index.add_habit(4, 3, READ_DATES)
+
+    # April 28 joins the runs ending on April 25 and starting on April 30
+    assert index.add_check_off(4, date(2025, 4, 28))
+    assert not index.add_check_off(4, date(2025, 4, 28))
+
+    assert index.is_checked_off(4, date(2025, 4, 28))
+    assert index.current_streak(4, date(2025, 4, 30)) == 15
+    assert index.longest_streak(4, date(2025, 4, 30)) == 15
+
+def test_unknown_habit():
+    index = CheckOffIndex()
+
+    assert not index.add_check_off(1, date(2025, 4, 1))
+    assert not index.is_checked_off(1, date(2025, 4, 1))
+    assert index.current_streak(1, date(2025, 4, 1)) is None
+    assert index.longest_streak(1, date(2025, 4, 1)) is None
+
+def test_load_from_database(mocker):
+    mock_cursor = mocker.Mock()
+    mock_cursor.fetchall.return_value = [(4, 1, 3), (5, 2, 7)]
+    mock_cursor.fetchmany.side_effect = [[(4, check_date) for check_date in READ_DATES], []]
+
+    index = CheckOffIndex()
+
+    assert index.load(mock_cursor) == len(READ_DATES)
+    assert len(index) == 2
+    assert index.current_streak(4, date(2025, 4, 26)) == 13
+    assert index.current_streak(5, date(2025, 4, 26)) == 0
+    assert index.current_streak(4, date(2025, 4, 26), user_id=1) == 13
+    assert index.current_streak(4, date(2025, 4, 26), user_id=2) is None
+    assert index.longest_streak(5, date(2025, 4, 26), user_id=1) is None
@@ -0,0 +1,67 @@
+import datetime
+import pytest
+import analytics
+from habit_class import Habit
+from instrumentation import StartupTimer
+from sqlite_backend import SQLiteDatabase
+from streak_refresh import StreakRefresher
+
+CREATION_DATE = datetime.date(2025, 4, 1)
+TODAY = datetime.date(2025, 4, 20)
+
+@pytest.fixture
+def database():
+    """
+    Creates an in-memory SQLite database with five daily habits, all with a current streak of 3 that is
+    broken by TODAY except for the last habit, which was checked off the day before.
+    """
+    database = SQLiteDatabase(":memory:")
+    with database.session() as cursor:
+        for number in range(5):
+            habit_id = analytics.create_habit(cursor, Habit(f"Habit {number}", 1, CREATION_DATE))
+            last_day = TODAY - datetime.timedelta(days=1 if number == 4 else 5)
+            analytics.check_off_habits(cursor, [(habit_id, last_day - datetime.timedelta(days=day)) for day in range(3)])
+            analytics.rebuild_streaks(cursor, last_day, habit_ids=[habit_id])
+    yield database
+    database.close()
+
+def current_streaks(database):
+    with database.session() as cursor:
+        cursor.execute("SELECT habit_id, current_streak FROM streaks ORDER BY habit_id")
+        return dict(cursor.fetchall())
+
+def test_refresh_in_background(database):
+    timer = StartupTimer()
+    refresher = StreakRefresher(database, TODAY, batch_size=2, timer=timer).start()
+
+    assert refresher.join(timeout=10)
+    assert refresher.error is None
+    assert refresher.reset_count == 4
+    assert list(current_streaks(database).values()) == [0, 0, 0, 0, 3]
+    assert "refresh streaks and rollups [streak-refresh]" in timer.report()
+    with database.session() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM completion_rollups WHERE period_start >= %s", (datetime.date(2025, 4, 14),))
+        assert cursor.fetchone()[0] == 5  # The rows of the current week; April 1 starts the month
+
+def test_wait_for_refreshes_only_that_habit(database):
+    refresher = StreakRefresher(database, TODAY)  # Not started, so the command has to refresh the habit itself
+    habit_ids = sorted(current_streaks(database))
+
+    with database.session() as cursor:
+        refresher.wait_for(cursor, habit_ids[0])
+        assert analytics.get_current_streak(cursor, habit_ids[0]) == 0
+        assert analytics.get_current_streak(cursor, habit_ids[1]) == 3
+    assert not refresher.finished
+
+    with database.session() as cursor:
+        refresher.wait_all(cursor)
+    assert refresher.finished
+    assert refresher.reset_count == 4
+
+def test_refresh_all_streaks_of_some_habits(database):
+    habit_ids = sorted(current_streaks(database))
+
+    with database.session() as cursor:
+        assert analytics.refresh_all_streaks(cursor, TODAY, habit_ids=habit_ids[:2]) == 2
+        assert analytics.refresh_all_streaks(cursor, TODAY, habit_ids=[]) == 0
+    assert list(current_streaks(database).values()) == [0, 0, 3, 3, 3]
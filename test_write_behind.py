@@ -0,0 +1,77 @@
+import datetime
+import time
+import pytest
+import analytics
+from habit_class import Habit
+from sqlite_backend import SQLiteDatabase
+from write_behind import CheckOffBuffer, read_journal
+
+TODAY = datetime.date(2025, 4, 10)
+
+@pytest.fixture
+def database():
+    """
+    Creates an in-memory SQLite database with two daily habits.
+    """
+    database = SQLiteDatabase(":memory:")
+    with database.session() as cursor:
+        analytics.create_habit(cursor, Habit("Study", 1, datetime.date(2025, 4, 1)))
+        analytics.create_habit(cursor, Habit("Read", 1, datetime.date(2025, 4, 1)))
+    yield database
+    analytics.use_check_off_buffer(None)
+    database.close()
+
+def test_check_offs_are_pending_until_flushed(database, tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    buffer = CheckOffBuffer(database, journal_path, max_pending=100, max_delay=60)
+    analytics.use_check_off_buffer(buffer)
+
+    assert buffer.check_off(1, TODAY)
+    assert not buffer.check_off(1, TODAY)
+    assert buffer.check_off(2, TODAY)
+    assert len(read_journal(journal_path)) == 2
+
+    with database.session() as cursor:
+        assert analytics.is_habit_checked_off(cursor, 1, TODAY)
+        assert analytics.get_current_streak(cursor, 1) == 0
+
+    assert buffer.flush() == 2
+    with database.session() as cursor:
+        assert analytics.get_current_streak(cursor, 1) == 1
+        assert analytics.get_current_streak(cursor, 2) == 1
+    assert read_journal(journal_path) == []
+    assert len(buffer) == 0
+    buffer.close()
+
+def test_background_flush_on_size_and_time(database, tmp_path):
+    with CheckOffBuffer(database, str(tmp_path / "journal.jsonl"), max_pending=2, max_delay=0.05) as buffer:
+        buffer.check_off(1, TODAY)
+        buffer.check_off(2, TODAY)  # Reaches max_pending
+        buffer.check_off(1, TODAY + datetime.timedelta(days=1))  # Due after max_delay
+
+        deadline = time.monotonic() + 5
+        while len(buffer) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(buffer) == 0
+        assert buffer.flushes >= 2
+
+    with database.session() as cursor:
+        assert analytics.get_current_streak(cursor, 1) == 2
+
+def test_journal_is_replayed_after_a_crash(database, tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    crashed = CheckOffBuffer(database, journal_path)
+    crashed.check_off(1, TODAY - datetime.timedelta(days=1))
+    crashed.check_off(1, TODAY)
+    crashed.check_off(2, TODAY - datetime.timedelta(days=3))
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        journal.write('{"user_id": 1, "habit_id"')  # A line cut short by the crash
+
+    buffer = CheckOffBuffer(database, journal_path, todays_date=TODAY)
+    assert buffer.replayed == 3
+    assert read_journal(journal_path) == []
+    with database.session() as cursor:
+        assert analytics.get_current_streak(cursor, 1) == 2
+        assert analytics.get_current_streak(cursor, 2) == 0  # Broken on TODAY
+        assert analytics.get_longest_streak(cursor, 2) == 1
+    buffer.close()
@@ -1,188 +1,525 @@
+import time
+
+# Taken before the other imports, so the STARTUP TIMES report includes importing the application modules
+_import_started = time.perf_counter()
+
 import datetime
-import mysql.connector
-from habit_class import Habit
+import os
+import sys
+from habit_class import Habit, DEFAULT_USER_ID
+from habit_catalog import HabitCatalog
+from database import open_database
 import analytics
-
-# Global variable for today's date
+import batch_cli
+import data_transfer
+from instrumentation import QueryStats, StartupTimer
+from rollover import RolloverScheduler
+from streak_index import CheckOffIndex
+from streak_refresh import StreakRefresher
+from write_behind import CheckOffBuffer
+
+# Durations of the startup phases, printed by the STARTUP TIMES command
+startup_timer = StartupTimer(_import_started)
+startup_timer.record("import modules", _import_started)
+
+# Global variable for today's date, moved forward at midnight by the rollover scheduler
 todays_date = None
 
+# The user (tenant) whose habits this session manages, set with the HABITS_USER_ID environment variable
+user_id = int(os.environ.get("HABITS_USER_ID", DEFAULT_USER_ID))
+
+# Statistics of the statements run in this session, printed by the STATS command. Set HABITS_QUERY_STATS=off
+# to turn them off, and HABITS_QUERY_STATS_FILE to a path to write them there as JSON at exit.
+query_stats = None
+
+# Executions and prepares of every statement, from the database; also printed by the STATS command
+statement_counts = None
+
+# Refreshes the streaks for today in the background after startup; commands that read or update streaks wait for it
+streak_refresher = None
+
+# Write-behind queue for check-offs, enabled by setting HABITS_WRITE_BEHIND_JOURNAL to the path of its journal file
+check_off_buffer = None
 
-def main():
+# Expires the streaks and advances todays_date at midnight while the application is running
+rollover_scheduler = None
+
+
+def read_arguments(command: str):
     """
-    Main entry point for the Habits application.
+    Prompts for the input of a command before its database session is opened, so no session (and with
+    SQLite, no database lock) is held while the user is typing.
+
+    Args:
+        command (str): The lower-case command typed by the user.
+
+    Returns:
+        dict | None: The arguments of the command by name, or None if an answer was invalid (the reason has
+        been printed).
+    """
+    match command:
+
+        case "create habit":
+            name = input("Enter habit name: ").strip()
+            while True:
+                try:
+                    periodicity = int(
+                        input("Enter periodicity in days (e.g. 1 for daily, 7 for weekly): ").strip())
+                    return {"name": name, "periodicity": periodicity}
+                except ValueError:
+                    print("Please enter a valid integer for periodicity.")
+
+        case "check off":
+            return {"habit_name": input("Enter habit name to check off: ").strip()}
+
+        case "check off past date":
+            habit_name = input("Enter habit name to check off: ").strip()
+            try:
+                check_date = datetime.date.fromisoformat(input("Enter the date (YYYY-MM-DD): ").strip())
+            except ValueError:
+                print("Please enter a valid date.")
+                return None
+            if check_date > todays_date:
+                print(f"You cannot check off a habit for a date after {todays_date}.")
+                return None
+            return {"habit_name": habit_name, "check_date": check_date}
+
+        case "delete habit":
+            return {"habit_name": input("Enter habit name to delete: ").strip()}
+
+        case "list habits by periodicity":
+            try:
+                return {"period": int(input("Enter periodicity in days to filter habits: ").strip())}
+            except ValueError:
+                print("Please enter a valid integer.")
+                return None
+
+        case "get longest streak" | "get current streak":
+            habit_name = input("Enter habit name: ").strip()
+            as_of_date = input("Enter a past date (YYYY-MM-DD), or nothing for today: ").strip()
+            if not as_of_date:
+                return {"habit_name": habit_name, "as_of_date": None}
+            try:
+                as_of_date = datetime.date.fromisoformat(as_of_date)
+            except ValueError:
+                print("Please enter a valid date.")
+                return None
+            if as_of_date > todays_date:
+                print(f"Please enter a date no later than {todays_date}.")
+                return None
+            return {"habit_name": habit_name, "as_of_date": as_of_date}
+
+        case "get completion rate":
+            habit_name = input("Enter habit name: ").strip()
+            try:
+                start_date = datetime.date.fromisoformat(input("Enter the start date (YYYY-MM-DD): ").strip())
+                end_date = datetime.date.fromisoformat(input("Enter the end date (YYYY-MM-DD): ").strip())
+            except ValueError:
+                print("Please enter a valid date.")
+                return None
+            period = input("Sum weekly or monthly completion rates (week or month): ").strip().lower()
+            if period not in analytics.ROLLUP_PERIODS:
+                period = "week"
+            return {"habit_name": habit_name, "start_date": start_date, "end_date": end_date, "period": period}
+
+        case "export data":
+            directory = input("Enter the directory to export to: ").strip()
+            return {"directory": directory, "file_format": input_file_format()}
+
+        case _:
+            return {}
+
+
+def execute_command(cursor, command: str, arguments: dict):
+    """
+    Executes one command of the interactive command-line interface.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The cursor of the session the command runs in.
+        command (str): The lower-case command typed by the user.
+        arguments (dict): The arguments of the command, see read_arguments.
+
+    Returns:
+        None
+    """
+    match command:
+
+        case "info":
+            print(f"""
+                Available commands:
+                - CREATE HABIT                     : Create a new habit
+                - CHECK OFF                        : Mark a habit as completed for today
+                - CHECK OFF PAST DATE              : Mark a habit as completed for an earlier date
+                - DELETE HABIT                     : Delete a habit and its check-off history
+                - LIST HABITS                      : List all habit names
+                - LIST HABITS BY PERIODICITY       : List habits filtered by periodicity (in days)
+                - LIST HABITS WITH LONGEST STREAK  : List habits and their longest streak
+                - LIST HABITS WITH CURRENT STREAK  : List habits and their current streak
+                - GET LONGEST STREAK               : Get the longest streak for a specific habit, now or up to a past date
+                - GET CURRENT STREAK               : Get the current streak for a specific habit, now or on a past date
+                - GET COMPLETION RATE              : Get the completion rate of a habit between two dates
+                - BACKFILL ROLLUPS                 : Recompute the completion rates from the check-off history
+                - EXPORT DATA                      : Export habits and check-offs to CSV or JSON Lines files
+                - IMPORT DATA                      : Import habits and check-offs from exported files
+                - STATS                            : Show the database statements run in this session
+                - STARTUP TIMES                    : Show how long the phases of the startup took
+                - INFO                             : Show this information
+                - EXIT                             : Exit the program
+
+                Today's date: {todays_date}
+            """)
+
+        case "create habit":
+            new_habit = Habit(name=arguments["name"], periodicity=arguments["periodicity"],
+                              date_created=todays_date, user_id=user_id)
+            analytics.create_habit(cursor, new_habit)
+
+        case "check off":
+            habit_name = arguments["habit_name"]
+            habit_id = analytics.get_habit_id(cursor, habit_name, user_id)
+
+            if habit_id is None:
+                print(f"Habit '{habit_name.upper()}' does not exist.")
+                return
+
+            wait_for_streaks(cursor, habit_id)
+            if check_off_buffer is None:
+                checked_off = analytics.check_off_habit(cursor, habit_id, todays_date, user_id)
+            else:
+                checked_off = (not analytics.is_habit_checked_off(cursor, habit_id, todays_date, user_id)
+                               and check_off_buffer.check_off(habit_id, todays_date, user_id))
+
+            if checked_off:
+                print(f"Habit '{habit_name.upper()}' checked off for {todays_date}.")
+            else:
+                print(f"Habit '{habit_name.upper()}' is already checked off for {todays_date}.")
+
+        case "check off past date":
+            habit_name, check_date = arguments["habit_name"], arguments["check_date"]
+            habit_id = analytics.get_habit_id(cursor, habit_name, user_id)
+
+            if habit_id is None:
+                print(f"Habit '{habit_name.upper()}' does not exist.")
+                return
+
+            wait_for_streaks(cursor, habit_id)
+            if analytics.backdate_check_off(cursor, habit_id, check_date, todays_date, user_id):
+                print(f"Habit '{habit_name.upper()}' checked off for {check_date}.")
+            else:
+                print(f"Habit '{habit_name.upper()}' is already checked off for {check_date}.")
+
+        case "delete habit":
+            habit_name = arguments["habit_name"]
+            habit_id = analytics.get_habit_id(cursor, habit_name, user_id)
+
+            if habit_id is None:
+                print(f"Habit '{habit_name.upper()}' does not exist.")
+            else:
+                analytics.delete_habit(cursor, habit_id, user_id)
+                print(f"Habit '{habit_name.upper()}' was deleted.")
+
+        case "list habits":
+            habits = analytics.get_all_habits(cursor, user_id)
+            print("All habits:")
+            for habit_name in habits:
+                print(f"- {habit_name.upper()}")
+
+        case "list habits by periodicity":
+            period = arguments["period"]
+            habit_names = analytics.get_habit_by_periodicity(cursor, period, user_id)
+
+            if habit_names:
+                print(f"Habits with periodicity {period} days:")
+                for name in habit_names:
+                    print(f"- {name.upper()}")
+            else:
+                print(f"No habits found with periodicity {period} days.")
+
+        case "get longest streak":
+            habit_name = arguments["habit_name"]
+            habit_id = analytics.get_habit_id(cursor, habit_name, user_id)
+
+            if habit_id is None:
+                print(f"Habit '{habit_name.upper()}' does not exist.")
+            else:
+                as_of_date = arguments["as_of_date"]
+                if as_of_date is None:
+                    wait_for_streaks(cursor, habit_id)
+                    longest_streak = analytics.get_longest_streak(cursor, habit_id, user_id)
+                    print(f"The longest streak for habit '{habit_name.upper()}' is: {longest_streak}")
+                else:
+                    longest_streak = analytics.get_longest_streak(cursor, habit_id, user_id, as_of_date)
+                    print(f"The longest streak for habit '{habit_name.upper()}' up to {as_of_date} was: {longest_streak}")
+
+        case "get current streak":
+            habit_name = arguments["habit_name"]
+            habit_id = analytics.get_habit_id(cursor, habit_name, user_id)
+
+            if habit_id is None:
+                print(f"Habit '{habit_name.upper()}' does not exist.")
+            else:
+                as_of_date = arguments["as_of_date"]
+                if as_of_date is None:
+                    wait_for_streaks(cursor, habit_id)
+                    current_streak = analytics.get_current_streak(cursor, habit_id, user_id)
+                    print(f"The current streak for habit '{habit_name.upper()}' is: {current_streak} on {todays_date}")
+                else:
+                    current_streak = analytics.get_current_streak(cursor, habit_id, user_id, as_of_date)
+                    print(f"The current streak for habit '{habit_name.upper()}' was: {current_streak} on {as_of_date}")
+
+        case "get completion rate":
+            habit_name = arguments["habit_name"]
+            start_date, end_date, period = arguments["start_date"], arguments["end_date"], arguments["period"]
+            habit_id = analytics.get_habit_id(cursor, habit_name, user_id)
+
+            if habit_id is None:
+                print(f"Habit '{habit_name.upper()}' does not exist.")
+                return
+
+            wait_for_streaks(cursor, habit_id)
+            rates = analytics.get_completion_rates(cursor, start_date, end_date, period, [habit_id], user_id)
+            if habit_id in rates:
+                rate = rates[habit_id]
+                print(f"The completion rate for habit '{habit_name.upper()}' from {start_date} to {end_date} is: "
+                      f"{rate['rate']:.0%} ({rate['completed']} of {rate['expected']} check-offs)")
+            else:
+                print(f"Habit '{habit_name.upper()}' has no completion rates between {start_date} and {end_date}.")
+
+        case "backfill rollups":
+            rows = analytics.backfill_rollups(cursor, todays_date, user_id)
+            print(f"Completion rates recomputed: {rows} weekly and monthly rollup(s) written.")
+
+        case "list habits with longest streak":
+            wait_for_streaks(cursor)
+            print("Habits and their longest streaks:")
+            for habit in analytics.iter_habits_with_streaks(cursor, user_id):
+                print(f"- {habit.name.upper()}: Longest streak = {habit.longest_streak}")
+
+        case "list habits with current streak":
+            wait_for_streaks(cursor)
+            print(f"Habits and their current streaks on {todays_date}:")
+            for habit in analytics.iter_habits_with_streaks(cursor, user_id):
+                print(f"- {habit.name.upper()}: Current streak = {habit.current_streak}")
+
+        case "export data":
+            directory, file_format = arguments["directory"], arguments["file_format"]
+            wait_for_streaks(cursor)
+            try:
+                counts = data_transfer.export_data(cursor, directory, file_format, user_id)
+            except OSError as err:
+                print("Export failed:", err)
+                return
+            print(f"Exported {counts['habits']} habit(s) and {counts['check_off_dates']} check-off(s) to '{directory}'.")
+
+        case "stats":
+            if query_stats is None:
+                print("Query statistics are turned off.")
+            else:
+                print(query_stats.report())
+                print()
+                print(statement_counts.report())
+
+        case "startup times":
+            print(startup_timer.report())
+            if streak_refresher is not None:
+                if streak_refresher.error is not None:
+                    print("The background streak refresh failed:", streak_refresher.error)
+                elif not streak_refresher.finished:
+                    print("The streak refresh is still running in the background.")
+                else:
+                    print(f"Streaks refreshed for {streak_refresher.todays_date}: "
+                          f"{streak_refresher.reset_count} broken streak(s) reset.")
+
+        case _:
+            print("Invalid command. Write INFO for available commands.")
+
+
+def wait_for_streaks(cursor, habit_id: int = None):
+    """
+    Makes sure the background streak refresh has refreshed a habit, or every habit, before a command reads
+    or updates its streaks or completion rates.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursor): The cursor of the session the command runs in.
+        habit_id (int | None): The habit the command works on, or None if it works on every habit.
+
+    Returns:
+        None
+    """
+    if streak_refresher is None:
+        return
+    if habit_id is None:
+        streak_refresher.wait_all(cursor)
+    else:
+        streak_refresher.wait_for(cursor, habit_id)
+
+
+def input_file_format():
+    """
+    Prompts for one of the file formats supported by the data_transfer module.
+
+    Returns:
+        str: The file format.
+    """
+    while True:
+        file_format = input(f"Enter file format ({' or '.join(data_transfer.FORMATS)}): ").strip().lower()
+        if file_format in data_transfer.FORMATS:
+            return file_format
+        print("Please enter a supported file format.")
+
+
+def import_data(database):
+    """
+    Runs the IMPORT DATA command. Unlike the other commands it is not run in one session, because the
+    import commits in chunks.
 
-    Establishes a connection to the MySQL server, ensures the habits database
-    exists (creating it if necessary), and then launches an interactive command-line
-    interface for managing habits.
+    Args:
+        database (database.Database | sqlite_backend.SQLiteDatabase): The habits database.
 
-    Raises:
-        mysql.connector.Error: If any database query or connection error occurs.
+    Returns:
+        None
     """
+    directory = input("Enter the directory to import from: ").strip()
+    file_format = input_file_format()
+    try:
+        counts = data_transfer.import_data(database, directory, file_format, user_id, todays_date)
+    except (OSError, ValueError) as err:
+        print("Import failed:", err)
+        return
+    print(f"Imported {counts['habits']} new habit(s) and {counts['check_off_dates']} new check-off(s) from '{directory}'.")
 
+
+def set_todays_date(new_date: datetime.date):
+    """
+    Makes new_date the date the following commands use as today; called by the rollover scheduler at midnight.
+
+    Args:
+        new_date (datetime.date): The new date.
+
+    Returns:
+        None
+    """
     global todays_date
+    todays_date = new_date
 
-    print("Welcome to Habits!!!")
 
-    connection = None
-    cursor = None
-    db_name = "habits_database"
+def shut_down():
+    """
+    Stops the background work of the session, writes the pending check-offs and, if HABITS_QUERY_STATS_FILE
+    is set, the query statistics.
+
+    Returns:
+        None
+    """
+    rollover_scheduler.stop()
+    if check_off_buffer is not None:
+        try:
+            check_off_buffer.close()
+        except analytics.DATABASE_ERRORS as err:
+            print("Pending check-offs could not be written, they stay in the journal:", err)
+    stats_file = os.environ.get("HABITS_QUERY_STATS_FILE")
+    if query_stats is not None and stats_file:
+        query_stats.dump(stats_file)
+
+def main(argv=None):
+    """
+    Main entry point for the Habits application.
+
+    With command-line arguments (e.g. `check-off Read` or `run script.txt`) the commands run without the
+    prompt, see batch_cli.main.
+
+    Opens the habits database named by $HABITS_DATABASE_URL (a MySQL connection pool by default, or an
+    embedded SQLite file), creating it if necessary, and then launches an interactive command-line
+    interface for managing habits. Every command runs in its own database session, so a failed command
+    or a dropped connection does not end the application. The streaks are refreshed for today on a
+    background thread while the prompt is already shown, and expired again at every midnight the session
+    stays open.
+    """
+
+    global todays_date, query_stats, statement_counts, streak_refresher, check_off_buffer, rollover_scheduler
+
+    if argv:
+        return batch_cli.main(argv)
+
+    print("Welcome to Habits!!!")
 
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="MYpassword"
-        )
-        cursor = connection.cursor()
-
-        if analytics.check_database_exists(cursor, db_name):
-            cursor.execute(f"USE {db_name}")
-            print("Database located successfully.")
-
-        else:
-            print("Database not found. Creating database...")
-            analytics.create_database(cursor, db_name)
-            connection.commit()
-            cursor.execute(f"USE {db_name}")
-            print("Database created successfully.")
-
-        print("Write INFO for information on how to use the application.")
-
-        todays_date = datetime.date.today()
-
-        # Update the streaks table for all habits for today to set the current_streak for all habits
-        habit_names = analytics.get_all_habits(cursor)
-        for habit_name in habit_names:
-            habit_id = analytics.get_habit_id(cursor, habit_name)
-            analytics.update_streaks(cursor, habit_id, todays_date)
-        connection.commit()
+        with startup_timer.phase("open database"):
+            database = open_database()
+    except analytics.DATABASE_ERRORS as err:
+        print("Database connection failed:", err)
+        return
 
-        while True:
-            command = input("> ").strip().lower()
-
-            match command:
-
-                case "info":
-                    print(f"""
-                        Available commands:
-                        - CREATE HABIT                     : Create a new habit
-                        - CHECK OFF                        : Mark a habit as completed for today
-                        - LIST HABITS                      : List all habit names
-                        - LIST HABITS BY PERIODICITY       : List habits filtered by periodicity (in days)
-                        - LIST HABITS WITH LONGEST STREAK  : List habits and their longest streak
-                        - LIST HABITS WITH CURRENT STREAK  : List habits and their current streak
-                        - GET LONGEST STREAK               : Get the longest streak for a specific habit
-                        - GET CURRENT STREAK               : Get the current streak for a specific habit
-                        - INFO                             : Show this information
-                        - EXIT                             : Exit the program
-
-                        Today's date: {todays_date}
-                    """)
-
-                case "create habit":
-                    name = input("Enter habit name: ").strip()
-
-                    while True:
-                        try:
-                            periodicity = int(
-                                input("Enter periodicity in days (e.g. 1 for daily, 7 for weekly): ").strip())
-                            break
-                        except ValueError:
-                            print("Please enter a valid integer for periodicity.")
-
-                    new_habit = Habit(name=name, periodicity=periodicity, date_created=todays_date)
-                    analytics.create_habit(cursor, new_habit)
-                    connection.commit()
-
-                case "check off":
-                    habit_name = input("Enter habit name to check off: ").strip()
-                    habit_id = analytics.get_habit_id(cursor, habit_name)
-
-                    if habit_id is None:
-                        print(f"Habit '{habit_name.upper()}' does not exist.")
-                    else:
-                        if analytics.is_habit_checked_off(cursor, habit_id, todays_date):
-                            print(f"Habit '{habit_name.upper()}' is already checked off for {todays_date}.")
-                        else:
-                            analytics.check_off_habit(cursor, habit_id, todays_date)
-                            connection.commit()
-                            print(f"Habit '{habit_name.upper()}' checked off for {todays_date}.")
-
-                case "list habits":
-                    habits = analytics.get_all_habits(cursor)
-                    print("All habits:")
-                    for habit_name in habits:
-                        print(f"- {habit_name.upper()}")
-
-                case "list habits by periodicity":
-                    try:
-                        period = int(input("Enter periodicity in days to filter habits: ").strip())
-                        habit_names = analytics.get_habit_by_periodicity(cursor, period)
-
-                        if habit_names:
-                            print(f"Habits with periodicity {period} days:")
-                            for name in habit_names:
-                                print(f"- {name.upper()}")
-                        else:
-                            print(f"No habits found with periodicity {period} days.")
-
-                    except ValueError:
-                        print("Please enter a valid integer.")
-
-                case "get longest streak":
-                    habit_name = input("Enter habit name: ").strip()
-                    habit_id = analytics.get_habit_id(cursor, habit_name)
-
-                    if habit_id is None:
-                        print(f"Habit '{habit_name.upper()}' does not exist.")
-                    else:
-                        longest_streak = analytics.get_longest_streak(cursor, habit_id)
-                        print(f"The longest streak for habit '{habit_name.upper()}' is: {longest_streak}")
-
-                case "get current streak":
-                    habit_name = input("Enter habit name: ").strip()
-                    habit_id = analytics.get_habit_id(cursor, habit_name)
-
-                    if habit_id is None:
-                        print(f"Habit '{habit_name.upper()}' does not exist.")
-                    else:
-                        current_streak = analytics.get_current_streak(cursor, habit_id)
-                        print(f"The current streak for habit '{habit_name.upper()}' is: {current_streak} on {todays_date}")
-
-                case "list habits with longest streak":
-                    habit_names = analytics.get_all_habits(cursor)
-
-                    print("Habits and their longest streaks:")
-                    for habit_name in habit_names:
-                        habit_id = analytics.get_habit_id(cursor, habit_name)
-                        longest_streak = analytics.get_longest_streak(cursor, habit_id)
-                        print(f"- {habit_name.upper()}: Longest streak = {longest_streak}")
-
-                case "list habits with current streak":
-                    habit_names = analytics.get_all_habits(cursor)
-                    print(f"Habits and their current streaks on {todays_date}:")
-                    for habit_name in habit_names:
-                        habit_id = analytics.get_habit_id(cursor, habit_name)
-                        current_streak = analytics.get_current_streak(cursor, habit_id)
-                        print(f"- {habit_name.upper()}: Current streak = {current_streak}")
-
-                case "exit":
-                    print("Goodbye! See you soon!")
-                    break
-
-                case _:
-                    print("Invalid command. Write INFO for available commands.")
-
-
-    except mysql.connector.Error as err:
+    if os.environ.get("HABITS_QUERY_STATS", "on").lower() not in ("off", "0", "false"):
+        query_stats = QueryStats()
+        database.query_stats = query_stats
+        statement_counts = database.statement_counts
+
+    print("Write INFO for information on how to use the application.")
+
+    todays_date = datetime.date.today()
+
+    try:
+        # Cache the habits table for the session, so habit names are not looked up in the database every time
+        with startup_timer.phase("load habit catalog"):
+            catalog = HabitCatalog()
+            database.run(catalog.load, user_id)
+            analytics.use_habit_catalog(catalog)
+
+        # Index the check-off dates, so the streaks on past dates are answered without reading the history
+        with startup_timer.phase("load check-off index"):
+            index = CheckOffIndex()
+            database.run(index.load, user_id)
+            analytics.use_check_off_index(index)
+
+        journal_path = os.environ.get("HABITS_WRITE_BEHIND_JOURNAL")
+        if journal_path:
+            # Check-offs are acknowledged once journaled and written in groups; check-offs an earlier session
+            # left in the journal are written first
+            with startup_timer.phase("replay check-off journal"):
+                check_off_buffer = CheckOffBuffer(database, journal_path, todays_date=todays_date).start()
+            analytics.use_check_off_buffer(check_off_buffer)
+
+    except analytics.DATABASE_ERRORS as err:
         print("Database query failed:", err)
+        return
 
+    # Update the streaks and completion rollups of all habits for today without holding up the prompt
+    streak_refresher = StreakRefresher(database, todays_date, user_id, timer=startup_timer).start()
+    rollover_scheduler = RolloverScheduler(database, todays_date, user_id, on_rollover=set_todays_date).start()
+    startup_timer.record("startup until the prompt", startup_timer.started)
+
+    try:
+        while True:
+            try:
+                command = input("> ").strip().lower()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                command = "exit"
+
+            if command == "exit":
+                break
+
+            try:
+                # Pending check-offs are written before every other command, so it sees them in the database
+                if check_off_buffer is not None and command != "check off":
+                    check_off_buffer.flush()
+
+                if command == "import data":
+                    import_data(database)
+                    continue
+
+                # The prompts come first, so the session is only open while the command runs
+                arguments = read_arguments(command)
+                if arguments is not None:
+                    database.run(execute_command, command, arguments)
+            except analytics.DATABASE_ERRORS as err:
+                print("Database query failed:", err)
     finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+        # Also runs when the session ends with an error or Ctrl-C during a command
+        shut_down()
+    print("Goodbye! See you soon!")
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,268 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import analytics
+from habit_class import DEFAULT_USER_ID
+
+
+class CheckOffBuffer:
+    """
+    Write-behind queue for check-offs of today's date, in front of analytics.check_off_habit.
+
+    check_off() acknowledges a check-off as soon as it is appended to a local journal file and added to an
+    in-memory pending set. A background thread writes the pending check-offs with analytics.check_off_habits
+    in one transaction per group, once max_pending check-offs are waiting or the oldest has waited max_delay
+    seconds, and close() writes the rest on a clean exit. While enabled with analytics.use_check_off_buffer,
+    analytics.is_habit_checked_off also sees the pending check-offs.
+
+    The journal makes pending check-offs survive a crash: a new buffer on the same journal replays it before
+    it accepts check-offs, and since check_off_habits skips check-offs that already exist, replaying
+    check-offs that were written before the crash is harmless. After every group is committed, the journal
+    is rewritten with only the check-offs still pending.
+
+    Attributes:
+        max_pending (int): The number of pending check-offs that triggers a flush.
+        max_delay (float): The number of seconds a check-off may stay pending.
+        flushes (int): The number of groups written so far.
+        replayed (int): The number of check-offs from the journal of an earlier process that were new.
+        error (Exception | None): The error of the last failed background flush; its check-offs stay pending.
+    """
+
+    def __init__(self, database, journal_path: str, max_pending: int = 100, max_delay: float = 1.0, sync: bool = True,
+                 todays_date: datetime.date = None):
+        """
+        Initialize a CheckOffBuffer, replaying the check-offs left in the journal by an earlier process.
+        start() starts the background thread.
+
+        Args:
+            database (database.Database | sqlite_backend.SQLiteDatabase): The habits database.
+            journal_path (str): The path of the journal file, created if it does not exist.
+            max_pending (int): The number of pending check-offs that triggers a flush.
+            max_delay (float): The number of seconds a check-off may stay pending.
+            sync (bool): fsync the journal after every check-off, so it also survives a power loss.
+            todays_date (datetime.date | None): The date the streaks of replayed habits are rebuilt for,
+                defaults to today.
+        """
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1.")
+
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.flushes = 0
+        self.replayed = 0
+        self.error = None
+        self._database = database
+        self._journal_path = journal_path
+        self._sync = sync
+        self._condition = threading.Condition()
+        self._pending = {}      # (user_id, habit_id, check_date) -> time.monotonic() of the check-off
+        self._flushing = set()  # Check-offs being written and not committed yet
+        self._closed = False
+        self._thread = None
+
+        entries = read_journal(journal_path)
+        if entries:
+            self.replayed = database.run(_replay, entries, todays_date or datetime.date.today())
+        self._journal = open(journal_path, "w", encoding="utf-8")  # Empty now that its check-offs are written
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending) + len(self._flushing)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """
+        Start flushing on a background thread.
+
+        Returns:
+            CheckOffBuffer: self, for chaining.
+        """
+        self._thread = threading.Thread(target=self._run, name="check-off-flush", daemon=True)
+        self._thread.start()
+        return self
+
+    def check_off(self, habit_id: int, check_date: datetime.date, user_id: int = DEFAULT_USER_ID):
+        """
+        Queue a check-off. It is journaled before this returns, and written to the database later.
+
+        Args:
+            habit_id (int): The unique identifier of the habit.
+            check_date (datetime.date): The date to check off the habit.
+            user_id (int): The user owning the habit.
+
+        Returns:
+            bool: True if the check-off was queued, False if it is already pending.
+        """
+        entry = (user_id, habit_id, check_date)
+        with self._condition:
+            if self._closed:
+                raise ValueError("The check-off buffer is closed.")
+            if entry in self._pending or entry in self._flushing:
+                return False
+
+            self._journal.write(_journal_line(entry))
+            self._journal.flush()
+            if self._sync:
+                os.fsync(self._journal.fileno())
+            self._pending[entry] = time.monotonic()
+            if len(self._pending) == 1 or len(self._pending) >= self.max_pending:
+                self._condition.notify_all()  # The background thread sleeps until the first check-off
+        return True
+
+    def is_pending(self, habit_id: int, check_date: datetime.date, user_id: int = DEFAULT_USER_ID):
+        """
+        Check if a check-off is queued and not written to the database yet.
+
+        Returns:
+            bool: True if the check-off is pending.
+        """
+        entry = (user_id, habit_id, check_date)
+        with self._condition:
+            return entry in self._pending or entry in self._flushing
+
+    def flush(self):
+        """
+        Write the pending check-offs in one transaction per user and commit them.
+
+        Returns:
+            int: The number of check-offs that were new in the database.
+        """
+        with self._condition:
+            group = list(self._pending)
+            self._flushing.update(group)
+            self._pending.clear()
+        if not group:
+            return 0
+
+        try:
+            written = self._database.run(self._write, group)
+        except BaseException:
+            with self._condition:
+                self._flushing.difference_update(group)
+                self._pending.update(dict.fromkeys(group, time.monotonic()))
+            raise
+
+        with self._condition:
+            self._flushing.difference_update(group)
+            self.flushes += 1
+            self._rewrite_journal()
+        return written
+
+    def close(self):
+        """
+        Stop the background thread, write the pending check-offs and close the journal, which is left empty.
+
+        Returns:
+            None
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            self._journal.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._due():
+                    self._condition.wait(self._timeout())
+                if self._closed:
+                    return
+            try:
+                self.flush()
+                self.error = None
+            except analytics.DATABASE_ERRORS as err:
+                self.error = err  # The check-offs stay pending and are retried on the next flush
+                time.sleep(self.max_delay)
+
+    def _due(self):
+        # Call with the lock held
+        if len(self._pending) >= self.max_pending:
+            return True
+        return bool(self._pending) and time.monotonic() - min(self._pending.values()) >= self.max_delay
+
+    def _timeout(self):
+        # Seconds until the oldest pending check-off is due; call with the lock held
+        if not self._pending:
+            return None
+        return max(0.0, self.max_delay - (time.monotonic() - min(self._pending.values())))
+
+    def _write(self, cursor, group):
+        by_user = {}
+        for user_id, habit_id, check_date in group:
+            by_user.setdefault(user_id, []).append((habit_id, check_date))
+
+        written = 0
+        for user_id, pairs in by_user.items():
+            results = analytics.check_off_habits(cursor, pairs, user_id=user_id)
+            written += sum(result["checked_off"] for result in results.values())
+        return written
+
+    def _rewrite_journal(self):
+        # Replace the journal with the check-offs still pending; call with the lock held
+        temporary_path = self._journal_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.writelines(_journal_line(entry) for entry in list(self._pending) + list(self._flushing))
+            file.flush()
+            if self._sync:
+                os.fsync(file.fileno())
+        self._journal.close()
+        os.replace(temporary_path, self._journal_path)
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+
+def _replay(cursor, entries, todays_date):
+    # Write journaled check-offs, possibly of earlier days, and rebuild the streaks of their habits, since
+    # check_off_habits only counts check-offs made in date order after the streaks were refreshed
+    written = 0
+    by_user = {}
+    for user_id, habit_id, check_date in entries:
+        by_user.setdefault(user_id, []).append((habit_id, check_date))
+    for user_id, pairs in by_user.items():
+        results = analytics.check_off_habits(cursor, pairs, user_id=user_id)
+        written += sum(result["checked_off"] for result in results.values())
+        analytics.rebuild_streaks(cursor, todays_date, sorted(results), user_id)
+    return written
+
+
+def read_journal(path: str):
+    """
+    Read the check-offs of a journal written by CheckOffBuffer. A line cut short by a crash is skipped.
+
+    Args:
+        path (str): The path of the journal; a missing file has no check-offs.
+
+    Returns:
+        list[tuple[int, int, datetime.date]]: The (user_id, habit_id, check_date) entries in journal order.
+    """
+    if not os.path.exists(path):
+        return []
+
+    entries = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+                entries.append((record["user_id"], record["habit_id"], datetime.date.fromisoformat(record["date"])))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return entries
+
+
+def _journal_line(entry):
+    user_id, habit_id, check_date = entry
+    return json.dumps({"user_id": user_id, "habit_id": habit_id, "date": check_date.isoformat()}) + "\n"